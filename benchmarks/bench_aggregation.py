@@ -0,0 +1,56 @@
+"""
+Benchmark the shared scan of the ratings data products against one scan per data product.
+
+Usage: python benchmarks/bench_aggregation.py --rows 25000000 --chunk-rows 5000000
+"""
+import argparse
+import configparser
+import sys
+import time
+
+try:
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.aggregation import RATINGS_DATA_PRODUCTS, RatingsAggregationPlan
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.aggregation import RATINGS_DATA_PRODUCTS, RatingsAggregationPlan
+
+
+def ratings_chunks(ratings_df, chunk_rows):
+    for start in range(0, len(ratings_df), chunk_rows):
+        yield ratings_df.iloc[start : start + chunk_rows]
+
+
+def timed_scan(plan, ratings_df, chunk_rows):
+    start = time.perf_counter()
+    plan.scan(ratings_chunks(ratings_df[plan.scan_columns(ratings_df.columns)], chunk_rows))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=25_000_000, help="Number of ratings rows to generate")
+    parser.add_argument("--chunk-rows", type=int, default=5_000_000, help="Rows per scanned chunk")
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    ratings_df = gen_ratings(args.rows)
+    config = configparser.ConfigParser()
+    config.read_dict({product_class: {"top_k": str(args.top_k)} for product_class in RATINGS_DATA_PRODUCTS})
+    products = {product_class: product(config[product_class]) for product_class, product in RATINGS_DATA_PRODUCTS.items()}
+    print(f"rows: {args.rows}, chunk rows: {args.chunk_rows}")
+
+    separate_seconds = 0.0
+    for product_class, product in products.items():
+        seconds = timed_scan(RatingsAggregationPlan({product_class: product}), ratings_df, args.chunk_rows)
+        separate_seconds += seconds
+        print(f"{product_class:<24} own scan    : {seconds:8.3f}s")
+    print(f"{'all products':<24} own scans   : {separate_seconds:8.3f}s")
+
+    shared_seconds = timed_scan(RatingsAggregationPlan(products), ratings_df, args.chunk_rows)
+    print(f"{'all products':<24} shared scan : {shared_seconds:8.3f}s  {args.rows / shared_seconds:14,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
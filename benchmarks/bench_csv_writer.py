@@ -0,0 +1,53 @@
+"""
+Benchmark the parallel CSV writer against a single-threaded DataFrame.to_csv.
+
+Usage: python benchmarks/bench_csv_writer.py --users 162541 --k 20 --workers 1 4 --compression none gzip
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+try:
+    from benchmarks.bench_lookup import gen_top_movies
+    from src.scripts.csv_writer import AtomicCsvStorage
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.bench_lookup import gen_top_movies
+    from src.scripts.csv_writer import AtomicCsvStorage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=162_541, help="Number of users of the data product")
+    parser.add_argument("--k", type=int, default=20, help="Movies per user")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Worker processes to time")
+    parser.add_argument("--compression", nargs="+", default=["none", "gzip"], help="Compressions to time: none, gzip, zstd")
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    args = parser.parse_args()
+
+    top_movies_df = gen_top_movies(args.users, args.k)
+    print(f"rows: {len(top_movies_df)}, cpus: {os.cpu_count()}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        top_movies_df.to_csv(f"{workdir}/to_csv.csv", index=False, float_format="%.2f")
+        to_csv_seconds = time.perf_counter() - start
+        print(f"{'DataFrame.to_csv':<24}: {to_csv_seconds:8.3f}s  {os.path.getsize(f'{workdir}/to_csv.csv') / 1024**2 / to_csv_seconds:8.1f} MB/s")
+
+        for compression in args.compression:
+            for workers in args.workers:
+                storage = AtomicCsvStorage(workers=workers, chunk_rows=args.chunk_rows, compression=compression)
+                start = time.perf_counter()
+                storage.write(top_movies_df, workdir, "top_movies_per_user")
+                seconds = time.perf_counter() - start
+                dataset_path = storage.dataset_path(workdir, "top_movies_per_user")
+                print(f"{f'{compression}, {storage.workers} workers':<24}: {seconds:8.3f}s  {os.path.getsize(dataset_path) / 1024**2:8.1f} MB written  {to_csv_seconds / seconds:.1f}x")
+                assert len(pd.read_csv(dataset_path, usecols=["userid"])) == len(top_movies_df)
+
+
+if __name__ == "__main__":
+    main()
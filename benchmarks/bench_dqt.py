@@ -0,0 +1,80 @@
+"""
+Benchmark the streaming DQTs against validate_dataset on a ratings drop with a unique rating id.
+
+Times a full pass over a clean drop with the exact and approximate unique checks, and the rejection of a drop with
+invalid rows with fail_fast, against validate_dataset over the whole DataFrame.
+
+Usage: python benchmarks/bench_dqt.py --rows 25000000 --chunk-rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import yaml
+
+try:
+    from benchmarks.bench_joins import timed
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.dqt import ChunkValidator, validate_dataset
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.bench_joins import timed
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.dqt import ChunkValidator, validate_dataset
+
+RATINGS_DROP_SCHEMA = {
+    "columns": [
+        {"name": "ratingid", "type": "int64", "dqt_enabled": True, "dqt_type": ["unique", "not_null"]},
+        {"name": "userid", "type": "int64", "dqt_enabled": True, "dqt_type": ["not_null", "custom"], "dqt_rules": {"range": [1, 162541]}},
+        {"name": "movieid", "type": "int64", "dqt_enabled": True, "dqt_type": ["custom"], "dqt_rules": {"range": [1, 209171]}},
+        {"name": "ratings", "type": "int64", "dqt_enabled": True, "dqt_type": ["custom"], "dqt_rules": {"set": [1, 2, 3, 4, 5]}},
+        {"name": "timestamp", "type": "int64", "dqt_enabled": False, "dqt_type": ["None"]},
+    ]
+}
+
+
+def stream_validate(ratings_df, file_schema_path, chunk_rows, **validator_args):
+    """Validate the drop chunk by chunk, stopping at the first failing chunk with fail_fast, returns the validator"""
+    chunk_validator = ChunkValidator("RatingsDropValidator", file_schema_path, **validator_args)
+    for start in range(0, len(ratings_df), chunk_rows):
+        if not chunk_validator.validate(ratings_df.iloc[start : start + chunk_rows]) and chunk_validator.fail_fast:
+            break
+    return chunk_validator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=25_000_000, help="Number of ratings rows to generate")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="Rows per streamed chunk")
+    parser.add_argument("--bad-row", type=int, default=1_500_000, help="Row given an invalid rating and a repeated ratingid in the bad drop")
+    args = parser.parse_args()
+
+    ratings_df = gen_ratings(args.rows)
+    ratings_df.insert(0, "ratingid", np.random.default_rng(7).permutation(args.rows) + 1)
+    bad_ratings_df = ratings_df.copy()
+    bad_ratings_df.loc[args.bad_row, "ratings"] = 9
+    bad_ratings_df.loc[args.bad_row + 1, "ratingid"] = bad_ratings_df.loc[0, "ratingid"]
+    print(f"rows: {args.rows}, chunk_rows: {args.chunk_rows}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        file_schema_path = os.path.join(workdir, "ratings_drop.yml")
+        with open(file_schema_path, "w") as schema_file:
+            yaml.safe_dump(RATINGS_DROP_SCHEMA, schema_file)
+
+        results, full_time = timed(validate_dataset, "RatingsDropValidator", ratings_df, file_schema_path)
+        print(f"validate_dataset, clean drop      : {full_time:8.3f}s  passed: {all(results.values())}")
+        for unique_check in ["exact", "approximate"]:
+            chunk_validator, stream_time = timed(stream_validate, ratings_df, file_schema_path, args.chunk_rows, unique_check=unique_check)
+            unique_set_mb = chunk_validator.distinct_values["ratingid"].nbytes / 1024**2
+            print(f"streaming {unique_check:<11}, clean drop : {stream_time:8.3f}s  passed: {not chunk_validator.failed}, unique check state {unique_set_mb:.2f} MB")
+
+        results, full_time = timed(validate_dataset, "RatingsDropValidator", bad_ratings_df, file_schema_path)
+        print(f"validate_dataset, bad drop        : {full_time:8.3f}s  passed: {all(results.values())}")
+        chunk_validator, stream_time = timed(stream_validate, bad_ratings_df, file_schema_path, args.chunk_rows, fail_fast=True)
+        print(f"streaming fail fast, bad drop     : {stream_time:8.3f}s  passed: {not chunk_validator.failed}, rejected after {chunk_validator.rows} rows, report: {chunk_validator.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark the ".dat" parser used by gen_dataframe against the python engine path it replaced.
+
+Usage: python benchmarks/bench_gen_dataframe.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import yaml
+
+try:
+    from src.scripts.load_tools import gen_dataframe
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.load_tools import gen_dataframe
+
+RATINGS_SCHEMA_PATH = "src/schema/ratings.yml"
+
+
+def write_ratings_dat(file_path, rows, seed=42):
+    """Write a ratings.dat file with MovieLens-like value ranges"""
+    rng = np.random.default_rng(seed)
+    ratings_df = pd.DataFrame(
+        {
+            "userid": rng.integers(1, 6041, rows),
+            "movieid": rng.integers(1, 3953, rows),
+            "ratings": rng.integers(1, 6, rows),
+            "timestamp": rng.integers(956703932, 1046454590, rows),
+        }
+    )
+    lines = ratings_df.astype(str).agg("::".join, axis=1)
+    with open(file_path, "w") as output_file:
+        output_file.write("\n".join(lines) + "\n")
+
+
+def read_with_python_engine(file_path, file_schema_path):
+    """The gen_dataframe implementation before the C engine reader"""
+    with open(file_schema_path, "r") as file:
+        file_schema = yaml.safe_load(file)
+    column_names = [col["name"] for col in file_schema["columns"]]
+    return pd.read_csv(file_path, sep="::", engine="python", header=None, encoding="ISO-8859-1", names=column_names)
+
+
+def time_reader(reader, file_path, repeat):
+    """Best wall time out of `repeat` runs along with the last DataFrame"""
+    best = float("inf")
+    dataset_df = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dataset_df = reader(file_path, RATINGS_SCHEMA_PATH)
+        best = min(best, time.perf_counter() - start)
+    return best, dataset_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of ratings rows to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per reader, the best one is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "ratings.dat")
+        write_ratings_dat(file_path, args.rows)
+
+        python_time, python_df = time_reader(read_with_python_engine, file_path, args.repeat)
+        c_time, c_df = time_reader(gen_dataframe, file_path, args.repeat)
+
+    pd.testing.assert_frame_equal(python_df, c_df, check_dtype=False)
+
+    print(f"rows: {args.rows}")
+    print(f"python engine : {python_time:8.3f}s  {args.rows / python_time:14,.0f} rows/sec")
+    print(f"gen_dataframe : {c_time:8.3f}s  {args.rows / c_time:14,.0f} rows/sec")
+    print(f"speedup       : {python_time / c_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
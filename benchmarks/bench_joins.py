@@ -0,0 +1,65 @@
+"""
+Benchmark the direct-address dimension join against pd.merge.
+
+Usage: python benchmarks/bench_joins.py --rows 25000000 --movies 62423
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.joins import DimensionIndex
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.joins import DimensionIndex
+
+
+def gen_movies(movies, max_movieid=209171, seed=42):
+    """A movies dimension of movies ids spread over 1..max_movieid like the MovieLens 25M ids"""
+    rng = np.random.default_rng(seed)
+    movieids = np.sort(rng.choice(np.arange(1, max_movieid + 1), movies, replace=False))
+    return pd.DataFrame(
+        {
+            "movieid": movieids.astype("int32"),
+            "titles": pd.Series([f"Movie {movieid} (1999)" for movieid in movieids], dtype="string"),
+            "genres": rng.integers(1, 1 << 18, movies).astype("uint32"),
+        }
+    )
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=25_000_000, help="Number of ratings rows to generate")
+    parser.add_argument("--movies", type=int, default=62_423, help="Number of movies of the dimension")
+    args = parser.parse_args()
+
+    movies_df = gen_movies(args.movies)
+    ratings_df = gen_ratings(args.rows)
+    # Every rated movie is in the dimension, as in the curated MovieLens datasets
+    ratings_df["movieid"] = movies_df["movieid"].to_numpy()[ratings_df["movieid"].to_numpy() % args.movies]
+    print(f"rows: {args.rows}, movies: {args.movies}")
+
+    merged_df, merge_seconds = timed(pd.merge, ratings_df, movies_df, on="movieid", how="left")
+    print(f"pd.merge             : {merge_seconds:8.3f}s  {args.rows / merge_seconds:14,.0f} rows/sec")
+
+    movies, index_seconds = timed(DimensionIndex, movies_df, "movieid")
+    print(f"index build          : {index_seconds * 1e3:8.3f}ms  direct address: {movies.is_direct}")
+    joined_df, join_seconds = timed(movies.join, ratings_df)
+    print(f"DimensionIndex.join  : {join_seconds:8.3f}s  {args.rows / join_seconds:14,.0f} rows/sec  {merge_seconds / join_seconds:.1f}x")
+
+    pd.testing.assert_frame_equal(joined_df, merged_df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark the memory mapped lookup index against loading the data product CSV with pandas.
+
+Usage: python benchmarks/bench_lookup.py --users 162541 --k 3 --lookups 100000 --batch-size 100
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.scripts.lookup import DataProductIndex
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.lookup import DataProductIndex
+
+
+def gen_top_movies(users, k, seed=42):
+    """A top_movies_per_user data product of k movies per user"""
+    rng = np.random.default_rng(seed)
+    rows = users * k
+    return pd.DataFrame(
+        {
+            "userid": np.repeat(np.arange(1, users + 1), k),
+            "movieid": rng.integers(1, 209172, rows),
+            "ratings": rng.integers(1, 6, rows),
+            "timestamp": rng.integers(789652009, 1574327703, rows),
+            "titles": [f"Movie {movie_number} (1999)" for movie_number in rng.integers(1, 209172, rows)],
+            "genres": rng.choice(["Comedy", "Drama", "Action|Thriller", "Animation|Children's|Comedy"], rows),
+        }
+    )
+
+
+def latency_percentiles(latencies):
+    return {percentile: np.percentile(latencies, percentile) * 1e6 for percentile in (50, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=162_541, help="Number of users of the data product")
+    parser.add_argument("--k", type=int, default=3, help="Movies per user")
+    parser.add_argument("--lookups", type=int, default=100_000, help="Number of point lookups to time")
+    parser.add_argument("--batch-size", type=int, default=100, help="Keys per batch lookup")
+    args = parser.parse_args()
+
+    top_movies_df = gen_top_movies(args.users, args.k)
+    keys = np.random.default_rng(7).integers(1, args.users + 1, args.lookups)
+    print(f"users: {args.users}, rows: {len(top_movies_df)}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        top_movies_df.to_csv(f"{workdir}/top_movies_per_user.csv", index=False)
+
+        start = time.perf_counter()
+        DataProductIndex.build(pd.read_csv(f"{workdir}/top_movies_per_user.csv"), "userid", f"{workdir}/index")
+        print(f"index build          : {time.perf_counter() - start:8.3f}s")
+
+        start = time.perf_counter()
+        index = DataProductIndex(f"{workdir}/index")
+        print(f"index open           : {(time.perf_counter() - start) * 1e3:8.3f}ms")
+
+        start = time.perf_counter()
+        csv_df = pd.read_csv(f"{workdir}/top_movies_per_user.csv")
+        print(f"pandas CSV load      : {(time.perf_counter() - start) * 1e3:8.3f}ms")
+
+        latencies = np.empty(len(keys))
+        for position, key in enumerate(keys):
+            start = time.perf_counter()
+            index.lookup(key)
+            latencies[position] = time.perf_counter() - start
+        percentiles = latency_percentiles(latencies)
+        print(f"index point lookup   : p50 {percentiles[50]:8.1f}us  p99 {percentiles[99]:8.1f}us  {len(keys) / latencies.sum():12,.0f} lookups/sec")
+
+        batches = keys[: len(keys) // args.batch_size * args.batch_size].reshape(-1, args.batch_size)
+        start = time.perf_counter()
+        for batch in batches:
+            index.lookup_many(batch)
+        batch_time = time.perf_counter() - start
+        print(f"index batch lookup   : {batch_time / len(batches) * 1e6:8.1f}us per {args.batch_size} keys")
+
+        pandas_keys = keys[:1000]
+        start = time.perf_counter()
+        for key in pandas_keys:
+            csv_df[csv_df["userid"] == key].to_dict("records")
+        pandas_time = time.perf_counter() - start
+        print(f"pandas filter lookup : {pandas_time / len(pandas_keys) * 1e6:8.1f}us per key, on the loaded DataFrame")
+
+        assert index.lookup(keys[0]) == csv_df[csv_df["userid"] == keys[0]].to_dict("records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark each DataProcessor stage on a synthetic MovieLens staging zip, reporting wall time, throughput and peak memory.
+
+The stages run one after another in dependency order with the settings of src/config.ini, the manifest disabled so
+every stage is executed. Peak memory is the peak of the allocations traced by tracemalloc during the stage, which
+includes the numpy and pandas buffers. Results can be saved as a JSON baseline and compared with a later run.
+
+Usage:
+    python benchmarks/bench_pipeline.py --scale 10m --save-baseline
+    python benchmarks/bench_pipeline.py --scale 10m --compare --tolerance 0.2
+"""
+import argparse
+import configparser
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    from benchmarks.synthetic_data import SCALES, write_staging_zip
+    from src.app import DataProcessor
+    from src.scripts.scheduler import StageScheduler
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.synthetic_data import SCALES, write_staging_zip
+    from src.app import DataProcessor
+    from src.scripts.scheduler import StageScheduler
+
+REPO_SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+ZONE_CONFIG_KEYS = ["raw_zone_path", "curated_zone_path", "data_product_zone_path", "state_zone_path", "index_zone_path"]
+
+
+def path_size(path):
+    """Size in bytes of a file, or of all files below a directory"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, file_name)) for root, _, file_names in os.walk(path) for file_name in file_names)
+
+
+def prepare_workdir(workdir, scale, seed):
+    """
+    Lay out a pipeline working directory with the synthetic staging zip, the repo schemas and the repo config.
+
+    The zip is only generated again when the scale or seed changed, the zones of a previous run are removed.
+
+    Returns:
+    - config_path (str): Path of the config file, relative to workdir.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPO_SRC_PATH, "config.ini"))
+    config["Incremental"]["enabled"] = "False"
+
+    zip_file_path = os.path.join(workdir, config["Paths"]["raw_zip_file_path"])
+    marker_path = f"{zip_file_path}.json"
+    marker = {"ratings_rows": SCALES[scale], "seed": seed}
+    os.makedirs(os.path.dirname(zip_file_path), exist_ok=True)
+    previous_marker = None
+    if os.path.exists(marker_path):
+        with open(marker_path, "r") as marker_file:
+            previous_marker = json.load(marker_file)
+    if previous_marker != marker:
+        print(f"Generating synthetic staging zip: {SCALES[scale]:,} ratings")
+        write_staging_zip(zip_file_path, SCALES[scale], seed=seed)
+        with open(marker_path, "w") as marker_file:
+            json.dump(marker, marker_file)
+
+    for zone_key in ZONE_CONFIG_KEYS:
+        shutil.rmtree(os.path.join(workdir, config["Paths"][zone_key]), ignore_errors=True)
+    shutil.rmtree(os.path.join(workdir, config["Paths"]["datasets_schema_path"]), ignore_errors=True)
+    shutil.copytree(os.path.join(REPO_SRC_PATH, "schema"), os.path.join(workdir, config["Paths"]["datasets_schema_path"]))
+
+    with open(os.path.join(workdir, "config.ini"), "w") as config_file:
+        config.write(config_file)
+    return "config.ini"
+
+
+def run_stages(config_path, ratings_rows, track_memory=True):
+    """Execute every pipeline stage in dependency order, returns the measurements of each stage"""
+    processor = DataProcessor(config_path)
+    processor.prepare_infra()
+    stage_specs = processor.stage_specs()
+    execution_order = StageScheduler({stage_name: stage_spec["depends_on"] for stage_name, stage_spec in stage_specs.items()}).execution_order
+
+    stage_results = {}
+    for stage_name in execution_order:
+        input_bytes = sum(path_size(path) for path in stage_specs[stage_name]["inputs"] if os.path.exists(path))
+        if track_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        processor.execute_stage(stage_name)
+        seconds = time.perf_counter() - start
+
+        peak_memory_bytes = None
+        if track_memory:
+            _, peak_memory_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        stage_results[stage_name] = {
+            "seconds": round(seconds, 4),
+            "ratings_rows_per_sec": round(ratings_rows / seconds),
+            "input_mb": round(input_bytes / 1024**2, 2),
+            "input_mb_per_sec": round(input_bytes / 1024**2 / seconds, 2),
+            "peak_memory_mb": None if peak_memory_bytes is None else round(peak_memory_bytes / 1024**2, 2),
+        }
+    return stage_results
+
+
+def compare_to_baseline(stage_results, baseline, tolerance):
+    """Stages whose wall time or peak memory grew by more than tolerance over the baseline"""
+    regressions = []
+    for stage_name, baseline_result in baseline["stages"].items():
+        stage_result = stage_results.get(stage_name)
+        if stage_result is None:
+            continue
+        for metric in ["seconds", "peak_memory_mb"]:
+            if stage_result[metric] is None or baseline_result[metric] is None:
+                continue
+            if stage_result[metric] > baseline_result[metric] * (1 + tolerance):
+                regressions.append(f"{stage_name}: {metric} {stage_result[metric]} > baseline {baseline_result[metric]} (+{tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="1m", help="Number of synthetic ratings")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Working directory of the pipeline, the generated zip is reused across runs")
+    parser.add_argument("--no-memory", action="store_true", help="Do not trace the peak memory of each stage")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the baseline of the scale")
+    parser.add_argument("--compare", action="store_true", help="Compare the results to the baseline of the scale, exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative growth over the baseline")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or os.path.join(tempfile.gettempdir(), "movie_lens_bench", args.scale))
+    baseline_path = os.path.join(BASELINES_PATH, f"pipeline_{args.scale}.json")
+    os.makedirs(workdir, exist_ok=True)
+    config_path = prepare_workdir(workdir, args.scale, args.seed)
+
+    current_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        stage_results = run_stages(config_path, SCALES[args.scale], track_memory=not args.no_memory)
+    finally:
+        os.chdir(current_dir)
+
+    print(f"\nscale: {args.scale}, ratings: {SCALES[args.scale]:,}")
+    for stage_name, stage_result in stage_results.items():
+        peak_memory = "n/a" if stage_result["peak_memory_mb"] is None else f"{stage_result['peak_memory_mb']:,.1f} MB"
+        print(f"{stage_name:<38} {stage_result['seconds']:8.3f}s  {stage_result['ratings_rows_per_sec']:14,} ratings/sec  {stage_result['input_mb_per_sec']:10,.1f} MB/sec  peak {peak_memory}")
+
+    results = {"scale": args.scale, "ratings_rows": SCALES[args.scale], "seed": args.seed, "python": platform.python_version(), "platform": platform.platform(), "stages": stage_results}
+
+    if args.save_baseline:
+        os.makedirs(BASELINES_PATH, exist_ok=True)
+        with open(baseline_path, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Baseline saved: {baseline_path}")
+
+    if args.compare:
+        with open(baseline_path, "r") as baseline_file:
+            regressions = compare_to_baseline(stage_results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regression over the baseline")
+
+
+if __name__ == "__main__":
+    main()
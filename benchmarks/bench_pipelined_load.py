@@ -0,0 +1,96 @@
+"""
+Benchmark the pipelined chunked load of the curated ratings against the sequential one.
+
+Sequential: each chunk of ratings.dat is parsed, validated and written before the next one is parsed. Pipelined: the
+next chunks are parsed and validated on background threads while the current chunk is written, see prefetch_chunks
+in the [Chunking] section. Peak memory is traced by tracemalloc in a second run of each mode.
+
+Usage: python benchmarks/bench_pipelined_load.py --scale 10m --chunk-rows 1000000 --prefetch-chunks 2
+"""
+import argparse
+import configparser
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    from benchmarks.bench_pipeline import prepare_workdir
+    from benchmarks.synthetic_data import SCALES
+    from src.app import DataProcessor
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.bench_pipeline import prepare_workdir
+    from benchmarks.synthetic_data import SCALES
+    from src.app import DataProcessor
+
+LOAD_STAGE = "verify_dq_load_curated_ratings"
+
+
+def mode_config_path(config_path, mode, chunk_rows, prefetch_chunks):
+    """Copy of the benchmark config with chunking enabled, sequential or pipelined"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    config["Chunking"]["enabled"] = "True"
+    config["Chunking"]["chunk_rows"] = str(chunk_rows)
+    config["Chunking"]["prefetch_chunks"] = str(prefetch_chunks if mode == "pipelined" else 0)
+    mode_path = f"config_{mode}.ini"
+    with open(mode_path, "w") as config_file:
+        config.write(config_file)
+    return mode_path
+
+
+def run_load(config_path, track_memory):
+    processor = DataProcessor(config_path)
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    processor.execute_stage(LOAD_STAGE)
+    seconds = time.perf_counter() - start
+    peak_memory_bytes = None
+    if track_memory:
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak_memory_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="1m", help="Number of synthetic ratings")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    parser.add_argument("--prefetch-chunks", type=int, default=2, help="Chunks waiting between two steps of the pipelined mode")
+    parser.add_argument("--workdir", default=None, help="Working directory, the generated zip is reused across runs")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or os.path.join(tempfile.gettempdir(), "movie_lens_bench", args.scale))
+    os.makedirs(workdir, exist_ok=True)
+    config_path = prepare_workdir(workdir, args.scale, args.seed)
+
+    current_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        processor = DataProcessor(config_path)
+        processor.prepare_infra()
+        processor.execute_stage("staging_to_raw")
+
+        results = {}
+        for mode in ["sequential", "pipelined"]:
+            mode_path = mode_config_path(config_path, mode, args.chunk_rows, args.prefetch_chunks)
+            seconds, _ = run_load(mode_path, track_memory=False)
+            _, peak_memory_bytes = run_load(mode_path, track_memory=True)
+            results[mode] = (seconds, peak_memory_bytes)
+    finally:
+        os.chdir(current_dir)
+
+    rows = SCALES[args.scale]
+    print(f"\nscale: {args.scale}, ratings: {rows:,}, chunk rows: {args.chunk_rows:,}, cpus: {os.cpu_count()}")
+    for mode, (seconds, peak_memory_bytes) in results.items():
+        print(f"{mode:<12} {seconds:8.3f}s  {rows / seconds:14,.0f} ratings/sec  peak {peak_memory_bytes / 1024**2:10,.1f} MB")
+    sequential, pipelined = results["sequential"], results["pipelined"]
+    print(f"pipelined speedup: {sequential[0] / pipelined[0]:.2f}x, memory overhead: {(pipelined[1] - sequential[1]) / 1024**2:+,.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark the per movie and day ratings rollup cube: its build, windowed statistics answered from its prefix sums
+against a filter and groupby rescan of the ratings per window, the monthly rollup against a groupby per month, and
+the fold of a new ratings batch against a rebuild of the cube.
+
+Usage: python benchmarks/bench_rollups.py --rows 25000000 --movies 59047 --windows 30 90 365 --batch-rows 100000
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from benchmarks.bench_joins import timed
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.aggregates import RatingsRollupCube, time_buckets
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.bench_joins import timed
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.aggregates import RatingsRollupCube, time_buckets
+
+
+def rescan_window_stats(ratings_df, days, first_day, last_day):
+    """Count and average of the ratings of each movie within a window of days, by a filter and groupby of the ratings"""
+    window_df = ratings_df[(days >= first_day) & (days <= last_day)]
+    return window_df.groupby("movieid")["ratings"].agg(["count", "mean"])
+
+
+def rescan_monthly_stats(ratings_df):
+    months = pd.Series(time_buckets(ratings_df["timestamp"].to_numpy(), "month"), index=ratings_df.index, name="month")
+    return ratings_df.groupby([ratings_df["movieid"], months])["ratings"].agg(["count", "mean", "min", "max"])
+
+
+def fold_batch(rollup_cube, batch_df):
+    """Merge the cube of a batch and compact the cells, as the first query after a fold does"""
+    folded_cube = rollup_cube.merge(RatingsRollupCube.from_ratings(batch_df, batches=["ratings_batch.dat"]))
+    folded_cube.window_index()
+    return folded_cube
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=25_000_000, help="Number of ratings rows to generate")
+    parser.add_argument("--movies", type=int, default=59_047, help="Number of distinct rated movies, 59047 in MovieLens 25M")
+    parser.add_argument("--windows", type=int, nargs="+", default=[30, 90, 365], help="Window lengths in days")
+    parser.add_argument("--batch-rows", type=int, default=100_000, help="Rows of the ratings batch folded into the cube")
+    args = parser.parse_args()
+
+    ratings_df = gen_ratings(args.rows)
+    ratings_df["movieid"] = ratings_df["movieid"] % args.movies + 1
+    batch_df = gen_ratings(args.batch_rows, seed=7)
+    batch_df["movieid"] = batch_df["movieid"] % args.movies + 1
+    print(f"rows: {args.rows}, movies: {args.movies}, windows: {args.windows}")
+
+    rollup_cube, build_time = timed(RatingsRollupCube.from_ratings, ratings_df)
+    _, index_time = timed(rollup_cube.window_index)
+    cells_mb = rollup_cube.cells.memory_usage(index=False).sum() / 1024**2
+    print(f"rollup cube build    : {build_time:8.3f}s  {len(rollup_cube.cells)} cells, {cells_mb:.1f} MB, window index {index_time:.3f}s")
+
+    days = time_buckets(ratings_df["timestamp"].to_numpy())
+    last_day = int(days.max())
+    for window_days in args.windows:
+        window_stats, cube_time = timed(rollup_cube.window_stats, last_day - window_days + 1, last_day)
+        expected, rescan_time = timed(rescan_window_stats, ratings_df, days, last_day - window_days + 1, last_day)
+        rated_stats = window_stats[window_stats["ratings_count"] > 0]
+        assert rated_stats["ratings_count"].tolist() == expected["count"].tolist()
+        print(f"{window_days:>5} day window     : cube {cube_time:8.3f}s, rescan {rescan_time:8.3f}s")
+
+    monthly_cube, months_time = timed(rollup_cube.to_buckets, "month")
+    expected, rescan_time = timed(rescan_monthly_stats, ratings_df)
+    assert len(monthly_cube.cells) == len(expected)
+    del monthly_cube, expected
+    print(f"monthly rollup       : cube {months_time:8.3f}s, rescan {rescan_time:8.3f}s")
+
+    del days
+    folded_cube, fold_time = timed(fold_batch, rollup_cube, batch_df)
+    del rollup_cube, folded_cube
+    _, rebuild_time = timed(RatingsRollupCube.from_ratings, pd.concat([ratings_df, batch_df], ignore_index=True))
+    print(f"fold {args.batch_rows} ratings : {fold_time:8.3f}s, rebuild {rebuild_time:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
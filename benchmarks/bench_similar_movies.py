@@ -0,0 +1,71 @@
+"""
+Benchmark the similar movies data product: the sparse user x movie ratings matrix and the blocked top N cosine
+neighbours, against a pandas self merge of the long ratings table on a sample of the ratings.
+
+Usage: python benchmarks/bench_similar_movies.py --rows 25000000 --movies 59047 --top-n 10 --baseline-rows 200000
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from benchmarks.bench_joins import timed
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.metrics import peak_rss_mb
+    from src.scripts.similarity import RatingsMatrix, top_similar_movies
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from benchmarks.bench_joins import timed
+    from benchmarks.bench_topk import gen_ratings
+    from src.scripts.metrics import peak_rss_mb
+    from src.scripts.similarity import RatingsMatrix, top_similar_movies
+
+
+def merge_top_similar_movies(ratings_df, top_n):
+    """Top N cosine neighbours of every movie from a self merge of the ratings on userid"""
+    ratings_df = ratings_df[["userid", "movieid", "ratings"]].astype({"ratings": "float64"})
+    norms = np.sqrt(ratings_df.assign(squares=ratings_df["ratings"] ** 2).groupby("movieid")["squares"].sum())
+    pairs = ratings_df.merge(ratings_df, on="userid", suffixes=("", "_similar"))
+    pairs = pairs[pairs["movieid"] != pairs["movieid_similar"]]
+    dot_products = (pairs["ratings"] * pairs["ratings_similar"]).groupby([pairs["movieid"], pairs["movieid_similar"]]).sum().reset_index(name="dot")
+    dot_products["similarity"] = dot_products["dot"] / (norms.loc[dot_products["movieid"]].to_numpy() * norms.loc[dot_products["movieid_similar"]].to_numpy())
+    ranked = dot_products.sort_values(["movieid", "similarity", "movieid_similar"], ascending=[True, False, True])
+    return ranked.groupby("movieid").head(top_n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=25_000_000, help="Number of ratings rows to generate")
+    parser.add_argument("--movies", type=int, default=59_047, help="Number of distinct rated movies, 59047 in MovieLens 25M")
+    parser.add_argument("--top-n", type=int, default=10, help="Neighbours per movie")
+    parser.add_argument("--min-ratings", type=int, default=1, help="Minimum ratings of a movie to get or be a neighbour")
+    parser.add_argument("--block-memory-mb", type=int, nargs="+", default=[64, 256], help="Block memory budgets to benchmark")
+    parser.add_argument("--baseline-rows", type=int, default=200_000, help="Ratings sample compared with the pandas self merge, 0 to skip it")
+    args = parser.parse_args()
+
+    ratings_df = gen_ratings(args.rows)
+    ratings_df["movieid"] = ratings_df["movieid"] % args.movies + 1
+    ratings_df = ratings_df.drop_duplicates(["userid", "movieid"])
+    print(f"rows: {len(ratings_df)}, movies: {args.movies}, top_n: {args.top_n}")
+
+    matrix, matrix_time = timed(RatingsMatrix.from_ratings, ratings_df["userid"].to_numpy(), ratings_df["movieid"].to_numpy(), ratings_df["ratings"].to_numpy())
+    matrix_mb = (matrix.indptr.nbytes + matrix.indices.nbytes + matrix.data.nbytes) / 1024**2
+    print(f"ratings matrix       : {matrix_time:8.3f}s  {matrix.shape[0]} x {matrix.shape[1]}, {matrix_mb:.1f} MB")
+
+    for block_memory_mb in args.block_memory_mb:
+        similar_movies_df, similarity_time = timed(top_similar_movies, matrix, top_n=args.top_n, min_ratings=args.min_ratings, block_memory_mb=block_memory_mb)
+        print(f"blocks of {block_memory_mb:>5} MB   : {similarity_time:8.3f}s  {len(similar_movies_df)} neighbours, peak RSS {peak_rss_mb()} MB")
+
+    if args.baseline_rows:
+        sample_df = ratings_df.iloc[: args.baseline_rows]
+        sample_matrix = RatingsMatrix.from_ratings(sample_df["userid"].to_numpy(), sample_df["movieid"].to_numpy(), sample_df["ratings"].to_numpy())
+        sparse_df, sparse_time = timed(top_similar_movies, sample_matrix, top_n=args.top_n)
+        merge_df, merge_time = timed(merge_top_similar_movies, sample_df, args.top_n)
+        assert np.allclose(sparse_df["similarity"].to_numpy(), merge_df["similarity"].to_numpy(), atol=1e-5)
+        print(f"sample of {len(sample_df)} rows: sparse {sparse_time:.3f}s, pandas self merge {merge_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark the top K movies per user selection against a full sort of the ratings.
+
+Usage: python benchmarks/bench_topk.py --rows 25000000 --k 3 100
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.scripts.aggregation import TOP_MOVIES_ORDER_BY
+    from src.scripts.topk import top_k_per_group
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.aggregation import TOP_MOVIES_ORDER_BY
+    from src.scripts.topk import top_k_per_group
+
+
+def gen_ratings(rows, seed=42):
+    """Ratings with the value ranges of the MovieLens 25M dataset"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "userid": rng.integers(1, 162542, rows),
+            "movieid": rng.integers(1, 209172, rows),
+            "ratings": rng.integers(1, 6, rows),
+            "timestamp": rng.integers(789652009, 1574327703, rows),
+        }
+    )
+
+
+def full_sort_top_k(ratings_df, k):
+    return ratings_df.sort_values(by=["userid", "ratings", "timestamp", "movieid"], ascending=[True, False, False, True]).groupby("userid").head(k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=25_000_000, help="Number of ratings rows to generate")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 100], help="Values of K to benchmark")
+    parser.add_argument("--skip-full-sort", action="store_true", help="Only time top_k_per_group")
+    args = parser.parse_args()
+
+    ratings_df = gen_ratings(args.rows)
+    print(f"rows: {args.rows}")
+
+    for k in args.k:
+        start = time.perf_counter()
+        top_k_df = top_k_per_group(ratings_df, group_column="userid", k=k, order_by=TOP_MOVIES_ORDER_BY)
+        top_k_time = time.perf_counter() - start
+        print(f"k={k:<4} top_k_per_group : {top_k_time:8.3f}s  {args.rows / top_k_time:14,.0f} rows/sec")
+
+        if not args.skip_full_sort:
+            start = time.perf_counter()
+            expected_df = full_sort_top_k(ratings_df, k)
+            sort_time = time.perf_counter() - start
+            assert np.array_equal(expected_df.to_numpy(), top_k_df.to_numpy())
+            print(f"k={k:<4} full sort       : {sort_time:8.3f}s  {args.rows / sort_time:14,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
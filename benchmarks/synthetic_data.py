@@ -0,0 +1,136 @@
+"""
+Deterministic generator of a synthetic MovieLens staging zip, with the layout of ml-1m.zip and values valid for the schemas in src/schema.
+
+Usage: python benchmarks/synthetic_data.py --scale 10m --output /tmp/ml-synthetic/ml-1m.zip
+"""
+import argparse
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# At most USERS_COUNT * MOVIES_COUNT ratings, about 23.9 million, as a user rates a movie once
+SCALES = {"1m": 1_000_000, "10m": 10_000_000, "20m": 20_000_000}
+
+# Value ranges of the DQT rules in src/schema
+MOVIES_COUNT = 3952
+USERS_COUNT = 6040
+USER_AGES = [1, 18, 25, 35, 45, 50, 56]
+OCCUPATIONS_COUNT = 21
+GENRES = ["Action", "Adventure", "Animation", "Children's", "Comedy", "Crime", "Documentary", "Drama", "Fantasy", "Film-Noir", "Horror", "Musical", "Mystery", "Romance", "Sci-Fi", "Thriller", "War", "Western"]
+# Share of each rating value in ml-1m
+RATING_WEIGHTS = [0.056, 0.108, 0.261, 0.349, 0.226]
+TIMESTAMP_RANGE = (956703932, 1046454590)
+# Every ml-1m user has at least 20 ratings
+MIN_USER_RATINGS = 20
+
+RATINGS_BLOCK_ROWS = 2_000_000
+DAT_ENCODING = "ISO-8859-1"
+# Fixed member timestamp, so the same seed and scale produce a byte identical zip
+ZIP_MEMBER_DATE_TIME = (2003, 2, 28, 0, 0, 0)
+
+
+def to_dat_bytes(df):
+    """Encode a DataFrame as "::" separated .dat lines"""
+    return df.to_csv(sep="\x1f", header=False, index=False).replace("\x1f", "::").encode(DAT_ENCODING)
+
+
+def zip_member_info(name):
+    member_info = zipfile.ZipInfo(name, date_time=ZIP_MEMBER_DATE_TIME)
+    member_info.compress_type = zipfile.ZIP_DEFLATED
+    return member_info
+
+
+def gen_movies(rng):
+    movieids = np.arange(1, MOVIES_COUNT + 1)
+    years = rng.integers(1919, 2001, MOVIES_COUNT)
+    genre_counts = rng.integers(1, 4, MOVIES_COUNT)
+    genres = ["|".join(sorted(rng.choice(GENRES, size=count, replace=False))) for count in genre_counts]
+    return pd.DataFrame({"movieid": movieids, "titles": [f"Synthetic Movie {movieid} ({year})" for movieid, year in zip(movieids, years)], "genres": genres})
+
+
+def gen_users(rng):
+    return pd.DataFrame(
+        {
+            "userid": np.arange(1, USERS_COUNT + 1),
+            "gender": rng.choice(["M", "F"], USERS_COUNT),
+            "age": rng.choice(USER_AGES, USERS_COUNT),
+            "occupation": rng.integers(0, OCCUPATIONS_COUNT, USERS_COUNT),
+            "zipcode": [f"{zipcode:05d}" for zipcode in rng.integers(0, 100000, USERS_COUNT)],
+        }
+    )
+
+
+def gen_user_ratings_counts(rng, ratings_rows):
+    """
+    Number of ratings of each user, at least MIN_USER_RATINGS like in ml-1m when there are enough ratings and at most one per movie.
+
+    Raises:
+    - ValueError: When there are more ratings than (userid, movieid) pairs.
+    """
+    if ratings_rows > USERS_COUNT * MOVIES_COUNT:
+        raise ValueError(f"At most {USERS_COUNT * MOVIES_COUNT:,} ratings fit the {USERS_COUNT} users and {MOVIES_COUNT} movies with one rating per user and movie, got {ratings_rows:,}")
+    min_ratings = min(MIN_USER_RATINGS, ratings_rows // USERS_COUNT)
+    # Skewed activity, a few users rate a large share of the movies
+    weights = rng.lognormal(0, 1, USERS_COUNT)
+    counts = np.minimum(min_ratings + rng.multinomial(ratings_rows - min_ratings * USERS_COUNT, weights / weights.sum()), MOVIES_COUNT)
+    while counts.sum() < ratings_rows:
+        spare = MOVIES_COUNT - counts
+        counts = np.minimum(counts + rng.multinomial(ratings_rows - counts.sum(), spare / spare.sum()), MOVIES_COUNT)
+    return counts
+
+
+def gen_ratings_blocks(rng, ratings_rows, block_rows=RATINGS_BLOCK_ROWS):
+    """
+    Yield the ratings grouped by user like ml-1m, in blocks of about block_rows rows, so the generator memory does not grow with the scale.
+    A user rates each movie at most once.
+    """
+    user_counts = gen_user_ratings_counts(rng, ratings_rows)
+    block_userids, block_movieids, rows = [], [], 0
+    for userid, count in enumerate(user_counts, start=1):
+        block_userids.append(np.full(count, userid))
+        block_movieids.append(rng.choice(MOVIES_COUNT, count, replace=False) + 1)
+        rows += count
+        if rows >= block_rows or userid == USERS_COUNT:
+            yield pd.DataFrame(
+                {
+                    "userid": np.concatenate(block_userids),
+                    "movieid": np.concatenate(block_movieids),
+                    "ratings": rng.choice(np.arange(1, 6), rows, p=RATING_WEIGHTS),
+                    "timestamp": rng.integers(*TIMESTAMP_RANGE, rows),
+                }
+            )
+            block_userids, block_movieids, rows = [], [], 0
+
+
+def write_staging_zip(zip_file_path, ratings_rows, seed=42):
+    """
+    Write a staging zip with ml-1m/movies.dat, ml-1m/users.dat and ml-1m/ratings.dat. The same seed and ratings_rows always produce the same files.
+
+    Args:
+    - zip_file_path (str): Path of the zip file to write.
+    - ratings_rows (int): Number of ratings.
+    - seed (int): Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed)
+    with zipfile.ZipFile(zip_file_path, "w") as z:
+        z.writestr(zip_member_info("ml-1m/movies.dat"), to_dat_bytes(gen_movies(rng)))
+        z.writestr(zip_member_info("ml-1m/users.dat"), to_dat_bytes(gen_users(rng)))
+        with z.open(zip_member_info("ml-1m/ratings.dat"), "w", force_zip64=True) as ratings_file:
+            for ratings_block in gen_ratings_blocks(rng, ratings_rows):
+                ratings_file.write(to_dat_bytes(ratings_block))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="1m", help="Number of ratings")
+    parser.add_argument("--output", required=True, help="Path of the zip file to write")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    write_staging_zip(args.output, SCALES[args.scale], seed=args.seed)
+    print(f"{args.output}: {SCALES[args.scale]:,} ratings")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,20 @@ import configparser
 import shutil
 import nox
 
-try:
-    from src.app import movie_lens_analysis_pipeline
-except ModuleNotFoundError:
-    sys.path.append(".")
-    from src.app import movie_lens_analysis_pipeline
-
 nox.options.stop_on_first_error = True
 python_versions = ["3.8"]
 
 
+def import_pipeline():
+    """Import the pipeline module, deferred to the sessions running the pipeline so the other sessions do not load pandas and scipy"""
+    try:
+        from src import app
+    except ModuleNotFoundError:
+        sys.path.append(".")
+        from src import app
+    return app
+
+
 def delete_folders(folders_to_delete: list, del_folders_flag: bool = False) -> None:
     for folder in folders_to_delete:
         try:
@@ -23,7 +27,10 @@ def delete_folders(folders_to_delete: list, del_folders_flag: bool = False) -> N
             # Delete each file in the folder
             for file_name in files_in_folder:
                 file_path = os.path.join(folder, file_name)
-                os.remove(file_path)
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                else:
+                    os.remove(file_path)
                 print(f"Deleted file: {file_name} from folder {folder}")
 
             if del_folders_flag:
@@ -41,8 +48,10 @@ def clean_folders(session: nox.Session):
     raw_zone_path = config['Paths']['raw_zone_path']
     curated_zone_path = config['Paths']['curated_zone_path']
     data_product_zone_path = config['Paths']['data_product_zone_path']
+    state_zone_path = config['Paths']['state_zone_path']
+    index_zone_path = config['Paths']['index_zone_path']
 
-    folder_paths = [raw_zone_path, curated_zone_path, data_product_zone_path]
+    folder_paths = [raw_zone_path, curated_zone_path, data_product_zone_path, state_zone_path, index_zone_path]
     delete_folder_paths_list = [f"src/{x}" for x in folder_paths]
 
     delete_folders(folders_to_delete=delete_folder_paths_list, del_folders_flag=False)
@@ -50,11 +59,30 @@ def clean_folders(session: nox.Session):
 
 @nox.session(python=python_versions, reuse_venv=False, tags=['exec-pipeline'])
 def exec_pipeline(session: nox.Session):
+    app = import_pipeline()
     session.chdir('src')
-    movie_lens_analysis_pipeline('config.ini')
+    app.movie_lens_analysis_pipeline('config.ini')
     session.notify("exec_tests")
 
 
+@nox.session(python=python_versions, reuse_venv=True, tags=['run-stages'])
+def run_stages(session: nox.Session) -> None:
+    """Run the pipeline stages selected by the command line arguments, e.g. nox -s run_stages -- --stage verify_dq_load_dp_ratings"""
+    session.run("python", "-m", "src.cli", *session.posargs, external=True)
+
+
+@nox.session(python=python_versions, reuse_venv=True, tags=['serve-lookups'])
+def serve_lookups(session: nox.Session) -> None:
+    """Serve the data product lookups over HTTP, indexing the data products first if needed"""
+    app = import_pipeline()
+    from src.scripts.lookup import serve_lookups as serve_lookups_forever
+
+    session.chdir('src')
+    processor = app.DataProcessor('config.ini')
+    lookup_config = processor.config['Lookup']
+    serve_lookups_forever(processor.lookup_service(), host=lookup_config['host'], port=lookup_config.getint('port'), refresh_seconds=lookup_config.getint('refresh_seconds'))
+
+
 @nox.session(python=python_versions, reuse_venv=True, tags=['lint-files'])
 def lint_alert(session: nox.Session, folder_name: str = 'src') -> None:
     """Lint files"""
@@ -1,14 +1,32 @@
 import configparser
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
+import numpy as np
 import pandas as pd
 
-from src.scripts.dqt import validate_dataset
+from src.scripts.aggregates import RatingsAggregateState, RatingsRollupCube
+from src.scripts.aggregation import RATINGS_DATA_PRODUCTS, GroupStats, RatingsAggregationPlan, TimeRollup
+from src.scripts.cache import DatasetCache
+from src.scripts.csv_writer import AtomicCsvStorage
+from src.scripts.dqt import ChunkValidator, validate_dataset
+from src.scripts.dtypes import apply_schema_dtypes, decode_schema_columns, memory_report
 from src.scripts.exceptions import CustomErrors
-from src.scripts.load_tools import extract_and_load_dataset, gen_dataframe, prepare_file_zones
+from src.scripts.load_tools import extract_and_load_datasets, gen_dataframe, prepare_file_zones
+from src.scripts.lookup import LookupService
+from src.scripts.manifest import StageManifest, stage_config_sections
+from src.scripts.metrics import MetricsRecorder, activate_metrics_recorder, frame_rows, path_size, track_metrics
+from src.scripts.partitioning import HashPartitionedStorage
+from src.scripts.prefetch import prefetch
+from src.scripts.scheduler import StageScheduler
+from src.scripts.schema import load_file_schema
+from src.scripts.storage import get_storage
 
 
 class DataProcessor:
-    def __init__(self, config_path):
+    def __init__(self, config_path, metrics_run_id=None):
+        self.config_path = config_path
         self.config = configparser.ConfigParser()
         self.config.read(config_path)
 
@@ -17,86 +35,494 @@ class DataProcessor:
         self.curated_zone_path = self.config["Paths"]["curated_zone_path"]
         self.data_product_zone_path = self.config["Paths"]["data_product_zone_path"]
         self.datasets_schema_path = self.config["Paths"]["datasets_schema_path"]
+        self.state_zone_path = self.config["Paths"]["state_zone_path"]
+        self.index_zone_path = self.config["Paths"]["index_zone_path"]
         self.source_datasets = self.config["Data"]["source_datasets"].split(", ")
         self.source_dqt_classes = self.config["Data"]["source_dqt_classes"].split(", ")
         self.source_datasets_mapper = dict(zip(self.source_dqt_classes, self.source_datasets))
 
         self.top_movies_per_user_dataset_config = self.config["top_movies_per_user_dataset_config"]
         self.movies_with_ratings_stats_dataset_config = self.config["movies_with_ratings_stats_dataset_config"]
+        # Per movie and day rollup cube of the ratings, persisted in the State zone
+        self.rollup_config = self.config["Rollups"]
+        # Data products derived from the ratings, computed together by the verify_dq_load_dp_ratings stage
+        self.data_product_configs = {self.config[section]["file_name"]: self.config[section] for section in self.config["Aggregation"]["dataset_configs"].split(", ")}
+
+        self.zone_paths = {"curated": self.curated_zone_path, "data_product": self.data_product_zone_path}
+        # CSV datasets and exports are formatted by worker processes and published atomically with a checksum file
+        self.csv_storage = AtomicCsvStorage(
+            workers=self.config.getint("Storage", "csv_write_workers", fallback=1),
+            chunk_rows=self.config.getint("Storage", "csv_chunk_rows", fallback=250000),
+            compression=self.config.get("Storage", "csv_compression", fallback="none"),
+            compression_level=self.config.getint("Storage", "csv_compression_level", fallback=None),
+        )
+        zone_formats = {zone: self.config.get("Storage", f"{zone}_zone_format", fallback="csv") for zone in self.zone_paths}
+        self.zone_storage = {zone: self.csv_storage if format_name == "csv" else get_storage(format_name) for zone, format_name in zone_formats.items()}
+        self.csv_export = self.config.getboolean("Storage", "csv_export", fallback=False)
+
+        # Curated datasets hash partitioned into bucket directories, stored in the curated zone format
+        self.partitioned_datasets = {}
+        self.partition_workers = None
+        if self.config.getboolean("Partitioning", "enabled", fallback=False):
+            partitioning_config = self.config["Partitioning"]
+            partitioned_storage = HashPartitionedStorage(self.zone_storage["curated"], column=partitioning_config["column"], buckets=partitioning_config.getint("buckets"))
+            self.partitioned_datasets = {dataset_name: partitioned_storage for dataset_name in partitioning_config["datasets"].split(", ")}
+            self.partition_workers = partitioning_config.getint("max_workers", fallback=None)
+
+        # Data products indexed for the lookup service, with their key column
+        self.lookup_keys = {}
+        if self.config.getboolean("Lookup", "enabled", fallback=False):
+            self.lookup_keys = {file_name: dataset_config["lookup_key"] for file_name, dataset_config in self.data_product_configs.items() if dataset_config.get("lookup_key")}
+
+        self.dataset_cache = None
+        if self.config.getboolean("Cache", "enabled", fallback=False):
+            self.dataset_cache = DatasetCache(memory_budget_bytes=self.config.getint("Cache", "memory_budget_mb") * 1024**2)
+
+        self.chunk_rows = None
+        self.prefetch_chunks = 0
+        if self.config.getboolean("Chunking", "enabled", fallback=False):
+            self.chunk_rows = self.config.getint("Chunking", "chunk_rows")
+            self.prefetch_chunks = self.config.getint("Chunking", "prefetch_chunks", fallback=0)
+
+        # Streaming DQTs run in one pass over chunks of the datasets and can stop at the first failing chunk
+        self.dqt_streaming = self.config.getboolean("DQT", "streaming", fallback=False)
+        self.dqt_chunk_rows = self.config.getint("DQT", "chunk_rows", fallback=1000000)
+        self.dqt_unique_check = self.config.get("DQT", "unique_check", fallback="exact")
+        self.dqt_fail_fast = self.config.getboolean("DQT", "fail_fast", fallback=False)
+        self.dqt_report_path = self.config.get("DQT", "report_path", fallback="")
+        self.dqt_max_report_rows = self.config.getint("DQT", "max_report_rows", fallback=1000)
+
+        self.manifest = None
+        if self.config.getboolean("Incremental", "enabled", fallback=False):
+            self.manifest = StageManifest(self.config["Incremental"]["manifest_path"])
+
+        self.metrics_recorder = None
+        self.profile_stage = self.config.get("Metrics", "profile_stage", fallback="")
+        self.profiler = self.config.get("Metrics", "profiler", fallback="cprofile")
+        if self.config.getboolean("Metrics", "enabled", fallback=False):
+            self.metrics_recorder = MetricsRecorder(self.config["Metrics"]["metrics_path"], run_id=metrics_run_id)
+            activate_metrics_recorder(self.metrics_recorder)
 
     def prepare_infra(self):
         """Create the Directories to save the processed files"""
-        prepare_file_zones([self.raw_zone_path, self.curated_zone_path, self.data_product_zone_path])
+        prepare_file_zones([self.raw_zone_path, self.curated_zone_path, self.data_product_zone_path, self.state_zone_path, self.index_zone_path])
         return
 
-    def staging_to_raw(self):
-        """Extract dat files from zip folders"""
+    def dataset_storage(self, zone, file_name):
+        """Storage of a dataset: the zone storage format, hash partitioned for the datasets of the Partitioning section"""
+        if zone == "curated" and file_name in self.partitioned_datasets:
+            return self.partitioned_datasets[file_name]
+        return self.zone_storage[zone]
+
+    def zone_dataset_paths(self, zone, file_name):
+        """Paths a dataset is persisted to in a zone, including the CSV export"""
+        storage = self.dataset_storage(zone, file_name)
+        paths = [storage.dataset_path(self.zone_paths[zone], file_name)]
+        if self.csv_export and storage.format_name != "csv":
+            paths.append(self.csv_storage.dataset_path(self.zone_paths[zone], file_name))
+        return paths
+
+    def dataset_fingerprint(self, zone, file_name):
+        """Content digest of a dataset of a zone, reusing the file digests of the stage manifest when it is enabled"""
+        manifest = self.manifest if self.manifest is not None else StageManifest()
+        return manifest.path_digest(self.dataset_storage(zone, file_name).dataset_path(self.zone_paths[zone], file_name))
+
+    def stage_specs(self):
+        """Dependencies, input paths, config sections and output paths of each pipeline stage, in declaration order"""
+        curated_ratings_path = self.zone_dataset_paths("curated", "ratings")[0]
+        movie_ratings_config = self.movies_with_ratings_stats_dataset_config
+        ratings_plan = self.ratings_aggregation_plan()
+        ratings_batches_path = self.ratings_batches_path()
+
+        movie_ratings_append_inputs = [] if ratings_batches_path is None else [ratings_batches_path]
+        movie_ratings_append_outputs = []
+        if movie_ratings_config.get("mode", "full") == "append":
+            movie_ratings_append_outputs = [f"{self.state_zone_path}/{movie_ratings_config['state_name']}"]
+        if TimeRollup("day").key in ratings_plan.aggregates:
+            movie_ratings_append_outputs.append(f"{self.state_zone_path}/{self.rollup_config['state_name']}")
+
+        stage_specs = {
+            "staging_to_raw": {
+                "depends_on": [],
+                "inputs": [self.raw_zip_file_path],
+                "config_sections": ["Data", "Staging"],
+                "outputs": [f"{self.raw_zone_path}/{dataset}" for dataset in self.source_datasets],
+            },
+        }
+
+        # Each source dataset is verified and loaded to the Curated zone by its own stage
         for dataset in self.source_datasets:
-            extract_and_load_dataset(self.raw_zip_file_path, self.raw_zone_path, dataset)
-        print("Raw files loaded")
+            dataset_name = dataset.split(".")[0]
+            stage_specs[f"verify_dq_load_curated_{dataset_name}"] = {
+                "depends_on": ["staging_to_raw"],
+                "inputs": [f"{self.raw_zone_path}/{dataset}", f"{self.datasets_schema_path}/{dataset_name}.yml"],
+                "config_sections": ["Data", "Storage", "Chunking", "Partitioning"],
+                "outputs": self.zone_dataset_paths("curated", dataset_name),
+            }
+
+        # The data products derived from the ratings are built together from one scan of the curated ratings
+        stage_specs["verify_dq_load_dp_ratings"] = {
+            "depends_on": ["verify_dq_load_curated_ratings"] + [f"verify_dq_load_curated_{dataset_name}" for dataset_name in ratings_plan.dimensions],
+            "inputs": [curated_ratings_path]
+            + [self.zone_dataset_paths("curated", dataset_name)[0] for dataset_name in ratings_plan.dimensions]
+            + [f"{self.datasets_schema_path}/{dataset_config['schema_file_name']}" for dataset_config in self.data_product_configs.values()]
+            + movie_ratings_append_inputs,
+            "config_sections": ["Aggregation"] + [dataset_config.name for dataset_config in self.data_product_configs.values()] + ["Rollups", "Storage", "Chunking", "Partitioning"],
+            "outputs": [path for file_name in self.data_product_configs for path in self.zone_dataset_paths("data_product", file_name)] + movie_ratings_append_outputs,
+        }
+
+        if self.lookup_keys:
+            stage_specs["build_lookup_indexes"] = {
+                "depends_on": ["verify_dq_load_dp_ratings"],
+                "inputs": [self.zone_dataset_paths("data_product", file_name)[0] for file_name in self.lookup_keys],
+                "config_sections": ["Lookup", "Storage"],
+                "outputs": [f"{self.index_zone_path}/{file_name}" for file_name in self.lookup_keys],
+            }
+        return stage_specs
+
+    def execute_stage(self, stage_name):
+        """Run the processing of a pipeline stage, without looking at the manifest, recording its metrics and profiling it when configured"""
+        if self.metrics_recorder is None:
+            self.run_stage_processing(stage_name)
+            return
+
+        stage_spec = self.stage_specs()[stage_name]
+        with self.metrics_recorder.measure(stage_name, kind="stage") as record:
+            record["bytes_read"] = sum(path_size(path) or 0 for path in stage_spec["inputs"])
+            if stage_name == self.profile_stage:
+                with self.metrics_recorder.profile(stage_name, self.profiler):
+                    self.run_stage_processing(stage_name)
+            else:
+                self.run_stage_processing(stage_name)
+            record["bytes_written"] = sum(path_size(path) or 0 for path in stage_spec["outputs"])
+
+    def run_stage_processing(self, stage_name):
+        """Call the DataProcessor method of a pipeline stage"""
+        if stage_name.startswith("verify_dq_load_curated_"):
+            dataset_name = stage_name[len("verify_dq_load_curated_") :]
+            validator_name = next(validator_name for validator_name, dataset in self.source_datasets_mapper.items() if dataset.split(".")[0] == dataset_name)
+            self.verify_dq_load_curated_dataset(validator_name)
+            return
+        getattr(self, stage_name)()
+
+    def stage_fingerprint(self, stage_name, stage_spec):
+        """Fingerprint of the stage inputs and config, and the reason to rebuild the stage or None when it is up to date"""
+        fingerprint = self.manifest.stage_fingerprint(stage_spec["inputs"], stage_config_sections(self.config, stage_spec["config_sections"]))
+        return fingerprint, self.manifest.outdated_reason(stage_name, fingerprint, stage_spec["outputs"])
+
+    def should_run_stage(self, stage_name):
+        """Check the manifest for a stage about to be run, logging whether it is skipped or rebuilt"""
+        if self.manifest is None:
+            return True
+
+        _, outdated_reason = self.stage_fingerprint(stage_name, self.stage_specs()[stage_name])
+        if outdated_reason is None:
+            print(f"Stage: {stage_name}, skipped, inputs unchanged since the last build")
+            return False
+
+        print(f"Stage: {stage_name}, rebuilding, {outdated_reason}")
+        return True
+
+    def record_stage(self, stage_name):
+        """Record the fingerprint of a stage that was just built in the manifest"""
+        if self.manifest is None:
+            return
+
+        stage_spec = self.stage_specs()[stage_name]
+        fingerprint, _ = self.stage_fingerprint(stage_name, stage_spec)
+        self.manifest.record(stage_name, fingerprint, stage_spec["outputs"])
+        self.manifest.save()
+
+    def run_stage(self, stage_name):
+        """
+        Run a pipeline stage, skipping it when the manifest shows its inputs are unchanged since the last build.
+
+        Returns:
+        - executed (bool): False when the stage was skipped.
+        """
+        if not self.should_run_stage(stage_name):
+            return False
+
+        self.execute_stage(stage_name)
+        self.record_stage(stage_name)
+        return True
+
+    def run_pipeline(self, stages=None, force=False):
+        """
+        Run the pipeline stages with the scheduler configured in the Scheduler section, each stage as soon as the stages it depends on completed.
+
+        Args:
+        - stages (list): Names of the stages to run, every stage by default. Dependencies left out of the selection are
+          not run, the selected stages read their existing outputs.
+        - force (bool): Run the selected stages even when the manifest shows their inputs are unchanged.
+
+        Returns:
+        - executed (list): Names of the stages that were run, skipped stages excluded.
+
+        Raises:
+        - DpDqtError: Re-raised unchanged when a stage fails its DQTs, the stages depending on it are not run.
+        - StageGraphError: When a selected stage is not a pipeline stage.
+        """
+        stage_specs = self.stage_specs()
+        selected_stages = list(stage_specs) if stages is None else list(stages)
+        unknown_stages = sorted(set(selected_stages) - stage_specs.keys())
+        if unknown_stages:
+            raise CustomErrors.StageGraphError(f"Unknown stages {unknown_stages}, pipeline stages: {', '.join(stage_specs)}")
+
+        executor = self.config.get("Scheduler", "executor", fallback="thread")
+        scheduler = StageScheduler(
+            {stage_name: [dependency for dependency in stage_spec["depends_on"] if dependency in selected_stages] for stage_name, stage_spec in stage_specs.items() if stage_name in selected_stages},
+            executor=executor,
+            max_workers=self.config.getint("Scheduler", "max_workers", fallback=None),
+        )
+
+        def stage_task(stage_name):
+            if executor == "process":
+                # Worker processes build their own DataProcessor from the config, the manifest stays with the scheduling process
+                return execute_pipeline_stage, (self.config_path, stage_name, None if self.metrics_recorder is None else self.metrics_recorder.run_id)
+            return self.execute_stage, (stage_name,)
+
+        return scheduler.run(stage_task, should_run=None if force else self.should_run_stage, on_success=self.record_stage)
+
+    def staging_to_raw(self):
+        """Extract dat files from zip folders, skipping the files already extracted from the same archive"""
+        extraction_status = extract_and_load_datasets(
+            self.raw_zip_file_path,
+            self.raw_zone_path,
+            self.source_datasets,
+            max_workers=self.config.getint("Staging", "extract_workers", fallback=None),
+            chunk_size=self.config.getint("Staging", "extract_chunk_size_kb", fallback=1024) * 1024,
+        )
+        print(f"Raw files loaded: {extraction_status}")
 
     def verify_dq_load_curated(self):
         """Verify Data quality and Load files to Curated zone"""
-        datasets_mapper = self.source_datasets_mapper
-        for validator_name in datasets_mapper:
-            dataset = datasets_mapper[validator_name]
-            validation_dataset_name = dataset.split(".")[0]
-            file_schema_path = f"{self.datasets_schema_path}/{validation_dataset_name}.yml"
-            raw_file_file_path = f"{self.raw_zone_path}/{dataset}"
-
-            dataset_df = gen_dataframe(raw_file_file_path, file_schema_path)
-
-            # Perform validation on the DataFrame
-            self.verify_data_product_quality(file_name=validation_dataset_name, dqt_class=validator_name, dataset_df=dataset_df, file_schema_path=file_schema_path)
-
-            print("Loading file to Curated Zone")
-            self.df_to_csv(target_path=self.curated_zone_path, df=dataset_df, file_name=validation_dataset_name)
-
-    def verify_dq_load_dp_movie_ratings(self):
-        """Create the data product - All movies with a rating"""
-        # Step 1: Read curated movies.csv and ratings.csv into Pandas DataFrames
-        movies_df = pd.read_csv(f"{self.curated_zone_path}/movies.csv")
-        ratings_df = pd.read_csv(f"{self.curated_zone_path}/ratings.csv")
-
-        # Step 2: Create a new DataFrame with max, min, and average ratings for each movie
-        movie_ratings_stats = ratings_df.groupby("movieid")["ratings"].agg(["max", "min", "mean"]).reset_index()
-        movie_ratings_stats.columns = ["movieid", "max_rating", "min_rating", "avg_rating"]
-        movies_with_ratings_stats = pd.merge(movies_df, movie_ratings_stats, on="movieid", how="left")
-
-        # Step 3: Perform Data Quality
-        file_name = self.movies_with_ratings_stats_dataset_config["file_name"]
-        file_schema_path = f"{self.datasets_schema_path}/{self.movies_with_ratings_stats_dataset_config['schema_file_name']}"
-        dqt_class = self.movies_with_ratings_stats_dataset_config["dqt_class"]
-        self.verify_data_product_quality(file_name=file_name, dqt_class=dqt_class, dataset_df=movies_with_ratings_stats, file_schema_path=file_schema_path)
-
-        # Step 4: Load Curated
-        print("Loading file to Data Product Zone")
-        self.df_to_csv(target_path=self.data_product_zone_path, df=movies_with_ratings_stats, file_name=file_name)
-
-    def verify_dq_load_dp_top_user_ratings(self):
-        """Create the data product - Top 3 movies per User"""
-        # Step 1: Read curated movies.csv and ratings.csv into Pandas DataFrames
-        movies_df = pd.read_csv(f"{self.curated_zone_path}/movies.csv")
-        ratings_df = pd.read_csv(f"{self.curated_zone_path}/ratings.csv")
-
-        # Step 2: Create a new DataFrame containing each user's top 3 movies based on their ratings
-        top_movies_per_user = ratings_df.sort_values(by=["userid"], ascending=[True]).groupby("userid").head(3)
-        top_movies_per_user = pd.merge(top_movies_per_user, movies_df, on="movieid", how="left")
-
-        # Step 3: Perform Data Quality
-        file_name = self.top_movies_per_user_dataset_config["file_name"]
-        file_schema_path = f"{self.datasets_schema_path}/{self.top_movies_per_user_dataset_config['schema_file_name']}"
-        dqt_class = self.top_movies_per_user_dataset_config["dqt_class"]
-        self.verify_data_product_quality(file_name=file_name, dqt_class=dqt_class, dataset_df=top_movies_per_user, file_schema_path=file_schema_path)
-
-        # Step 4: Load Curated
-        print("Loading file to Data Product Zone")
-        self.df_to_csv(target_path=self.data_product_zone_path, df=top_movies_per_user, file_name=file_name)
+        for validator_name in self.source_datasets_mapper:
+            self.verify_dq_load_curated_dataset(validator_name)
+
+    def verify_dq_load_curated_dataset(self, validator_name):
+        """Verify Data quality and Load the source dataset checked by validator_name to Curated zone"""
+        dataset = self.source_datasets_mapper[validator_name]
+        validation_dataset_name = dataset.split(".")[0]
+        file_schema_path = f"{self.datasets_schema_path}/{validation_dataset_name}.yml"
+        raw_file_file_path = f"{self.raw_zone_path}/{dataset}"
+
+        if self.chunk_rows:
+            # Validate and load the dataset chunk by chunk, the curated dataset is only published once every chunk passed validation
+            dataset_chunks = gen_dataframe(raw_file_file_path, file_schema_path, chunksize=self.chunk_rows)
+            if self.prefetch_chunks:
+                # Pipelined: the next chunks are parsed by one background thread and validated by another while the current chunk is written
+                dataset_chunks = prefetch(dataset_chunks, depth=self.prefetch_chunks, name=f"parse_{validation_dataset_name}")
+            validated_chunks = self.verify_chunks_quality(file_name=validation_dataset_name, dqt_class=validator_name, chunks=dataset_chunks, file_schema_path=file_schema_path)
+            if self.prefetch_chunks:
+                validated_chunks = prefetch(validated_chunks, depth=self.prefetch_chunks, name=f"validate_{validation_dataset_name}")
+            print("Loading file to Curated Zone in chunks")
+            self.write_dataset_chunks(zone="curated", chunks=validated_chunks, file_name=validation_dataset_name)
+            return
+
+        dataset_df = gen_dataframe(raw_file_file_path, file_schema_path)
+        self.print_memory_report(validation_dataset_name, dataset_df)
+
+        # Perform validation on the DataFrame
+        self.verify_data_product_quality(file_name=validation_dataset_name, dqt_class=validator_name, dataset_df=dataset_df, file_schema_path=file_schema_path)
+
+        print("Loading file to Curated Zone")
+        self.write_dataset(zone="curated", df=dataset_df, file_name=validation_dataset_name)
+
+    def append_mode_configs(self):
+        """Config sections of the aggregate states in append mode: the per-movie aggregate state and the rollup cube"""
+        return [dataset_config for dataset_config in [self.movies_with_ratings_stats_dataset_config, self.rollup_config] if dataset_config.get("mode", "full") == "append"]
+
+    def ratings_batches_path(self):
+        """
+        Folder of the ratings batch files, when an aggregate state is in append mode.
+
+        Returns:
+        - incremental_ratings_path (str): incremental_ratings_path of the states in append mode, None when every state is in full mode.
+
+        Raises:
+        - ValueError: When the states in append mode fold different folders, so the data products would cover different ratings.
+        """
+        paths = sorted({dataset_config["incremental_ratings_path"] for dataset_config in self.append_mode_configs()})
+        if len(paths) > 1:
+            raise ValueError(f"The aggregate states in append mode must fold the same incremental_ratings_path, got {paths}")
+        return paths[0] if paths else None
+
+    def ratings_aggregation_plan(self):
+        """Plan of the data products derived from the ratings, leaving the per-movie aggregates and the rollup cube out of the scan in append mode as they are folded from the ratings batches"""
+        products = {file_name: RATINGS_DATA_PRODUCTS[dataset_config["product_class"]](dataset_config) for file_name, dataset_config in self.data_product_configs.items()}
+        precomputed_keys = [GroupStats("movieid").key] if self.movies_with_ratings_stats_dataset_config.get("mode", "full") == "append" else []
+        if self.rollup_config.get("mode", "full") == "append":
+            precomputed_keys.append(TimeRollup("day").key)
+        return RatingsAggregationPlan(products, precomputed_keys=precomputed_keys)
+
+    def ratings_scan_columns(self, plan):
+        """Curated ratings columns read by the scan of a plan"""
+        return plan.scan_columns([col["name"] for col in self.dataset_schema("curated", "ratings")["columns"]])
+
+    def scan_ratings(self, buckets=None):
+        """Aggregates of the ratings data products from one scan of the curated ratings, or of the given buckets of the partitioned ratings, chunk by chunk in chunked mode"""
+        plan = self.ratings_aggregation_plan()
+        columns = self.ratings_scan_columns(plan)
+        if not columns:
+            return {}
+
+        if self.chunk_rows:
+            chunks = self.read_dataset_chunks(zone="curated", file_name="ratings", columns=columns, buckets=buckets)
+            if self.prefetch_chunks:
+                # The next chunks are read while the current one is aggregated
+                chunks = prefetch(chunks, depth=self.prefetch_chunks, name="read_ratings")
+        else:
+            chunks = [self.read_dataset(zone="curated", file_name="ratings", columns=columns, buckets=buckets)]
+        return plan.scan(chunks)
+
+    def read_ratings_batches(self, incremental_ratings_path, columns):
+        """Ratings of every batch file of the incremental ratings folder, chunk by chunk in chunked mode"""
+        ratings_schema_path = f"{self.datasets_schema_path}/ratings.yml"
+        for batch in ratings_batch_files(incremental_ratings_path):
+            batch_file_path = f"{incremental_ratings_path}/{batch}"
+            batch_chunks = gen_dataframe(batch_file_path, ratings_schema_path, chunksize=self.chunk_rows) if self.chunk_rows else [gen_dataframe(batch_file_path, ratings_schema_path)]
+            for batch_df in batch_chunks:
+                yield batch_df[columns]
+
+    def verify_dq_load_dp_ratings(self):
+        """Create the data products derived from the ratings - All movies with a rating, Top K movies per User, Ratings per Genre and per Demographic, Similar Movies, Rating Windows and Monthly Ratings per Movie"""
+        plan = self.ratings_aggregation_plan()
+
+        # Step 1: Compute the aggregates of all data products in one shared scan of the curated ratings, or one scan per ratings partition each run by a worker process
+        if "ratings" in self.partitioned_datasets:
+            results = plan.merge(self.map_ratings_partitions(ratings_scan_partition))
+        else:
+            results = self.scan_ratings()
+
+        # In append mode the per-movie aggregates and the rollup cube are folded from the new ratings batches, and every
+        # ratings batch is also fed to the other aggregates, so all data products cover the curated ratings and the same batches
+        if GroupStats("movieid").key in plan.precomputed_keys:
+            results[GroupStats("movieid").key] = self.fold_ratings_batches(self.movies_with_ratings_stats_dataset_config, RatingsAggregateState.load, RatingsAggregateState.from_ratings, ["movieid", "ratings"])
+        if TimeRollup("day").key in plan.precomputed_keys:
+            results[TimeRollup("day").key] = self.fold_ratings_batches(self.rollup_config, RatingsRollupCube.load, partial(RatingsRollupCube.from_ratings, bucket="day"), TimeRollup.columns)
+
+        ratings_batches_path = self.ratings_batches_path()
+        columns = self.ratings_scan_columns(plan)
+        if ratings_batches_path is not None and columns:
+            results = plan.merge([results, plan.scan(self.read_ratings_batches(ratings_batches_path, columns))])
+
+        # Without append mode the rollup cube is saved to the State zone for windowed queries
+        if TimeRollup("day").key in results and TimeRollup("day").key not in plan.precomputed_keys:
+            results[TimeRollup("day").key].save(self.state_zone_path, self.rollup_config["state_name"])
+
+        # Step 2: Read the curated dimension datasets and build each data product from the shared aggregates
+        dimensions = {dataset_name: self.read_dataset(zone="curated", file_name=dataset_name) for dataset_name in plan.dimensions}
+        dimension_schemas = {dataset_name: self.dataset_schema("curated", dataset_name) for dataset_name in plan.dimensions}
+        data_products = plan.build(results, dimensions, dimension_schemas)
+
+        # Step 3: Perform Data Quality on every data product before any of them is loaded
+        for file_name, dataset_df in data_products.items():
+            dataset_config = self.data_product_configs[file_name]
+            file_schema_path = f"{self.datasets_schema_path}/{dataset_config['schema_file_name']}"
+            schema_variables = plan.products[file_name].schema_variables()
+            self.verify_data_product_quality(file_name=file_name, dqt_class=dataset_config["dqt_class"], dataset_df=dataset_df, file_schema_path=file_schema_path, schema_variables=schema_variables)
+
+        # Step 4: Load Data Products
+        for file_name, dataset_df in data_products.items():
+            print(f"Loading file to Data Product Zone: {file_name}")
+            self.write_dataset(zone="data_product", df=dataset_df, file_name=file_name)
+
+    @track_metrics()
+    def fold_ratings_batches(self, dataset_config, load_state, state_from_ratings, columns):
+        """
+        Fold the new ratings batch files into a persisted aggregate state of the ratings.
+
+        The state is bootstrapped from the curated ratings on the first run, and again whenever the content
+        fingerprint of the curated ratings differs from the one recorded with the state, so batches are never folded
+        into aggregates of other curated ratings. Every batch file of the incremental ratings folder that was not
+        folded yet passes the ratings DQTs and is merged into the state. With
+        verify_incremental enabled, the state is compared to a full recompute over the curated ratings and all
+        folded batches.
+
+        Args:
+        - dataset_config (configparser.SectionProxy): Section with the state_name, incremental_ratings_path and verify_incremental of the state.
+        - load_state (callable): Called with the state zone path and the state name, returns the persisted state or None.
+        - state_from_ratings (callable): Called with ratings and the batches keyword, returns the state of the ratings.
+        - columns (list): Ratings columns the state is computed from.
+
+        Returns:
+        - ratings_state: The state with every batch folded, such as a RatingsAggregateState or a RatingsRollupCube.
+        """
+        state_name = dataset_config["state_name"]
+        incremental_ratings_path = dataset_config["incremental_ratings_path"]
+        ratings_schema_path = f"{self.datasets_schema_path}/ratings.yml"
+        ratings_dqt_class = {dataset: validator_name for validator_name, dataset in self.source_datasets_mapper.items()}["ratings.dat"]
+
+        curated_fingerprint = self.dataset_fingerprint(zone="curated", file_name="ratings")
+        ratings_state = load_state(self.state_zone_path, state_name)
+        if ratings_state is None or ratings_state.source_fingerprint != curated_fingerprint:
+            reason = "not found" if ratings_state is None else "built from other curated ratings"
+            print(f"Aggregate state: {state_name}, {reason}, bootstrapping it from the curated ratings")
+            ratings_state = state_from_ratings(self.read_dataset(zone="curated", file_name="ratings", columns=columns), batches=[])
+            ratings_state.source_fingerprint = curated_fingerprint
+
+        new_batches = [batch for batch in ratings_batch_files(incremental_ratings_path) if batch not in ratings_state.batches]
+
+        for batch in new_batches:
+            batch_df = gen_dataframe(f"{incremental_ratings_path}/{batch}", ratings_schema_path)
+            self.verify_data_product_quality(file_name=batch, dqt_class=ratings_dqt_class, dataset_df=batch_df, file_schema_path=ratings_schema_path)
+            ratings_state = ratings_state.merge(state_from_ratings(batch_df, batches=[batch]))
+
+        ratings_state.save(self.state_zone_path, state_name)
+        print(f"Aggregate state: {state_name}, folded {len(new_batches)} new ratings batches")
+
+        if dataset_config.getboolean("verify_incremental", fallback=False):
+            ratings_df = self.read_dataset(zone="curated", file_name="ratings", columns=columns)
+            batch_dfs = [gen_dataframe(f"{incremental_ratings_path}/{batch}", ratings_schema_path)[columns] for batch in ratings_state.batches]
+            full_state = state_from_ratings(pd.concat([ratings_df] + batch_dfs, ignore_index=True), batches=[])
+
+            if not ratings_state.matches(full_state):
+                raise CustomErrors.IncrementalStateError(f"Aggregate state: {state_name}, does not match a full recompute of the ratings")
+            print(f"Aggregate state: {state_name}, matches a full recompute of the ratings")
+
+        return ratings_state
+
+    def map_ratings_partitions(self, partition_task, *task_args):
+        """
+        Run a task over every bucket of the partitioned curated ratings, each bucket in a worker process.
+
+        Args:
+        - partition_task (callable): Module level function called with the config path, the bucket, the task_args and the metrics run id.
+        - task_args: Extra arguments of the task.
+
+        Returns:
+        - results (list): Result of the task for each bucket, in bucket order.
+        """
+        buckets = self.partitioned_datasets["ratings"].buckets
+        metrics_run_id = self.metrics_recorder.run_id if self.metrics_recorder is not None else None
+        with ProcessPoolExecutor(max_workers=self.partition_workers) as executor:
+            futures = [executor.submit(partition_task, self.config_path, bucket, *task_args, metrics_run_id=metrics_run_id) for bucket in range(buckets)]
+            return [future.result() for future in futures]
+
+    def lookup_service(self):
+        """Lookup service over the indexed data products, rebuilding the indexes of the data products that changed since they were built"""
+        return LookupService(self.index_zone_path, self.data_product_zone_path, self.zone_storage["data_product"], self.lookup_keys)
+
+    def build_lookup_indexes(self):
+        """Index the data products on their lookup key for the lookup service"""
+        self.lookup_service()
+
+    @track_metrics(rows_in=lambda call_arguments: frame_rows(call_arguments["dataset_df"]))
+    def verify_data_product_quality(self, file_name, dqt_class, dataset_df, file_schema_path, schema_variables=None):
+        """Helper to execute the DQTs, streamed over chunks of chunk_rows rows of the DQT section in streaming mode"""
+        if self.dqt_streaming:
+            dataset_chunks = (dataset_df.iloc[start : start + self.dqt_chunk_rows] for start in range(0, max(len(dataset_df), 1), self.dqt_chunk_rows))
+            for _ in self.verify_chunks_quality(file_name=file_name, dqt_class=dqt_class, chunks=dataset_chunks, file_schema_path=file_schema_path, schema_variables=schema_variables):
+                pass
+            return
+
+        dqt_result = validate_dataset(validator_name=dqt_class, df=dataset_df, file_schema_path=file_schema_path, schema_variables=schema_variables)
+        DataProcessor.check_dqt_result(file_name=file_name, dqt_result=dqt_result)
 
     @staticmethod
-    def verify_data_product_quality(file_name, dqt_class, dataset_df, file_schema_path):
-        """Helper to execute the DQTs"""
-        dqt_result = validate_dataset(validator_name=dqt_class, df=dataset_df, file_schema_path=file_schema_path)
+    def check_dqt_result(file_name, dqt_result):
+        """Raise DpDqtError when any of the DQT results failed"""
         all_true_results = all(dqt_result.values())
 
         if all_true_results and dqt_result:
@@ -106,28 +532,200 @@ class DataProcessor:
         else:
             print(f"Data Validation for dataset: {file_name}, not enabled")
 
+    def verify_chunks_quality(self, file_name, dqt_class, chunks, file_schema_path, schema_variables=None):
+        """
+        Helper to execute the DQTs chunk by chunk, yielding each chunk once validated.
+
+        DpDqtError is raised after the last chunk if any check failed, or at the first failing chunk with fail_fast,
+        once the rows breaking the checks are written to the DQT report.
+        """
+        chunk_validator = ChunkValidator(validator_name=dqt_class, file_schema_path=file_schema_path, unique_check=self.dqt_unique_check, fail_fast=self.dqt_fail_fast, max_report_rows=self.dqt_max_report_rows, schema_variables=schema_variables)
+        for chunk in chunks:
+            if not chunk_validator.validate(chunk) and self.dqt_fail_fast:
+                print(f"Dataset: {file_name}, validation stopped at the first failing chunk, rows {chunk_validator.rows - len(chunk)} to {chunk_validator.rows - 1}")
+                break
+            yield chunk
+
+        self.write_dqt_report(file_name, chunk_validator)
+        self.check_dqt_result(file_name=file_name, dqt_result=chunk_validator.results)
+
+    def write_dqt_report(self, file_name, chunk_validator):
+        """Write the rows breaking the DQTs of a dataset to <report_path>/<file_name>.csv, removing the report of an earlier run once the dataset passes"""
+        if not self.dqt_report_path:
+            return
+        report_file_path = f"{self.dqt_report_path}/{file_name}.csv"
+        if chunk_validator.report:
+            os.makedirs(self.dqt_report_path, exist_ok=True)
+            chunk_validator.report_frame().to_csv(report_file_path, index=False)
+            print(f"Dataset: {file_name}, DQT report of {len(chunk_validator.report)} rows saved to {report_file_path}")
+        elif os.path.exists(report_file_path):
+            os.remove(report_file_path)
+
+    @track_metrics(rows_in=lambda call_arguments: frame_rows(call_arguments["df"]), bytes_written=lambda call_arguments: dataset_size(call_arguments))
+    def write_dataset(self, zone, df, file_name):
+        """Persist a dataset in the storage format configured for the zone, with an optional CSV export. CSV files hold the multi-hot columns as their labels"""
+        storage = self.dataset_storage(zone, file_name)
+        storage.write(self.csv_frame(zone, file_name, df) if storage.format_name == "csv" else df, self.zone_paths[zone], file_name)
+
+        if self.dataset_cache is not None:
+            self.dataset_cache.put(zone, file_name, df)
+
+        if self.csv_export and storage.format_name != "csv":
+            self.csv_storage.write(self.csv_frame(zone, file_name, df), self.zone_paths[zone], file_name)
+
+    @track_metrics(bytes_written=lambda call_arguments: dataset_size(call_arguments))
+    def write_dataset_chunks(self, zone, chunks, file_name):
+        """Persist a dataset from an iterator of chunks in the storage format configured for the zone, with an optional CSV export"""
+        storage = self.dataset_storage(zone, file_name)
+        if storage.format_name == "csv":
+            chunks = (self.csv_frame(zone, file_name, chunk) for chunk in chunks)
+        storage.write_chunks(chunks, self.zone_paths[zone], file_name)
+
+        if self.dataset_cache is not None:
+            self.dataset_cache.invalidate(zone, file_name)
+
+        if self.csv_export and storage.format_name != "csv":
+            export_chunks = (self.csv_frame(zone, file_name, chunk) for chunk in storage.read_chunks(self.zone_paths[zone], file_name, chunk_rows=self.chunk_rows))
+            self.csv_storage.write_chunks(export_chunks, self.zone_paths[zone], file_name)
+
+    def read_dataset_chunks(self, zone, file_name, columns=None, filters=None, buckets=None):
+        """Read a dataset, or only the given columns of it, as DataFrames of at most chunk_rows rows. See read_dataset for the filters and buckets"""
+        read_columns = self.filter_read_columns(columns, filters)
+        if self.dataset_cache is not None and buckets is None:
+            cached_df = self.dataset_cache.get(zone, file_name, columns=read_columns)
+            if cached_df is not None:
+                cached_df = filter_rows(cached_df, filters, columns)
+                for start in range(0, len(cached_df), self.chunk_rows):
+                    yield cached_df.iloc[start : start + self.chunk_rows]
+                return
+
+        storage = self.dataset_storage(zone, file_name)
+        for chunk in storage.read_chunks(self.zone_paths[zone], file_name, columns=read_columns, chunk_rows=self.chunk_rows, **self.partition_read_options(storage, filters, buckets)):
+            chunk = filter_rows(self.typed_frame(zone, file_name, chunk) if storage.format_name == "csv" else chunk, filters, columns)
+            if len(chunk):
+                yield chunk
+
+    @track_metrics(rows_out=frame_rows)
+    def read_dataset(self, zone, file_name, columns=None, filters=None, buckets=None):
+        """
+        Read a dataset, or only the given columns of it, from the dataset cache or the storage format configured for the zone.
+
+        Args:
+        - filters (dict): Values to keep for some columns, e.g. {"userid": [1, 2]}. When the dataset is hash partitioned
+          on one of these columns, only the buckets holding the requested values are read.
+        - buckets (list): Buckets to read of a hash partitioned dataset, bypassing the dataset cache.
+
+        Raises:
+        - ValueError: When buckets are given for a dataset that is not hash partitioned.
+        """
+        read_columns = self.filter_read_columns(columns, filters)
+        if self.dataset_cache is not None and buckets is None:
+            cached_df = self.dataset_cache.get(zone, file_name, columns=read_columns)
+            if cached_df is not None:
+                return filter_rows(cached_df, filters, columns)
+
+        storage = self.dataset_storage(zone, file_name)
+        dataset_df = storage.read(self.zone_paths[zone], file_name, columns=read_columns, **self.partition_read_options(storage, filters, buckets))
+        return filter_rows(self.typed_frame(zone, file_name, dataset_df) if storage.format_name == "csv" else dataset_df, filters, columns)
+
+    @staticmethod
+    def filter_read_columns(columns, filters):
+        """Columns to read for the requested columns, adding the filtered columns"""
+        if columns is None or not filters:
+            return columns
+        return list(columns) + [column for column in filters if column not in columns]
+
+    @staticmethod
+    def partition_read_options(storage, filters, buckets):
+        """Buckets argument of a partitioned storage read, pruned to the buckets holding the filtered partition keys"""
+        if not isinstance(storage, HashPartitionedStorage):
+            if buckets is not None:
+                raise ValueError(f"Buckets {buckets} requested from a dataset that is not hash partitioned")
+            return {}
+
+        if filters and storage.column in filters:
+            key_buckets = storage.buckets_for(filters[storage.column])
+            buckets = key_buckets if buckets is None else [bucket for bucket in buckets if bucket in key_buckets]
+        return {} if buckets is None else {"buckets": buckets}
+
+    def dataset_schema(self, zone, file_name):
+        """Schema of a curated dataset, None for the data products which are persisted as built"""
+        if zone != "curated":
+            return None
+        return load_file_schema(f"{self.datasets_schema_path}/{file_name}.yml")
+
+    def csv_frame(self, zone, file_name, df):
+        """Dataset as written to CSV, with the multi-hot columns decoded to their labels"""
+        file_schema = self.dataset_schema(zone, file_name)
+        return df if file_schema is None else decode_schema_columns(df, file_schema)
+
+    def typed_frame(self, zone, file_name, df):
+        """Dataset read from CSV, with the compact schema types applied again"""
+        file_schema = self.dataset_schema(zone, file_name)
+        return df if file_schema is None else apply_schema_dtypes(df, file_schema)
+
     @staticmethod
-    def df_to_csv(target_path, df, file_name, float_format="%.2f", **kwargs):
-        """Helper to generate the CSV files"""
-        df.to_csv(f"{target_path}/{file_name}.csv", index=False, float_format=float_format, **kwargs)
+    def print_memory_report(file_name, df):
+        """Log the in-memory size of a dataset and of each of its columns"""
+        report = memory_report(df)
+        columns_report = ", ".join(f"{column} {column_report['dtype']} {column_report['mb']} MB" for column, column_report in report["columns"].items())
+        print(f"Dataset: {file_name}, memory usage: {report['total_mb']} MB ({columns_report})")
+
+
+def dataset_size(call_arguments):
+    """Bytes persisted for the dataset of a write_dataset or write_dataset_chunks call"""
+    processor = call_arguments["self"]
+    return sum(path_size(path) or 0 for path in processor.zone_dataset_paths(call_arguments["zone"], call_arguments["file_name"]))
+
+
+def ratings_batch_files(incremental_ratings_path):
+    """Sorted names of the ratings batch files of the incremental ratings folder, empty when the folder does not exist"""
+    if not os.path.isdir(incremental_ratings_path):
+        return []
+    return sorted(batch for batch in os.listdir(incremental_ratings_path) if batch.endswith((".dat", ".csv")))
+
+
+def filter_rows(df, filters, columns=None):
+    """Rows of a DataFrame whose columns hold one of the filtered values, restricted to the requested columns"""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in filters.items():
+        mask &= df[column].isin(values).to_numpy()
+    filtered_df = df[mask].reset_index(drop=True)
+    return filtered_df if columns is None else filtered_df[list(columns)]
+
+
+def ratings_scan_partition(config_path, bucket, metrics_run_id=None):
+    """Aggregates of the ratings data products over one bucket of the partitioned curated ratings, used as the task of the partition worker processes"""
+    return DataProcessor(config_path, metrics_run_id=metrics_run_id).scan_ratings(buckets=[bucket])
+
+
+def execute_pipeline_stage(config_path, stage_name, metrics_run_id=None):
+    """Run the processing of one pipeline stage in a fresh DataProcessor, used as the task of the process pool scheduler"""
+    DataProcessor(config_path, metrics_run_id=metrics_run_id).execute_stage(stage_name)
 
 
 def movie_lens_analysis_pipeline(config_path):
-    """Data pipeline to transform and generate the data products along with DQT verification"""
+    """
+    Data pipeline to transform and generate the data products along with DQT verification, skipping the stages whose inputs are unchanged.
+
+    The stages run as a dependency graph: the raw files are extracted from the zip file to the Raw layer, each source
+    dataset is then verified and loaded to the Curated layer by its own stage, and both data products are verified
+    and loaded to the Data Product layer once the curated movies and ratings are available.
+    """
     processor = DataProcessor(config_path)
 
     # This process creates the basic folder structure for persisting the files
     processor.prepare_infra()
 
-    # Extract raw .dat files from the zip file to Raw Layer
-    processor.staging_to_raw()
+    processor.run_pipeline()
 
-    # Verify data quality and Load transformed data to Curated layer
-    processor.verify_dq_load_curated()
+    if processor.dataset_cache is not None:
+        print(f"Dataset cache stats: {processor.dataset_cache.stats()}")
 
-    # Verify data quality and Load to dps to Data Product layer
-    processor.verify_dq_load_dp_movie_ratings()
-    processor.verify_dq_load_dp_top_user_ratings()
+    if processor.metrics_recorder is not None:
+        print(f"Metrics of run {processor.metrics_recorder.run_id} written to {processor.metrics_recorder.metrics_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+"""
+Command line entry point of the movie lens analysis pipeline, running every stage, a single stage or a range of stages.
+
+Relative paths of the config file are resolved from the folder of the config file. Stages left out of the selection
+are not run, the selected stages read the outputs they left in the zones.
+
+Usage:
+  python -m src.cli --list
+  python -m src.cli --stage verify_dq_load_dp_ratings
+  python -m src.cli --from verify_dq_load_curated_ratings --to build_lookup_indexes --dry-run
+  python -m src.cli --config src/config.ini --force
+"""
+import argparse
+import configparser
+import hashlib
+import json
+import os
+import sys
+import time
+
+try:
+    from src.scripts.manifest import StageManifest, stage_config_sections
+    from src.scripts.scheduler import StageScheduler
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src.scripts.manifest import StageManifest, stage_config_sections
+    from src.scripts.scheduler import StageScheduler
+
+PACKAGE_PATH = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_PATH = os.path.join(PACKAGE_PATH, "config.ini")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="Pipeline config file, defaults to src/config.ini")
+    parser.add_argument("--list", action="store_true", help="List the stages in execution order with their dependencies and exit")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--stage", action="append", dest="stages", metavar="STAGE", help="Stage to run, repeatable")
+    selection.add_argument("--from", dest="from_stage", metavar="STAGE", help="First stage of the range to run, in execution order")
+    parser.add_argument("--to", dest="to_stage", metavar="STAGE", help="Last stage of the range to run, in execution order")
+    parser.add_argument("--dry-run", action="store_true", help="Print the selected stages and whether each would run or be skipped, without running them")
+    parser.add_argument("--force", action="store_true", help="Run the selected stages even when their inputs are unchanged since the last build")
+    args = parser.parse_args(argv)
+    if args.stages and args.to_stage:
+        parser.error("argument --to: not allowed with argument --stage")
+    return args
+
+
+def import_pipeline():
+    """Import the pipeline module with pandas and the stage code, deferred until a stage runs or the stage graph is not cached"""
+    from src import app
+
+    return app
+
+
+def stage_graph_key(config_path):
+    """Digest of the config file and of the size and modification time of the pipeline sources the stage graph is derived from"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(config_path, "rb") as config_file:
+        digest.update(config_file.read())
+    for source_folder in [PACKAGE_PATH, os.path.join(PACKAGE_PATH, "scripts")]:
+        for source_file in sorted(os.scandir(source_folder), key=lambda entry: entry.name):
+            if source_file.name.endswith(".py"):
+                stat = source_file.stat()
+                digest.update(f"{source_file.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def load_stage_specs(config, config_path):
+    """
+    Stage specs of the pipeline, see DataProcessor.stage_specs.
+
+    The specs are cached in the stage_graph_cache_path file of the Cli section, so listing and dry runs do not import
+    the pipeline while the config file and the pipeline sources are unchanged.
+    """
+    cache_path = config.get("Cli", "stage_graph_cache_path", fallback="")
+    graph_key = stage_graph_key(config_path)
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r") as cache_file:
+            cached_graph = json.load(cache_file)
+        if cached_graph["key"] == graph_key:
+            return cached_graph["stage_specs"]
+
+    stage_specs = import_pipeline().DataProcessor(config_path).stage_specs()
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(f"{cache_path}.tmp", "w") as cache_file:
+            json.dump({"key": graph_key, "stage_specs": stage_specs}, cache_file, indent=2)
+        os.replace(f"{cache_path}.tmp", cache_path)
+    return stage_specs
+
+
+def select_stages(execution_order, stages=None, from_stage=None, to_stage=None):
+    """
+    Stages selected by name or by a range of the execution order, in execution order.
+
+    Raises:
+    - ValueError: When a selected stage is not a pipeline stage or the range is empty.
+    """
+    unknown_stages = [stage_name for stage_name in (stages or []) + [from_stage, to_stage] if stage_name is not None and stage_name not in execution_order]
+    if unknown_stages:
+        raise ValueError(f"Unknown stages {unknown_stages}, pipeline stages: {', '.join(execution_order)}")
+
+    if stages:
+        return [stage_name for stage_name in execution_order if stage_name in stages]
+    first = execution_order.index(from_stage) if from_stage else 0
+    last = execution_order.index(to_stage) if to_stage else len(execution_order) - 1
+    if first > last:
+        raise ValueError(f"Stage {from_stage} runs after stage {to_stage}, the range is empty")
+    return execution_order[first : last + 1]
+
+
+def print_dry_run(config, stage_specs, selected_stages, force=False):
+    """Print whether each selected stage would run, and the inputs missing from the zones that no selected stage writes"""
+    manifest = None
+    if not force and config.getboolean("Incremental", "enabled", fallback=False):
+        manifest = StageManifest(config["Incremental"]["manifest_path"])
+
+    rebuilt_stages = []
+    for stage_name in selected_stages:
+        stage_spec = stage_specs[stage_name]
+        rebuilt_outputs = {path for rebuilt_stage in rebuilt_stages for path in stage_specs[rebuilt_stage]["outputs"]}
+        missing_inputs = [path for path in stage_spec["inputs"] if not os.path.exists(path) and path not in rebuilt_outputs]
+        rebuilt_dependencies = [dependency for dependency in stage_spec["depends_on"] if dependency in rebuilt_stages]
+        if missing_inputs:
+            print(f"Stage: {stage_name}, would fail, missing inputs {missing_inputs}")
+            continue
+
+        rebuilt_stages.append(stage_name)
+        if manifest is None:
+            print(f"Stage: {stage_name}, would run, {'forced' if force else 'incremental builds disabled'}")
+        elif rebuilt_dependencies:
+            print(f"Stage: {stage_name}, would run unless the outputs of {', '.join(rebuilt_dependencies)} are unchanged")
+        else:
+            fingerprint = manifest.stage_fingerprint(stage_spec["inputs"], stage_config_sections(config, stage_spec["config_sections"]))
+            outdated_reason = manifest.outdated_reason(stage_name, fingerprint, stage_spec["outputs"])
+            if outdated_reason is None:
+                rebuilt_stages.remove(stage_name)
+                print(f"Stage: {stage_name}, would be skipped, inputs unchanged since the last build")
+            else:
+                print(f"Stage: {stage_name}, would run, {outdated_reason}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+
+    config_path = os.path.abspath(args.config)
+    os.chdir(os.path.dirname(config_path))
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    stage_specs = load_stage_specs(config, config_path)
+    execution_order = StageScheduler({stage_name: stage_spec["depends_on"] for stage_name, stage_spec in stage_specs.items()}).execution_order
+    if args.list:
+        for stage_name in execution_order:
+            print(f"{stage_name}: depends on {', '.join(stage_specs[stage_name]['depends_on']) or 'nothing'}")
+        return
+
+    try:
+        selected_stages = select_stages(execution_order, stages=args.stages, from_stage=args.from_stage, to_stage=args.to_stage)
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+
+    if args.dry_run:
+        print_dry_run(config, stage_specs, selected_stages, force=args.force)
+        return
+
+    app = import_pipeline()
+    print(f"Stages: {', '.join(selected_stages)}, started in {time.perf_counter() - start:.2f}s")
+    processor = app.DataProcessor(config_path)
+    processor.prepare_infra()
+    executed = processor.run_pipeline(stages=selected_stages, force=args.force)
+    print(f"Stages run: {', '.join(executed) or 'none, inputs unchanged'}")
+
+    if processor.metrics_recorder is not None:
+        print(f"Metrics of run {processor.metrics_recorder.run_id} written to {processor.metrics_recorder.metrics_path}")
+
+
+if __name__ == "__main__":
+    main()
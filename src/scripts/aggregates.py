@@ -0,0 +1,315 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.scripts.storage import NpyStorage
+
+STATE_BATCHES_FILE = "_batches.json"
+# Time bucket units of the rollup cube, numbered from 1970-01-01
+ROLLUP_BUCKETS = {"day": "datetime64[D]", "month": "datetime64[M]"}
+# Offset keeping the bucket numbers of the composite movieid and bucket keys non negative
+ROLLUP_BUCKET_OFFSET = 1 << 31
+
+
+def write_state_batches(state_path, batches, source_fingerprint):
+    """Write the folded batches of a state and the fingerprint of the curated ratings it was bootstrapped from"""
+    with open(f"{state_path}/{STATE_BATCHES_FILE}", "w") as batches_file:
+        json.dump({"source_fingerprint": source_fingerprint, "batches": batches}, batches_file, indent=2)
+
+
+def read_state_batches(state_path):
+    """
+    Read the folded batches of a state and the fingerprint of the curated ratings it was bootstrapped from.
+
+    Returns:
+    - state_batches (tuple): The batches and the fingerprint, which is None for a state saved without one. None when there is no complete state to load.
+    """
+    batches_path = f"{state_path}/{STATE_BATCHES_FILE}"
+    if not os.path.exists(batches_path):
+        return None
+
+    with open(batches_path, "r") as batches_file:
+        state_batches = json.load(batches_file)
+    if isinstance(state_batches, list):
+        return state_batches, None
+    return state_batches["batches"], state_batches["source_fingerprint"]
+
+
+class RatingsAggregateState:
+    """
+    Per-movie count, sum, min and max of the ratings, or per value of another ratings column such as userid.
+
+    The state is mergeable: folding a new batch of ratings costs a groupby over the batch plus a merge over the
+    movies, independent of how many ratings were folded before. The stats are derived from the state, with the
+    average computed as sum / count. The source fingerprint identifies the curated ratings the state was
+    bootstrapped from, so a state is rebuilt once they change.
+    """
+
+    aggregate_columns = ["count", "sum", "min", "max"]
+
+    def __init__(self, aggregates, batches=None, group_column="movieid", source_fingerprint=None):
+        self.aggregates = aggregates
+        self.batches = list(batches or [])
+        self.group_column = group_column
+        self.source_fingerprint = source_fingerprint
+
+    @classmethod
+    def from_ratings(cls, ratings_df, batches=None, group_column="movieid"):
+        # Ratings are stored as int8, the per-group sums are accumulated as int64 so they cannot overflow
+        aggregates = ratings_df["ratings"].astype(np.int64).groupby(ratings_df[group_column]).agg(cls.aggregate_columns)
+        return cls(aggregates, batches, group_column)
+
+    def merge(self, other):
+        """New state holding the ratings of both states"""
+        combined = pd.concat([self.aggregates, other.aggregates])
+        aggregates = combined.groupby(level=0).agg({"count": "sum", "sum": "sum", "min": "min", "max": "max"})
+        return RatingsAggregateState(aggregates, self.batches + other.batches, self.group_column, self.source_fingerprint)
+
+    def to_stats(self):
+        """Max, min and average rating of each movie, or of each group"""
+        stats = pd.DataFrame(
+            {
+                "max_rating": self.aggregates["max"],
+                "min_rating": self.aggregates["min"],
+                "avg_rating": self.aggregates["sum"] / self.aggregates["count"],
+            }
+        )
+        return stats.rename_axis(self.group_column).reset_index()
+
+    def matches(self, other):
+        """Check if two states hold the same aggregates"""
+        left, right = self.aggregates.sort_index(), other.aggregates.sort_index()
+        return left.index.equals(right.index) and all(np.array_equal(left[column].to_numpy(), right[column].to_numpy()) for column in self.aggregate_columns)
+
+    def save(self, state_zone_path, state_name):
+        """Persist the state with the list of folded batches and its source fingerprint, replacing the previous state in one rename"""
+        state_path = NpyStorage.dataset_path(state_zone_path, state_name)
+        temp_name = f"{state_name}.tmp"
+        NpyStorage.write(self.aggregates.rename_axis("movieid").reset_index(), state_zone_path, temp_name)
+        write_state_batches(NpyStorage.dataset_path(state_zone_path, temp_name), self.batches, self.source_fingerprint)
+
+        shutil.rmtree(state_path, ignore_errors=True)
+        os.replace(NpyStorage.dataset_path(state_zone_path, temp_name), state_path)
+
+    @classmethod
+    def load(cls, state_zone_path, state_name):
+        """Load a persisted state. Returns None when there is no complete state to load"""
+        state_batches = read_state_batches(NpyStorage.dataset_path(state_zone_path, state_name))
+        if state_batches is None:
+            return None
+
+        batches, source_fingerprint = state_batches
+        aggregates = NpyStorage.read(state_zone_path, state_name, mmap_mode=None).set_index("movieid")
+        return cls(aggregates, batches, source_fingerprint=source_fingerprint)
+
+
+def time_buckets(timestamps, bucket="day"):
+    """Day or month number since 1970-01-01 of epoch second or datetime64 timestamps, as int32"""
+    timestamps = np.asarray(timestamps)
+    if bucket == "day" and timestamps.dtype.kind in "iu":
+        return (timestamps.astype(np.int64) // 86400).astype(np.int32)
+    return timestamps.astype("datetime64[s]").astype(ROLLUP_BUCKETS[bucket]).astype(np.int64).astype(np.int32)
+
+
+def bucket_labels(buckets, bucket="day"):
+    """ISO date of day buckets or year-month of month buckets"""
+    return np.datetime_as_string(np.asarray(buckets, dtype=np.int64).astype(ROLLUP_BUCKETS[bucket]))
+
+
+class RatingsRollupCube:
+    """
+    Count, sum, min and max of the ratings per movie and day or month, as a mergeable state.
+
+    The cube is sparse: one cell per movie and bucket holding ratings, sorted by movieid then bucket, so it never
+    takes more rows than the ratings. Merging cubes only queues their cells, they are combined when the cube is
+    queried or saved: a batch folded into a cube by a binary search of its cells in the cells of the cube, and the
+    partial cubes of a chunked scan by one stable sort of their sorted cells instead of once per chunk.
+
+    Windowed statistics are answered from prefix sums of the counts and sums along the cells: the count and sum of
+    any window of buckets of every movie take two binary searches per movie, whatever the length of the window, and
+    the min and max one segmented reduction over the cells of the window.
+
+    Args:
+    - cells (pandas.DataFrame): movieid, the bucket column (day or month) and the count, sum, min and max columns.
+    - bucket (str): day or month.
+    - batches (list): Ratings batch files folded into the cube.
+    - source_fingerprint (str): Fingerprint of the curated ratings the cube was bootstrapped from.
+    """
+
+    aggregate_columns = ["count", "sum", "min", "max"]
+
+    def __init__(self, cells, bucket="day", batches=None, source_fingerprint=None):
+        if bucket not in ROLLUP_BUCKETS:
+            raise ValueError(f"Unknown rollup bucket: {bucket}, expected one of {sorted(ROLLUP_BUCKETS)}")
+        self.parts = [cells]
+        self.bucket = bucket
+        self.batches = list(batches or [])
+        self.source_fingerprint = source_fingerprint
+        self._window_index = None
+
+    @classmethod
+    def from_ratings(cls, ratings_df, bucket="day", batches=None):
+        buckets = time_buckets(ratings_df["timestamp"].to_numpy(), bucket)
+        return cls(cls.combine_cells(ratings_df["movieid"].to_numpy(), buckets, ratings_df["ratings"].to_numpy(), bucket=bucket), bucket, batches)
+
+    @staticmethod
+    def combine_cells(movieids, buckets, ratings, counts=None, mins=None, maxs=None, bucket="day", sorted_runs=False):
+        """
+        Cells of the ratings, or of partial cells when counts, mins and maxs are given, combined per movie and bucket
+        and sorted. With sorted_runs, the inputs are concatenated sorted cells, merged by a stable sort in linear time.
+        """
+        keys = RatingsRollupCube.cell_keys(movieids, buckets)
+        order = np.argsort(keys, kind="stable" if sorted_runs else "quicksort")
+        keys = keys[order]
+        if not len(keys):
+            empty_counts, empty_ratings = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8)
+            return pd.DataFrame({"movieid": np.zeros(0, dtype=np.int32), bucket: np.zeros(0, dtype=np.int32), "count": empty_counts, "sum": empty_counts, "min": empty_ratings, "max": empty_ratings})
+
+        starts = np.flatnonzero(np.diff(keys, prepend=-1))
+        # Raw ratings keep their narrow type, they are only widened by the reductions
+        sums = np.asarray(ratings)[order]
+        mins = sums if mins is None else np.asarray(mins)[order]
+        maxs = sums if maxs is None else np.asarray(maxs)[order]
+        cell_counts = np.diff(np.append(starts, len(keys))) if counts is None else np.add.reduceat(np.asarray(counts, dtype=np.int64)[order], starts)
+        cell_keys = keys[starts]
+        return pd.DataFrame(
+            {
+                "movieid": (cell_keys >> 32).astype(np.int32),
+                bucket: ((cell_keys & 0xFFFFFFFF) - ROLLUP_BUCKET_OFFSET).astype(np.int32),
+                "count": cell_counts,
+                "sum": np.add.reduceat(sums, starts, dtype=np.int64),
+                "min": np.minimum.reduceat(mins, starts).astype(np.int8),
+                "max": np.maximum.reduceat(maxs, starts).astype(np.int8),
+            }
+        )
+
+    @staticmethod
+    def cell_keys(movieids, buckets):
+        """int64 key of each cell, ordered like the cells: the movieid in the high 32 bits and the offset bucket in the low ones"""
+        return (np.asarray(movieids).astype(np.int64) << 32) | (np.asarray(buckets).astype(np.int64) + ROLLUP_BUCKET_OFFSET)
+
+    def merge_sorted_cells(self, cells, other_cells):
+        """
+        Cells of two sorted sets of cells, by a binary search of the other cells in the cells: the matching cells are
+        updated and the others inserted, so folding a small batch into a large cube copies the cells without sorting them.
+        """
+        keys = self.cell_keys(cells["movieid"], cells[self.bucket])
+        other_keys = self.cell_keys(other_cells["movieid"], other_cells[self.bucket])
+        positions = np.searchsorted(keys, other_keys)
+        matching = positions < len(keys)
+        matching[matching] = keys[positions[matching]] == other_keys[matching]
+
+        merged_cells = {}
+        for column, combine in [("movieid", None), (self.bucket, None), ("count", np.add), ("sum", np.add), ("min", np.minimum), ("max", np.maximum)]:
+            values, other_values = cells[column].to_numpy(), other_cells[column].to_numpy()
+            if combine is not None:
+                values = values.copy()
+                values[positions[matching]] = combine(values[positions[matching]], other_values[matching])
+            merged_cells[column] = np.insert(values, positions[~matching], other_values[~matching])
+        return pd.DataFrame(merged_cells)
+
+    @property
+    def cells(self):
+        if len(self.parts) == 2:
+            self.parts = [self.merge_sorted_cells(*sorted(self.parts, key=len, reverse=True))]
+        elif len(self.parts) > 2:
+            parts = pd.concat(self.parts, ignore_index=True)
+            self.parts = [self.combine_cells(parts["movieid"], parts[self.bucket], parts["sum"], parts["count"], parts["min"], parts["max"], bucket=self.bucket, sorted_runs=True)]
+        return self.parts[0]
+
+    def merge(self, other):
+        """New cube holding the ratings of both cubes"""
+        if other.bucket != self.bucket:
+            raise ValueError(f"Cannot merge a {other.bucket} rollup cube into a {self.bucket} rollup cube")
+        merged = RatingsRollupCube(self.parts[0], self.bucket, self.batches + other.batches, self.source_fingerprint)
+        merged.parts = self.parts + other.parts
+        return merged
+
+    def to_buckets(self, bucket):
+        """Cube rolled up to a coarser bucket, such as the months of a day cube"""
+        cells = self.cells
+        buckets = time_buckets(cells[self.bucket].to_numpy().astype(np.int64).astype(ROLLUP_BUCKETS[self.bucket]), bucket)
+        return RatingsRollupCube(self.combine_cells(cells["movieid"], buckets, cells["sum"], cells["count"], cells["min"], cells["max"], bucket=bucket, sorted_runs=True), bucket, self.batches, self.source_fingerprint)
+
+    def window_index(self):
+        """
+        Keys of the cells, the running count and sum of the ratings before each cell, the min and max of each cell
+        padded with one cell so every window end is a valid reduceat index, and the movieids, computed once per cube.
+        """
+        if self._window_index is None or len(self.parts) > 1:
+            cells = self.cells
+            movieids = cells["movieid"].to_numpy()
+            keys = self.cell_keys(movieids, cells[self.bucket])
+            prefix_counts = np.concatenate([[0], np.cumsum(cells["count"].to_numpy())])
+            prefix_sums = np.concatenate([[0], np.cumsum(cells["sum"].to_numpy())])
+            mins, maxs = np.append(cells["min"].to_numpy(), 0), np.append(cells["max"].to_numpy(), 0)
+            self._window_index = keys, prefix_counts, prefix_sums, mins, maxs, movieids[np.flatnonzero(np.diff(movieids, prepend=-1))]
+        return self._window_index
+
+    def movie_ids(self):
+        return self.window_index()[-1]
+
+    def window_stats(self, first_bucket, last_bucket, movieids=None):
+        """
+        Count, average, min and max of the ratings of each movie within a window of buckets.
+
+        Args:
+        - first_bucket (int): First bucket of the window, see time_buckets.
+        - last_bucket (int): Last bucket of the window, included.
+        - movieids (array-like): Movies to report, defaults to every movie of the cube.
+
+        Returns:
+        - window_stats (pandas.DataFrame): movieid, ratings_count, avg_rating, min_rating and max_rating, with a count
+          of 0 and missing rating stats for the movies without ratings in the window.
+        """
+        keys, prefix_counts, prefix_sums, cell_mins, cell_maxs, cube_movieids = self.window_index()
+        movieids = cube_movieids if movieids is None else np.asarray(movieids)
+        movie_keys = movieids.astype(np.int64) << 32
+        starts = np.searchsorted(keys, movie_keys | (int(first_bucket) + ROLLUP_BUCKET_OFFSET))
+        ends = np.searchsorted(keys, movie_keys | (int(last_bucket) + 1 + ROLLUP_BUCKET_OFFSET))
+
+        counts = prefix_counts[ends] - prefix_counts[starts]
+        sums = prefix_sums[ends] - prefix_sums[starts]
+        rated = counts > 0
+        # reduceat over the interleaved window bounds reduces each window, the cells between windows are skipped
+        bounds = np.column_stack([starts, ends]).ravel()
+        mins = np.minimum.reduceat(cell_mins, bounds)[::2] if len(bounds) else np.zeros(0)
+        maxs = np.maximum.reduceat(cell_maxs, bounds)[::2] if len(bounds) else np.zeros(0)
+        return pd.DataFrame(
+            {
+                "movieid": movieids,
+                "ratings_count": counts,
+                "avg_rating": np.divide(sums, counts, out=np.full(len(counts), np.nan), where=rated),
+                "min_rating": np.where(rated, mins, np.nan),
+                "max_rating": np.where(rated, maxs, np.nan),
+            }
+        )
+
+    def matches(self, other):
+        """Check if two cubes hold the same cells"""
+        return self.bucket == other.bucket and self.cells.equals(other.cells)
+
+    def save(self, state_zone_path, state_name):
+        """Persist the cube with the list of folded batches and its source fingerprint, replacing the previous cube in one rename"""
+        state_path = NpyStorage.dataset_path(state_zone_path, state_name)
+        temp_name = f"{state_name}.tmp"
+        NpyStorage.write(self.cells, state_zone_path, temp_name)
+        write_state_batches(NpyStorage.dataset_path(state_zone_path, temp_name), self.batches, self.source_fingerprint)
+
+        shutil.rmtree(state_path, ignore_errors=True)
+        os.replace(NpyStorage.dataset_path(state_zone_path, temp_name), state_path)
+
+    @classmethod
+    def load(cls, state_zone_path, state_name):
+        """Load a persisted cube, its bucket is the name of its bucket column. Returns None when there is no complete cube to load"""
+        state_batches = read_state_batches(NpyStorage.dataset_path(state_zone_path, state_name))
+        if state_batches is None:
+            return None
+
+        batches, source_fingerprint = state_batches
+        cells = NpyStorage.read(state_zone_path, state_name, mmap_mode=None)
+        bucket = next(column for column in cells.columns if column in ROLLUP_BUCKETS)
+        return cls(cells, bucket, batches, source_fingerprint)
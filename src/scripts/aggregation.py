@@ -0,0 +1,338 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from src.scripts.aggregates import RatingsAggregateState, RatingsRollupCube, bucket_labels, time_buckets
+from src.scripts.dtypes import decode_schema_columns
+from src.scripts.joins import DimensionIndex
+from src.scripts.similarity import RatingsMatrix, top_similar_movies
+from src.scripts.topk import top_k_per_group
+
+# Highest rating first, ties broken by the most recent rating and then by the lowest movieid
+TOP_MOVIES_ORDER_BY = [("ratings", False), ("timestamp", False), ("movieid", True)]
+
+DEMOGRAPHIC_COLUMNS = ["gender", "age", "occupation"]
+
+# Key column of each curated dimension dataset the data products join
+DIMENSION_KEYS = {"movies": "movieid", "users": "userid"}
+
+
+class GroupStats:
+    """Count, sum, min and max of the ratings per value of a ratings column, as a RatingsAggregateState"""
+
+    def __init__(self, group_column):
+        self.group_column = group_column
+        self.key = ("stats", group_column)
+        self.columns = [group_column, "ratings"]
+
+    def scan(self, ratings_df):
+        return RatingsAggregateState.from_ratings(ratings_df, group_column=self.group_column)
+
+    @staticmethod
+    def merge(left, right):
+        return left.merge(right)
+
+
+class GroupTopK:
+    """The k highest ranked ratings of every value of a ratings column"""
+
+    def __init__(self, group_column, k, order_by):
+        self.group_column = group_column
+        self.k = k
+        self.order_by = order_by
+        self.key = ("top_k", group_column, k, tuple(order_by))
+        self.columns = [group_column] + [column for column, _ in order_by]
+
+    def scan(self, ratings_df):
+        return top_k_per_group(ratings_df, group_column=self.group_column, k=self.k, order_by=self.order_by)
+
+    def merge(self, left, right):
+        # Only the running top K of each group is kept, so merging costs a selection over at most 2K rows per group
+        return self.scan(pd.concat([left, right], ignore_index=True))
+
+
+class TimeRollup:
+    """Count, sum, min and max of the ratings per movie and time bucket, as a RatingsRollupCube"""
+
+    columns = ["movieid", "ratings", "timestamp"]
+
+    def __init__(self, bucket="day"):
+        self.bucket = bucket
+        self.key = ("rollup", bucket)
+
+    def scan(self, ratings_df):
+        return RatingsRollupCube.from_ratings(ratings_df, bucket=self.bucket)
+
+    @staticmethod
+    def merge(left, right):
+        return left.merge(right)
+
+
+class UserMovieRatings:
+    """
+    Sparse user x movie matrix of the ratings, as a RatingsMatrix.
+
+    Every chunk of a scan is built into a matrix summed into the matrix of the previous chunks, so a chunked scan holds
+    the compressed matrix and one chunk instead of the columns of every chunk.
+    """
+
+    key = ("user_movie_ratings",)
+    columns = ["userid", "movieid", "ratings"]
+
+    def scan(self, ratings_df):
+        return RatingsMatrix.from_ratings(*(ratings_df[column].to_numpy() for column in self.columns))
+
+    @staticmethod
+    def merge(left, right):
+        return left.merge(right)
+
+
+class RatingsDataProduct(ABC):
+    """
+    Data product derived from the curated ratings.
+
+    A product declares the aggregates it needs from the scan of the ratings and the curated dimension datasets it
+    joins, and builds its DataFrame from them. Products declaring the same aggregate share it, and the dimensions
+    are passed as DimensionIndex objects built once for all products.
+    """
+
+    dimensions = []
+
+    def __init__(self, dataset_config):
+        self.dataset_config = dataset_config
+
+    def aggregates(self):
+        return []
+
+    @abstractmethod
+    def build(self, results, dimensions, dimension_schemas):
+        """DataFrame of the product, from the results of its aggregates and the DimensionIndex of each of its dimensions"""
+
+    def schema_variables(self):
+        """Values of the column templates of the product schema, for products whose columns depend on their config"""
+        return {}
+
+
+class MoviesWithRatingsStats(RatingsDataProduct):
+    """All movies with the max, min and average of their ratings"""
+
+    dimensions = ["movies"]
+
+    def aggregates(self):
+        return [GroupStats("movieid")]
+
+    def build(self, results, dimensions, dimension_schemas):
+        movies_df = decode_schema_columns(dimensions["movies"].dimension_df, dimension_schemas["movies"])
+        return DimensionIndex(results[GroupStats("movieid").key].to_stats(), "movieid").join(movies_df)
+
+
+class TopMoviesPerUser(RatingsDataProduct):
+    """The top_k rated movies of each user, with the movie titles and genres"""
+
+    dimensions = ["movies"]
+
+    def aggregates(self):
+        return [GroupTopK("userid", self.dataset_config.getint("top_k", fallback=3), TOP_MOVIES_ORDER_BY)]
+
+    def build(self, results, dimensions, dimension_schemas):
+        movies = dimensions["movies"].with_rows(decode_schema_columns(dimensions["movies"].dimension_df, dimension_schemas["movies"]))
+        return movies.join(results[self.aggregates()[0].key])
+
+
+def rollup_stats(aggregates):
+    """Combine the count, sum, min and max of several groups into one row"""
+    ratings_count = int(aggregates["count"].sum())
+    return {
+        "ratings_count": ratings_count,
+        "avg_rating": aggregates["sum"].sum() / ratings_count if ratings_count else np.nan,
+        "min_rating": aggregates["min"].min() if ratings_count else np.nan,
+        "max_rating": aggregates["max"].max() if ratings_count else np.nan,
+    }
+
+
+class GenreRatingStats(RatingsDataProduct):
+    """
+    Number of rated movies and ratings and the average, min and max rating of each genre.
+
+    A rating counts for every genre of its movie. The genres are rolled up from the per-movie aggregates shared with
+    movies_with_ratings_stats, so the product adds a pass over the movies instead of a pass over the ratings.
+    """
+
+    dimensions = ["movies"]
+
+    def aggregates(self):
+        return [GroupStats("movieid")]
+
+    def build(self, results, dimensions, dimension_schemas):
+        movie_aggregates = results[GroupStats("movieid").key].aggregates
+        genres_column = next(col for col in dimension_schemas["movies"]["columns"] if col["name"] == "genres")
+        movie_positions = dimensions["movies"].positions(movie_aggregates.index.to_numpy())
+        genre_masks = np.where(movie_positions >= 0, dimensions["movies"].dimension_df["genres"].to_numpy(dtype=np.uint64)[movie_positions], np.uint64(0))
+
+        genre_stats = []
+        for bit, genre in enumerate(genres_column["categories"]):
+            genre_aggregates = movie_aggregates[(genre_masks >> np.uint64(bit)) & np.uint64(1) == 1]
+            genre_stats.append({"genre": genre, "movies_count": len(genre_aggregates), **rollup_stats(genre_aggregates)})
+        return pd.DataFrame(genre_stats)
+
+
+class DemographicRatingStats(RatingsDataProduct):
+    """
+    Number of users and ratings and the average, min and max rating per gender, per age group and per occupation.
+
+    One row per value of each demographic column, rolled up from per-user aggregates so the three rollups share one
+    groupby of the ratings.
+    """
+
+    dimensions = ["users"]
+
+    def aggregates(self):
+        return [GroupStats("userid")]
+
+    def build(self, results, dimensions, dimension_schemas):
+        user_aggregates = results[GroupStats("userid").key].aggregates
+        user_positions = dimensions["users"].positions(user_aggregates.index.to_numpy())
+
+        demographic_stats = []
+        for column in DEMOGRAPHIC_COLUMNS:
+            for value, value_aggregates in user_aggregates.groupby(np.asarray(dimensions["users"].take(column, user_positions), dtype=object), sort=True):
+                demographic_stats.append({"demographic": column, "value": str(value), "users_count": len(value_aggregates), **rollup_stats(value_aggregates)})
+        return pd.DataFrame(demographic_stats)
+
+
+class SimilarMovies(RatingsDataProduct):
+    """
+    The top_n most similar movies of each movie, by cosine similarity of their ratings, with the titles of the similar movies.
+
+    The similarities are computed in blocks of movies from the sparse user x movie ratings matrix, see
+    top_similar_movies.
+    """
+
+    dimensions = ["movies"]
+
+    def aggregates(self):
+        return [UserMovieRatings()]
+
+    def build(self, results, dimensions, dimension_schemas):
+        similar_movies_df = top_similar_movies(
+            results[UserMovieRatings.key],
+            top_n=self.dataset_config.getint("top_n", fallback=10),
+            min_ratings=self.dataset_config.getint("min_ratings", fallback=1),
+            block_memory_mb=self.dataset_config.getint("block_memory_mb", fallback=256),
+        )
+        similar_movies_df["similar_titles"] = dimensions["movies"].take("titles", dimensions["movies"].positions(similar_movies_df["similar_movieid"].to_numpy()))
+        return similar_movies_df
+
+
+class MovieRatingWindows(RatingsDataProduct):
+    """
+    Number and average of the ratings of each movie over the last days of each window, e.g. 30, 90 and 365 days.
+
+    The windows end on the as_of date, the day of the latest rating by default, and are answered from the prefix sums
+    of the per movie and day rollup cube instead of a scan of the ratings per window.
+    """
+
+    dimensions = ["movies"]
+
+    def aggregates(self):
+        return [TimeRollup("day")]
+
+    def build(self, results, dimensions, dimension_schemas):
+        rollup_cube = results[TimeRollup("day").key]
+        as_of = self.dataset_config.get("as_of", fallback="")
+        last_day = int(time_buckets(np.datetime64(as_of, "D"))) if as_of else int(rollup_cube.cells["day"].max())
+
+        windows_df = dimensions["movies"].join(pd.DataFrame({"movieid": rollup_cube.movie_ids()}), columns=["titles"])
+        for window_days in self.windows():
+            window_stats = rollup_cube.window_stats(last_day - window_days + 1, last_day, windows_df["movieid"].to_numpy())
+            windows_df[f"ratings_count_{window_days}d"] = window_stats["ratings_count"].to_numpy()
+            windows_df[f"avg_rating_{window_days}d"] = window_stats["avg_rating"].to_numpy()
+        windows_df["as_of"] = bucket_labels(np.full(len(windows_df), last_day), "day")
+        return windows_df
+
+    def windows(self):
+        """Window lengths in days"""
+        return [int(days) for days in self.dataset_config.get("windows", fallback="30, 90, 365").split(", ")]
+
+    def schema_variables(self):
+        return {"window": self.windows()}
+
+
+class MovieMonthlyRatings(RatingsDataProduct):
+    """Number, average, min and max of the ratings of each movie per month, rolled up from the per movie and day rollup cube"""
+
+    def aggregates(self):
+        return [TimeRollup("day")]
+
+    def build(self, results, dimensions, dimension_schemas):
+        monthly_cells = results[TimeRollup("day").key].to_buckets("month").cells
+        return pd.DataFrame(
+            {
+                "movieid": monthly_cells["movieid"],
+                "month": bucket_labels(monthly_cells["month"], "month"),
+                "ratings_count": monthly_cells["count"],
+                "avg_rating": monthly_cells["sum"] / monthly_cells["count"],
+                "min_rating": monthly_cells["min"],
+                "max_rating": monthly_cells["max"],
+            }
+        )
+
+
+RATINGS_DATA_PRODUCTS = {product.__name__: product for product in [MoviesWithRatingsStats, TopMoviesPerUser, GenreRatingStats, DemographicRatingStats, SimilarMovies, MovieRatingWindows, MovieMonthlyRatings]}
+
+
+class RatingsAggregationPlan:
+    """
+    Plan computing the aggregates of a set of ratings data products in one shared scan of the ratings.
+
+    The aggregates declared by the products are deduplicated, every chunk of ratings is read once and fed to each
+    aggregate, and the partial results of chunks or partitions are merged. Aggregates supplied by the caller, such
+    as a persisted aggregate state, are left out of the scan.
+
+    Args:
+    - products (dict): Data product of each output file name.
+    - precomputed_keys (list): Keys of the aggregates the caller supplies to build instead of scanning for them.
+    """
+
+    def __init__(self, products, precomputed_keys=None):
+        self.products = products
+        self.aggregates = {}
+        for product in products.values():
+            for aggregate in product.aggregates():
+                self.aggregates.setdefault(aggregate.key, aggregate)
+        self.precomputed_keys = list(precomputed_keys or [])
+        self.scan_aggregates = {key: aggregate for key, aggregate in self.aggregates.items() if key not in self.precomputed_keys}
+        self.dimensions = sorted({dimension for product in products.values() for dimension in product.dimensions})
+
+    def scan_columns(self, ratings_columns):
+        """Ratings columns read by the scan, in the order of the ratings dataset"""
+        required_columns = {column for aggregate in self.scan_aggregates.values() for column in aggregate.columns}
+        return [column for column in ratings_columns if column in required_columns]
+
+    def scan(self, chunks):
+        """
+        Feed every chunk of ratings to each aggregate of the scan.
+
+        Returns:
+        - results (dict): Result of each aggregate key, missing for the aggregates of an empty scan.
+        """
+        results = {}
+        for chunk in chunks:
+            for key, aggregate in self.scan_aggregates.items():
+                partial = aggregate.scan(chunk)
+                results[key] = partial if key not in results else aggregate.merge(results[key], partial)
+        return results
+
+    def merge(self, partial_results):
+        """Merge the results of scans over disjoint parts of the ratings"""
+        results = {}
+        for partial in partial_results:
+            for key, result in partial.items():
+                results[key] = result if key not in results else self.aggregates[key].merge(results[key], result)
+        return results
+
+    def build(self, results, dimensions, dimension_schemas):
+        """Build the DataFrame of every data product from the aggregate results and the dimension datasets, indexing each dimension once for all joins"""
+        dimension_indexes = {dataset_name: DimensionIndex(dimension_df, DIMENSION_KEYS[dataset_name]) for dataset_name, dimension_df in dimensions.items()}
+        return {file_name: product.build(results, dimension_indexes, dimension_schemas) for file_name, product in self.products.items()}
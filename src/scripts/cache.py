@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+
+class DatasetCache:
+    """
+    In-memory LRU cache of DataFrames shared by the pipeline stages, keyed by zone and dataset name.
+
+    The cache holds at most memory_budget_bytes, measured with DataFrame.memory_usage(deep=True). The least
+    recently used datasets are evicted to make room, and a dataset larger than the whole budget is not cached.
+    Cached DataFrames are shared between consumers and must be treated as read only.
+    """
+
+    def __init__(self, memory_budget_bytes):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, zone, file_name, df):
+        """Publish a dataset, replacing any cached version of it"""
+        key = (zone, file_name)
+        size = int(df.memory_usage(index=True, deep=True).sum())
+
+        with self._lock:
+            self._discard(key)
+            if size > self.memory_budget_bytes:
+                return
+
+            while self.used_bytes + size > self.memory_budget_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted_size
+                self.evictions += 1
+
+            self._entries[key] = (df, size)
+            self.used_bytes += size
+
+    def get(self, zone, file_name, columns=None):
+        """Get a cached dataset, or only the given columns of it. Returns None on a miss"""
+        key = (zone, file_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (columns is not None and not set(columns).issubset(entry[0].columns)):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        df = entry[0]
+        return df if columns is None else df[[column for column in df.columns if column in columns]]
+
+    def invalidate(self, zone, file_name):
+        with self._lock:
+            self._discard((zone, file_name))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.used_bytes -= entry[1]
+
+    def stats(self):
+        """Counters to log the cache efficiency of a run"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "datasets": len(self._entries), "used_bytes": self.used_bytes}
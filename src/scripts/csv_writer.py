@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.scripts.exceptions import CustomErrors
+
+CHECKSUM_SUFFIX = ".sha256"
+CHECKSUM_BLOCK_BYTES = 1024**2
+# File name suffix of each supported compression
+CSV_COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def format_csv_chunk(chunk, header, float_format, compression, compression_level):
+    """
+    CSV bytes of a chunk, run by the writer worker processes.
+
+    A gzip compressed chunk is a complete gzip member, so the chunks of a file can be compressed independently and
+    concatenated into one valid gzip file.
+    """
+    data = chunk.to_csv(header=header, index=False, float_format=float_format).encode("utf-8")
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6 if compression_level is None else compression_level, mtime=0)
+    return data
+
+
+def checksum_path(dataset_path):
+    return f"{dataset_path}{CHECKSUM_SUFFIX}"
+
+
+def file_checksum(file_path):
+    """SHA-256 hex digest of a file"""
+    checksum = hashlib.sha256()
+    with open(file_path, "rb") as input_file:
+        for block in iter(lambda: input_file.read(CHECKSUM_BLOCK_BYTES), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def verify_checksum(dataset_path):
+    """True when the file and its checksum file exist and the checksum matches, False for a missing, partial or replaced file"""
+    if not os.path.isfile(dataset_path) or not os.path.isfile(checksum_path(dataset_path)):
+        return False
+    with open(checksum_path(dataset_path), "r") as checksum_file:
+        expected_checksum = checksum_file.read().split(" ")[0].strip()
+    return expected_checksum == file_checksum(dataset_path)
+
+
+class ChecksumFile:
+    """Binary file wrapper computing the SHA-256 of the bytes written through it"""
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.checksum = hashlib.sha256()
+
+    def write(self, data):
+        self.checksum.update(data)
+        return self.output_file.write(data)
+
+    def flush(self):
+        self.output_file.flush()
+
+
+class AtomicCsvStorage:
+    """
+    CSV storage formatting the chunks of a dataset in parallel worker processes and publishing it atomically.
+
+    Every dataset is written to a temporary file that replaces the dataset once complete, followed by a .sha256
+    checksum file in the format of sha256sum. A dataset whose checksum file is missing or does not match was not
+    completely written, see verify_checksum.
+
+    Args:
+    - workers (int): Worker processes formatting the chunks, at most one per CPU. The chunks are formatted in the
+      writing process for 1 worker or when the dataset holds a single chunk.
+    - chunk_rows (int): Rows formatted per worker task.
+    - compression (str): none, gzip or zstd. gzip chunks are compressed by the workers, zstd streams the formatted
+      chunks through one multi-threaded compressor and requires the zstandard package.
+    - compression_level (int): Compression level, defaults to 6 for gzip and 3 for zstd.
+
+    Raises:
+    - CustomErrors.StorageFormatError: For an unknown compression, or zstd without the zstandard package.
+    """
+
+    format_name = "csv"
+
+    def __init__(self, workers=1, chunk_rows=250_000, compression="none", compression_level=None):
+        if compression not in CSV_COMPRESSIONS:
+            raise CustomErrors.StorageFormatError(f"Unknown CSV compression: {compression}, expected one of {sorted(CSV_COMPRESSIONS)}")
+        if compression == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                raise CustomErrors.StorageFormatError("CSV compression zstd requires the zstandard package")
+
+        self.workers = min(workers, os.cpu_count() or 1)
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.compression_level = compression_level
+
+    def dataset_path(self, zone_path, file_name):
+        return f"{zone_path}/{file_name}.csv{CSV_COMPRESSIONS[self.compression]}"
+
+    def write(self, df, zone_path, file_name, float_format="%.2f"):
+        self.write_chunks([df], zone_path, file_name, float_format=float_format)
+
+    def split_chunks(self, chunks):
+        """Chunks cut to at most chunk_rows rows, an empty chunk is kept for the header"""
+        for chunk in chunks:
+            for start in range(0, max(len(chunk), 1), self.chunk_rows):
+                yield chunk.iloc[start : start + self.chunk_rows]
+
+    def formatted_chunks(self, chunks, float_format):
+        """CSV bytes of each chunk in order, with at most two chunks per worker in flight to bound memory"""
+        chunk_compression = "gzip" if self.compression == "gzip" else "none"
+        chunks = self.split_chunks(chunks)
+        first_chunks = list(itertools.islice(chunks, 2))
+        chunks = itertools.chain(first_chunks, chunks)
+        if self.workers <= 1 or len(first_chunks) < 2:
+            for chunk_number, chunk in enumerate(chunks):
+                yield format_csv_chunk(chunk, chunk_number == 0, float_format, chunk_compression, self.compression_level)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for chunk_number, chunk in enumerate(chunks):
+                pending.append(executor.submit(format_csv_chunk, chunk, chunk_number == 0, float_format, chunk_compression, self.compression_level))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def write_chunks(self, chunks, zone_path, file_name, float_format="%.2f"):
+        """Write DataFrame chunks to a temporary file that replaces the dataset once every chunk is written, then write its checksum file"""
+        dataset_path = self.dataset_path(zone_path, file_name)
+        temp_path = f"{dataset_path}.tmp"
+        try:
+            with open(temp_path, "wb") as output_file:
+                checksum_file = ChecksumFile(output_file)
+                if self.compression == "zstd":
+                    import zstandard
+
+                    compressor = zstandard.ZstdCompressor(level=3 if self.compression_level is None else self.compression_level, threads=self.workers)
+                    with compressor.stream_writer(checksum_file, closefd=False) as compressed_file:
+                        for data in self.formatted_chunks(chunks, float_format):
+                            compressed_file.write(data)
+                else:
+                    for data in self.formatted_chunks(chunks, float_format):
+                        checksum_file.write(data)
+                output_file.flush()
+                os.fsync(output_file.fileno())
+            os.replace(temp_path, dataset_path)
+
+            with open(temp_path, "w") as temp_checksum_file:
+                temp_checksum_file.write(f"{checksum_file.checksum.hexdigest()}  {os.path.basename(dataset_path)}\n")
+            os.replace(temp_path, checksum_path(dataset_path))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def read(self, zone_path, file_name, columns=None):
+        return pd.read_csv(self.dataset_path(zone_path, file_name), usecols=columns)
+
+    def read_chunks(self, zone_path, file_name, columns=None, chunk_rows=None):
+        with pd.read_csv(self.dataset_path(zone_path, file_name), usecols=columns, chunksize=chunk_rows) as reader:
+            yield from reader
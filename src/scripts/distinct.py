@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+# Keys below this bound are tracked in a bitmap of max key / 8 bytes, larger keys in the hash table
+BITMAP_MAX_KEY = 1 << 27
+# The hash table is doubled once more than this share of its slots is used
+HASH_TABLE_MAX_LOAD = 0.5
+HASH_TABLE_MIN_SLOTS = 1 << 10
+# Registers of the HyperLogLog sketch, as a power of 2, the relative error of the estimate is about 1.04 / sqrt(2**p)
+HYPERLOGLOG_PRECISION = 14
+# The bits of a hash left after the register bits must be exact in a float64 for their bit length to be read with frexp
+HYPERLOGLOG_MIN_PRECISION = 11
+
+
+def column_keys(series):
+    """
+    uint64 key of each not null value of a column.
+
+    Integer values are their own key, so the keys of integer columns are exact. Other values are hashed to 64 bits
+    with pandas, where two different values share a key with a probability of about n**2 / 2**65.
+    """
+    values = series.dropna()
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy(dtype=np.int64).view(np.uint64)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def mix_keys(keys):
+    """The splitmix64 finalizer, spreading keys such as consecutive ids evenly over the 64 bits"""
+    keys = keys ^ (keys >> np.uint64(30))
+    keys = keys * np.uint64(0xBF58476D1CE4E5B9)
+    keys = keys ^ (keys >> np.uint64(27))
+    keys = keys * np.uint64(0x94D049BB133111EB)
+    return keys ^ (keys >> np.uint64(31))
+
+
+def repeated_in_batch(keys):
+    """Boolean array flagging every occurrence of a key after its first one in the batch"""
+    return pd.Series(keys, copy=False).duplicated(keep="first").to_numpy()
+
+
+class IntegerHashSet:
+    """
+    Exact set of uint64 keys, filled a batch at a time with vectorized inserts.
+
+    Keys below BITMAP_MAX_KEY, such as the ids of a dataset, are kept as bits of a bitmap sized to the largest of
+    them. Other keys, such as hashed strings, are kept in an open addressing hash table with linear probing, doubled
+    when more than HASH_TABLE_MAX_LOAD of its slots are used. The table uses the key 0 as its empty slot marker,
+    the key 0 itself is in the bitmap.
+    """
+
+    def __init__(self):
+        self.bitmap = np.zeros(0, dtype=np.uint8)
+        self.table = np.zeros(HASH_TABLE_MIN_SLOTS, dtype=np.uint64)
+        self.table_keys = 0
+
+    def __len__(self):
+        return int(np.unpackbits(self.bitmap).sum()) + self.table_keys
+
+    @property
+    def nbytes(self):
+        return self.bitmap.nbytes + self.table.nbytes
+
+    def add(self, keys):
+        """
+        Add a batch of keys.
+
+        Returns:
+        - seen (numpy.ndarray): Boolean array flagging the keys added before, by an earlier batch or earlier in the batch.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        seen = repeated_in_batch(keys)
+        first_positions = np.flatnonzero(~seen)
+        small = keys[first_positions] < np.uint64(BITMAP_MAX_KEY)
+        seen[first_positions[small]] = self._add_to_bitmap(keys[first_positions[small]])
+        seen[first_positions[~small]] = self._add_to_table(keys[first_positions[~small]])
+        return seen
+
+    def _add_to_bitmap(self, keys):
+        """Add distinct keys below BITMAP_MAX_KEY, returns the keys that were in the bitmap"""
+        if not len(keys):
+            return np.zeros(0, dtype=bool)
+        keys = keys.astype(np.int64)
+        required_bytes = int(keys.max()) // 8 + 1
+        if required_bytes > len(self.bitmap):
+            self.bitmap = np.concatenate([self.bitmap, np.zeros(max(required_bytes, 2 * len(self.bitmap)) - len(self.bitmap), dtype=np.uint8)])
+
+        seen = (self.bitmap[keys >> 3] & (np.uint8(1) << (keys & 7).astype(np.uint8))) != 0
+        # Sorted keys put the bits of each byte next to each other, so they are combined with one reduceat
+        keys = np.sort(keys)
+        byte_positions, bits = keys >> 3, (np.uint8(1) << (keys & 7).astype(np.uint8))
+        byte_starts = np.flatnonzero(np.diff(byte_positions, prepend=-1))
+        self.bitmap[byte_positions[byte_starts]] |= np.bitwise_or.reduceat(bits, byte_starts)
+        return seen
+
+    def _add_to_table(self, keys):
+        """Add distinct keys of at least BITMAP_MAX_KEY, returns the keys that were in the table"""
+        while self.table_keys + len(keys) > HASH_TABLE_MAX_LOAD * len(self.table):
+            stored_keys = self.table[self.table != 0]
+            self.table = np.zeros(2 * len(self.table), dtype=np.uint64)
+            self.table_keys = 0
+            self._insert(stored_keys)
+        return self._insert(keys)
+
+    def _insert(self, keys):
+        slot_mask = np.uint64(len(self.table) - 1)
+        slots = mix_keys(keys) & slot_mask
+        seen = np.zeros(len(keys), dtype=bool)
+        pending = np.arange(len(keys))
+        while len(pending):
+            pending_keys, pending_slots = keys[pending], slots[pending]
+            current = self.table[pending_slots]
+            found = current == pending_keys
+            empty = current == 0
+            # Keys probing the same empty slot all write it, the key left in the slot claimed it and the others probe on
+            self.table[pending_slots[empty]] = pending_keys[empty]
+            claimed = empty & (self.table[pending_slots] == pending_keys)
+            self.table_keys += int(claimed.sum())
+            seen[pending[found]] = True
+
+            retry = ~(found | claimed)
+            pending = pending[retry]
+            slots[pending] = (pending_slots[retry] + np.uint64(1)) & slot_mask
+        return seen
+
+
+class HyperLogLog:
+    """
+    Approximate number of distinct uint64 keys in 2**precision one byte registers, whatever the number of keys.
+
+    The relative standard error of the estimate is about 1.04 / sqrt(2**precision), 0.8% for the default precision.
+    """
+
+    def __init__(self, precision=HYPERLOGLOG_PRECISION):
+        if not HYPERLOGLOG_MIN_PRECISION <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between {HYPERLOGLOG_MIN_PRECISION} and 18, got {precision}")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+    @property
+    def nbytes(self):
+        return self.registers.nbytes
+
+    def add(self, keys):
+        hashes = mix_keys(np.asarray(keys, dtype=np.uint64))
+        registers = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remaining_bits = 64 - self.precision
+        # Rank of the first set bit of the hash bits left after the register bits, remaining_bits + 1 when none is set
+        bit_lengths = np.frexp((hashes & np.uint64((1 << remaining_bits) - 1)).astype(np.float64))[1]
+        ranks = (remaining_bits + 1 - bit_lengths).astype(np.uint8)
+        np.maximum.at(self.registers, registers, ranks)
+
+    def estimate(self):
+        """Estimated number of distinct keys added"""
+        registers_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers_count)
+        raw_estimate = alpha * registers_count**2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        empty_registers = int(np.count_nonzero(self.registers == 0))
+        if raw_estimate <= 2.5 * registers_count and empty_registers:
+            # Linear counting is more accurate for small cardinalities
+            return registers_count * np.log(registers_count / empty_registers)
+        return raw_estimate
@@ -1,4 +1,18 @@
-import yaml
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from src.scripts.distinct import HyperLogLog, IntegerHashSet, column_keys, repeated_in_batch
+from src.scripts.metrics import frame_rows, track_metrics
+from src.scripts.schema import load_file_schema, schema_cache_key
+
+DQT_SAMPLE_SIZE = 5
+DQT_REPORT_ROWS = 1000
+UNIQUE_CHECKS = ["exact", "approximate"]
+# Standard errors of the HyperLogLog estimate the distinct values may fall below the number of values before the
+# approximate unique check fails
+APPROXIMATE_UNIQUE_TOLERANCE = 4
 
 
 class MovieDataValidator:
@@ -67,14 +81,116 @@ class RatingDataValidator:
         return result
 
 
-def validate_dataset(validator_name, df, file_schema_path):
+class SimilarMoviesDataValidator:
+    """Data validation class to validate the similar movies data product"""
+
+    @staticmethod
+    def validate_similarity(similarity):
+        # Cosine similarity of non negative ratings, only movies sharing a user are listed
+        try:
+            return 0 < float(similarity) <= 1
+        except ValueError:
+            return False
+
+
+class ColumnRule:
+    """
+    Vectorized check compiled from the "dqt_rules" of a schema column.
+
+    Supported rules:
+    - range: [min, max], inclusive bounds for numeric values.
+    - set: allowed numeric values.
+    - enum: allowed values, compared as they are stored.
+
+    Numeric rules truncate values like int() does in the validator classes, and values that cannot be converted
+    to a number fail the check.
+    """
+
+    def __init__(self, column, rule_type, params):
+        self.column = column
+        self.rule_type = rule_type
+
+        if rule_type == "range":
+            self.low, self.high = params
+        elif rule_type == "set":
+            self.allowed = np.asarray(params)
+        elif rule_type == "enum":
+            self.allowed = list(params)
+        else:
+            raise ValueError(f"Unknown dqt rule: {rule_type}, for column: {column}")
+
+    @staticmethod
+    def _as_numeric(series):
+        if pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_extension_array_dtype(series.dtype):
+            return series.to_numpy()
+        return np.trunc(pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan))
+
+    def invalid_mask(self, series):
+        """Boolean array flagging the rows that break the rule"""
+        if self.rule_type == "range":
+            values = self._as_numeric(series)
+            return ~((values >= self.low) & (values <= self.high))
+        if self.rule_type == "set":
+            return ~np.isin(self._as_numeric(series), self.allowed)
+        return ~series.isin(self.allowed).to_numpy(dtype=bool)
+
+
+def compile_dqt_rules(file_schema_path, schema_variables=None):
+    """
+    Compile the "dqt_rules" declared in a schema YAML into ColumnRule objects, once per schema file version and schema variables, see load_file_schema.
+
+    Returns:
+    - rules (dict): Column name mapped to the list of its ColumnRule objects.
+    """
+    return _compile_dqt_rules(*schema_cache_key(file_schema_path, schema_variables))
+
+
+@lru_cache(maxsize=None)
+def _compile_dqt_rules(file_schema_path, modified_time_ns, schema_variables):
+    file_schema = load_file_schema(file_schema_path, dict(schema_variables))
+    rules = {}
+    for col in file_schema["columns"]:
+        if col["dqt_enabled"] and "custom" in col["dqt_type"] and col.get("dqt_rules"):
+            rules[col["name"]] = [ColumnRule(col["name"], rule_type, params) for rule_type, params in col["dqt_rules"].items()]
+    return rules
+
+
+def evaluate_rules(df, rules, sample_size=DQT_SAMPLE_SIZE):
+    """
+    Run compiled column rules over a DataFrame in one pass.
+
+    Args:
+    - df (pandas.DataFrame): DataFrame to be validated.
+    - rules (dict): Output of compile_dqt_rules.
+    - sample_size (int): Number of failing row indices to report per column.
+
+    Returns:
+    - violations (dict): Column name mapped to {"violations": count, "sample_rows": [row index, ...]}.
+    """
+    violations = {}
+    for column, column_rules in rules.items():
+        invalid = np.zeros(len(df), dtype=bool)
+        for rule in column_rules:
+            invalid |= rule.invalid_mask(df[column])
+
+        invalid_positions = np.flatnonzero(invalid)
+        violations[column] = {"violations": int(invalid_positions.size), "sample_rows": df.index[invalid_positions[:sample_size]].tolist()}
+    return violations
+
+
+@track_metrics(rows_in=lambda call_arguments: frame_rows(call_arguments["df"]))
+def validate_dataset(validator_name, df, file_schema_path, schema_variables=None):
     """
     Validate columns of a DataFrame using a specific validator.
 
     Args:
     - validator_name (str): Name of the validator class.
     - df (pandas.DataFrame): DataFrame to be validated.
-    - validation_columns (list): List of columns to be validated.
+    - file_schema_path (str): Path to the schema YAML of the dataset.
+    - schema_variables (dict): Values of the column templates of the schema, see load_file_schema.
+
+    Custom checks use the vectorized "dqt_rules" of the schema when a column declares them, and fall back to the
+    validate_<column> method of the validator class otherwise.
 
     Returns:
     - validation_results (dict): Dictionary containing validation results for each column.
@@ -82,8 +198,7 @@ def validate_dataset(validator_name, df, file_schema_path):
     validator_class = globals().get(validator_name, None)
     validation_results = {}
 
-    with open(file_schema_path, "r") as file:
-        file_schema = yaml.safe_load(file)
+    file_schema = load_file_schema(file_schema_path, schema_variables)
 
     unique_check_columns = [col["name"] for col in file_schema["columns"] if col["dqt_enabled"] and "unique" in col["dqt_type"]]
 
@@ -116,20 +231,164 @@ def validate_dataset(validator_name, df, file_schema_path):
 
             validation_results[column] = validation_result
 
-    if validator_class is not None:
-        validation_columns = [col["name"] for col in file_schema["columns"] if col["dqt_enabled"] and "custom" in col["dqt_type"]]
+    validation_columns = [col["name"] for col in file_schema["columns"] if col["dqt_enabled"] and "custom" in col["dqt_type"]]
+    compiled_rules = compile_dqt_rules(file_schema_path, schema_variables)
 
-        if validation_columns:
-            for column in validation_columns:
-                dqt_func = getattr(validator_class, f"validate_{column}")
-                invalid_df = df[~df[column].apply(dqt_func)]
+    if compiled_rules:
+        for column, column_result in evaluate_rules(df, compiled_rules).items():
+            if column_result["violations"]:
+                print(f"Custom Data validation failed for column: {column}, in dataset: {validator_name}, invalid rows: {column_result['violations']}, sample row indices: {column_result['sample_rows']}")
+                validation_result = False
+            else:
+                validation_result = True
 
-                if not invalid_df.empty:
-                    print(f"Custom Data validation failed for column: {column}, in dataset: {validator_name}")
-                    validation_result = False
-                else:
-                    validation_result = True
+            validation_results[column] = validation_result
 
-                validation_results[column] = validation_result
+    fallback_columns = [column for column in validation_columns if column not in compiled_rules]
+
+    if validator_class is not None and fallback_columns:
+        for column in fallback_columns:
+            dqt_func = getattr(validator_class, f"validate_{column}")
+            invalid_df = df[~df[column].apply(dqt_func)]
+
+            if not invalid_df.empty:
+                print(f"Custom Data validation failed for column: {column}, in dataset: {validator_name}")
+                validation_result = False
+            else:
+                validation_result = True
+
+            validation_results[column] = validation_result
 
     return validation_results
+
+
+class ChunkValidator:
+    """
+    Run the DQTs of a schema over a dataset streamed in chunks, in one pass over each chunk.
+
+    The checks are compiled once from the schema: the unique and not null checks, the vectorized "dqt_rules" and the
+    validate_<column> methods of the validator class for the custom columns without rules. Every check flags the
+    rows of a chunk breaking it, and the first max_report_rows of them are kept in the report with their row number
+    in the dataset, column, rule and value. The results of all chunks are combined in the results attribute.
+
+    The values of the unique check columns are tracked across chunks in an IntegerHashSet, so a value repeated in
+    another chunk fails the unique check and is reported at every repeat. With unique_check = "approximate" a fixed
+    size HyperLogLog sketch replaces the set, for more keys than memory holds: values repeated within a chunk are
+    still reported by row, repeats across chunks fail the check once the estimated number of distinct values is
+    APPROXIMATE_UNIQUE_TOLERANCE standard errors below the number of values, without row numbers. Null values are
+    left to the not null check.
+
+    Args:
+    - validator_name (str): Name of the validator class.
+    - file_schema_path (str): Path to the schema YAML of the dataset.
+    - unique_check (str): exact or approximate.
+    - fail_fast (bool): Skip the remaining checks of a chunk once one of them failed.
+    - max_report_rows (int): Rows kept in the report.
+    - schema_variables (dict): Values of the column templates of the schema, see load_file_schema.
+
+    Raises:
+    - ValueError: For an unknown unique_check.
+    """
+
+    def __init__(self, validator_name, file_schema_path, unique_check="exact", fail_fast=False, max_report_rows=DQT_REPORT_ROWS, schema_variables=None):
+        if unique_check not in UNIQUE_CHECKS:
+            raise ValueError(f"Unknown unique check: {unique_check}, expected one of {UNIQUE_CHECKS}")
+        self.validator_name = validator_name
+        self.file_schema_path = file_schema_path
+        self.unique_check = unique_check
+        self.fail_fast = fail_fast
+        self.max_report_rows = max_report_rows
+        self.results = {}
+        self.report = []
+        self.rows = 0
+
+        enabled_columns = [col for col in load_file_schema(file_schema_path, schema_variables)["columns"] if col["dqt_enabled"]]
+        self.not_null_columns = [col["name"] for col in enabled_columns if "not_null" in col["dqt_type"]]
+        self.rules = compile_dqt_rules(file_schema_path, schema_variables)
+        validator_class = globals().get(validator_name, None)
+        self.fallback_checks = {}
+        if validator_class is not None:
+            self.fallback_checks = {col["name"]: getattr(validator_class, f"validate_{col['name']}") for col in enabled_columns if "custom" in col["dqt_type"] and col["name"] not in self.rules}
+
+        unique_columns = [col["name"] for col in enabled_columns if "unique" in col["dqt_type"]]
+        self.distinct_values = {column: IntegerHashSet() if unique_check == "exact" else HyperLogLog() for column in unique_columns}
+        self.values_count = {column: 0 for column in unique_columns}
+
+    @property
+    def failed(self):
+        return not all(self.results.values())
+
+    def repeated_values(self, column, series):
+        """Boolean array flagging the values of a unique column seen before, in this chunk or, for the exact check, in an earlier one"""
+        not_null = series.notna().to_numpy()
+        keys = column_keys(series)
+        repeated = np.zeros(len(series), dtype=bool)
+        if self.unique_check == "exact":
+            repeated[not_null] = self.distinct_values[column].add(keys)
+        else:
+            repeated[not_null] = repeated_in_batch(keys)
+            self.distinct_values[column].add(keys)
+        self.values_count[column] += len(keys)
+        return repeated
+
+    def checks(self, chunk):
+        """Column, rule and invalid row mask of each check of a chunk, computed as they are consumed"""
+        for column in self.distinct_values:
+            yield column, "unique", self.repeated_values(column, chunk[column])
+        for column in self.not_null_columns:
+            yield column, "not_null", chunk[column].isna().to_numpy()
+        for column, column_rules in self.rules.items():
+            for rule in column_rules:
+                yield column, rule.rule_type, rule.invalid_mask(chunk[column])
+        for column, dqt_func in self.fallback_checks.items():
+            yield column, "custom", ~chunk[column].apply(dqt_func).to_numpy(dtype=bool)
+
+    def record_violations(self, chunk, column, rule, invalid_positions):
+        """Combine a failed check into the results and keep its first rows in the report"""
+        self.results[column] = False
+        rows = self.rows + invalid_positions
+        print(f"Data validation failed for column: {column}, rule: {rule}, in dataset: {self.validator_name}, invalid rows: {len(rows)}, first invalid rows: {rows[:DQT_SAMPLE_SIZE].tolist()}")
+
+        reported_positions = invalid_positions[: max(self.max_report_rows - len(self.report), 0)]
+        values = chunk[column].iloc[reported_positions].tolist()
+        self.report.extend({"row": int(self.rows + position), "column": column, "rule": rule, "value": value} for position, value in zip(reported_positions, values))
+
+    def approximate_unique_failures(self):
+        """Unique columns whose estimated number of distinct values shows values repeated across chunks"""
+        failures = []
+        for column, sketch in self.distinct_values.items():
+            values_count = self.values_count[column]
+            if self.results.get(column, True) and values_count and sketch.estimate() < values_count * (1 - APPROXIMATE_UNIQUE_TOLERANCE * sketch.relative_error):
+                failures.append((column, values_count - round(sketch.estimate())))
+        return failures
+
+    @track_metrics(name="validate_dataset", rows_in=lambda call_arguments: frame_rows(call_arguments["chunk"]))
+    def validate(self, chunk):
+        """
+        Run the checks over the next chunk of the dataset.
+
+        Returns:
+        - chunk_passed (bool): True when the chunk passed every check.
+        """
+        chunk_passed = True
+        for column, rule, invalid in self.checks(chunk):
+            invalid_positions = np.flatnonzero(invalid)
+            self.results.setdefault(column, True)
+            if invalid_positions.size:
+                self.record_violations(chunk, column, rule, invalid_positions)
+                chunk_passed = False
+                if self.fail_fast:
+                    break
+
+        if self.unique_check == "approximate" and chunk_passed:
+            for column, repeated_count in self.approximate_unique_failures():
+                print(f"Data validation failed for column: {column}, rule: unique, in dataset: {self.validator_name}, about {repeated_count} values repeated across chunks")
+                self.results[column] = False
+                chunk_passed = False
+
+        self.rows += len(chunk)
+        return chunk_passed
+
+    def report_frame(self):
+        """Reported rows as a DataFrame of row, column, rule and value"""
+        return pd.DataFrame(self.report, columns=["row", "column", "rule", "value"])
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+from src.scripts.exceptions import CustomErrors
+
+MULTI_HOT_TYPE = "multi_hot"
+MULTI_HOT_SEPARATOR = "|"
+MULTI_HOT_DTYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+
+def numeric_dtype(column_type):
+    """NumPy dtype of an integer or float schema type, None for any other type"""
+    try:
+        dtype = np.dtype(column_type)
+    except TypeError:
+        return None
+    return dtype if dtype.kind in "iuf" else None
+
+
+def schema_parse_dtypes(file_schema):
+    """
+    Map the schema column types to dtypes the CSV parser can apply while reading.
+
+    Integer and float columns are parsed at 64 bits and downcast by apply_schema_dtypes, which checks the value
+    range, because the parser silently wraps values that overflow a narrower type. Multi-hot columns are parsed
+    as their text labels. Datetime columns hold epoch seconds in the source files, so they are left to the
+    parser's inference.
+    """
+    parse_dtypes = {}
+    for col in file_schema["columns"]:
+        column_type = str(col["type"])
+        if column_type.startswith("datetime"):
+            continue
+        dtype = numeric_dtype(column_type)
+        if column_type == MULTI_HOT_TYPE:
+            parse_dtypes[col["name"]] = "object"
+        elif dtype is not None:
+            parse_dtypes[col["name"]] = "float64" if dtype.kind == "f" else "int64"
+        else:
+            parse_dtypes[col["name"]] = column_type
+    return parse_dtypes
+
+
+def multi_hot_dtype(categories):
+    """Smallest unsigned integer dtype holding one bit per category"""
+    for dtype in MULTI_HOT_DTYPES:
+        if len(categories) <= np.iinfo(dtype).bits:
+            return np.dtype(dtype)
+    raise ValueError(f"A multi-hot column supports at most 64 categories, got {len(categories)}")
+
+
+def encode_multi_hot(series, categories, separator=MULTI_HOT_SEPARATOR):
+    """
+    Encode separator joined labels as a bitmask, bit i standing for categories[i].
+
+    Each distinct combination of labels is decoded once, so the cost is one factorize over the rows.
+
+    Raises:
+    - CustomErrors.SchemaTypeError: When a row is null or holds a label missing from the categories, naming the column, the row and the label.
+    """
+    category_bits = {category: bit for bit, category in enumerate(categories)}
+    dtype = multi_hot_dtype(categories)
+    codes, combinations = pd.factorize(series)
+    if (codes < 0).any():
+        raise CustomErrors.SchemaTypeError(f"Column {series.name}, row {series.index[np.argmax(codes < 0)]}: null value, which cannot be multi-hot encoded")
+
+    masks = np.zeros(len(combinations), dtype=dtype)
+    for position, combination in enumerate(combinations):
+        for label in str(combination).split(separator) if combination != "" else []:
+            if label not in category_bits:
+                raise CustomErrors.SchemaTypeError(f"Column {series.name}, row {series.index[np.argmax(codes == position)]}: label {label!r} is missing from the multi-hot categories {categories}")
+            masks[position] |= dtype.type(1) << dtype.type(category_bits[label])
+    return pd.Series(masks[codes], index=series.index, name=series.name)
+
+
+def decode_multi_hot(series, categories, separator=MULTI_HOT_SEPARATOR):
+    """Decode a bitmask column back to separator joined labels, in the order of the categories"""
+    codes, masks = pd.factorize(series)
+    labels = np.array([separator.join(category for bit, category in enumerate(categories) if (int(mask) >> bit) & 1) for mask in masks], dtype=object)
+    return pd.Series(labels[codes], index=series.index, name=series.name)
+
+
+def _downcast_integers(series, dtype):
+    """Cast an integer column to a narrower integer dtype, refusing values out of the dtype range"""
+    if len(series) and pd.api.types.is_integer_dtype(series.dtype):
+        dtype_info = np.iinfo(dtype)
+        if series.min() < dtype_info.min or series.max() > dtype_info.max:
+            raise ValueError(f"Column {series.name} has values out of the {dtype} range")
+    return series.astype(dtype)
+
+
+def apply_schema_dtypes(df, file_schema):
+    """
+    Convert the columns of a parsed DataFrame to the compact types declared in the schema.
+
+    Supported types besides the pandas dtype names:
+    - int8/int16/int32 and uint8/uint16/uint32: integer columns stored narrower than int64, checked against the type range.
+    - category: dictionary encoded strings, each distinct value stored once.
+    - multi_hot: separator joined labels stored as a bitmask, with the "categories" and optional "separator" of the column.
+    - datetime64[s]: epoch seconds converted to datetimes.
+
+    Raises:
+    - ValueError, TypeError: When a column cannot be converted, e.g. a value out of range.
+    - CustomErrors.SchemaTypeError: When a multi-hot column holds a null or a label missing from its categories.
+    """
+    converted = {}
+    for col in file_schema["columns"]:
+        column_name, column_type = col["name"], str(col["type"])
+        if column_name not in df.columns:
+            continue
+        series = df[column_name]
+
+        if column_type == MULTI_HOT_TYPE:
+            categories, separator = col["categories"], col.get("separator", MULTI_HOT_SEPARATOR)
+            if pd.api.types.is_integer_dtype(series.dtype):
+                converted[column_name] = _downcast_integers(series, multi_hot_dtype(categories))
+            else:
+                converted[column_name] = encode_multi_hot(series, categories, separator)
+        elif column_type.startswith("datetime"):
+            if not pd.api.types.is_datetime64_dtype(series.dtype):
+                series = pd.to_datetime(series, unit="s")
+            converted[column_name] = series.astype(column_type)
+        elif str(series.dtype) == column_type:
+            continue
+        elif numeric_dtype(column_type) is not None and numeric_dtype(column_type).kind in "iu":
+            converted[column_name] = _downcast_integers(series, numeric_dtype(column_type))
+        else:
+            converted[column_name] = series.astype(column_type)
+
+    return df.assign(**converted) if converted else df
+
+
+def decode_schema_columns(df, file_schema):
+    """Turn the multi-hot columns of a DataFrame back into their separator joined labels, e.g. for a CSV or a data product"""
+    decoded = {col["name"]: decode_multi_hot(df[col["name"]], col["categories"], col.get("separator", MULTI_HOT_SEPARATOR)) for col in file_schema["columns"] if str(col["type"]) == MULTI_HOT_TYPE and col["name"] in df.columns and pd.api.types.is_integer_dtype(df[col["name"]].dtype)}
+    return df.assign(**decoded) if decoded else df
+
+
+def memory_report(df):
+    """
+    In-memory footprint of a DataFrame, strings and categories included.
+
+    Returns:
+    - report (dict): Total MB and the dtype and MB of each column.
+    """
+    column_bytes = df.memory_usage(index=False, deep=True)
+    return {
+        "total_mb": round(column_bytes.sum() / 1024**2, 2),
+        "columns": {column: {"dtype": str(df[column].dtype), "mb": round(column_bytes[column] / 1024**2, 2)} for column in df.columns},
+    }
@@ -7,6 +7,18 @@ class CustomErrors(Exception):
     class DpDqtError(Exception):
         """Exception to be raised when same file exists more than once in zip archive"""
 
+    class StorageFormatError(Exception):
+        """Exception to be raised when a zone is configured with an unknown storage format"""
+
+    class IncrementalStateError(Exception):
+        """Exception to be raised when an incrementally maintained state does not match a full recompute"""
+
+    class StageGraphError(Exception):
+        """Exception to be raised when the pipeline stages do not form a valid dependency graph"""
+
+    class SchemaTypeError(Exception):
+        """Exception to be raised when a dataset holds a value its schema type cannot represent, such as a label missing from the categories of a multi-hot column"""
+
     def __init__(self, message: str) -> None:
         self.message = message
         super().__init__(self.message)
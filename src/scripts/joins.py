@@ -0,0 +1,97 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Keys are addressed directly while the key range needs at most this many slots per dimension row, or fewer than
+# DIRECT_ADDRESS_MIN_SLOTS slots in total, sparser key ranges fall back to a hash index
+DIRECT_ADDRESS_MAX_SLOTS_PER_ROW = 8
+DIRECT_ADDRESS_MIN_SLOTS = 1 << 16
+
+
+class DimensionIndex:
+    """
+    Row position of every key of a dimension dataset, built once and reused by every join with that dimension.
+
+    Dense integer keys such as movieid and userid are addressed directly: the position of key k is
+    positions[k - min_key], so a join is one vectorized gather per column instead of hashing the keys and
+    copying every column through pd.merge. Sparse or non integer keys fall back to a hash index.
+
+    Args:
+    - dimension_df (pandas.DataFrame): Dimension rows, one per key.
+    - key_column (str): Key column of the dimension.
+
+    Raises:
+    - ValueError: When the dimension has duplicated or null keys, which a many-to-one join cannot resolve.
+    """
+
+    def __init__(self, dimension_df, key_column):
+        self.dimension_df = dimension_df.reset_index(drop=True)
+        self.key_column = key_column
+        keys = self.dimension_df[key_column]
+        if keys.isna().any() or keys.duplicated().any():
+            raise ValueError(f"Dimension key {key_column} must be unique and not null to be joined on")
+
+        self.min_key = None
+        self.positions_by_key = None
+        self.hash_index = None
+        key_range = int(keys.max()) - int(keys.min()) + 1 if len(keys) and pd.api.types.is_integer_dtype(keys.dtype) else None
+        if key_range is not None and key_range <= max(DIRECT_ADDRESS_MIN_SLOTS, DIRECT_ADDRESS_MAX_SLOTS_PER_ROW * len(keys)):
+            self.min_key = int(keys.min())
+            self.positions_by_key = np.full(key_range, -1, dtype=np.int64)
+            self.positions_by_key[keys.to_numpy(dtype=np.int64) - self.min_key] = np.arange(len(keys))
+        else:
+            self.hash_index = pd.Index(keys)
+
+    def with_rows(self, dimension_df):
+        """Index over another version of the same dimension rows, e.g. with decoded columns, reusing the key positions"""
+        dimension_index = copy.copy(self)
+        dimension_index.dimension_df = dimension_df.reset_index(drop=True)
+        return dimension_index
+
+    @property
+    def is_direct(self):
+        return self.positions_by_key is not None
+
+    def positions(self, keys):
+        """Dimension row of each key, -1 for the keys missing from the dimension"""
+        if not self.is_direct:
+            return self.hash_index.get_indexer(keys)
+
+        keys = np.asarray(keys)
+        if keys.dtype.kind not in "iu":
+            return pd.Index(self.dimension_df[self.key_column]).get_indexer(keys)
+        offsets = keys.astype(np.int64) - self.min_key
+        in_range = (offsets >= 0) & (offsets < len(self.positions_by_key))
+        if in_range.all():
+            return self.positions_by_key[offsets]
+        positions = np.full(len(keys), -1, dtype=np.int64)
+        positions[in_range] = self.positions_by_key[offsets[in_range]]
+        return positions
+
+    def take(self, column, positions):
+        """Values of a dimension column at the given rows, missing values for -1 with the dtype pd.merge would give them"""
+        series = self.dimension_df[column]
+        values = series.array if pd.api.types.is_extension_array_dtype(series.dtype) else series.to_numpy()
+        return pd.api.extensions.take(values, positions, allow_fill=bool((positions < 0).any()))
+
+    def join(self, fact_df, on=None, columns=None):
+        """
+        Left join of fact rows with the dimension, the equivalent of pd.merge(fact_df, dimension_df, on=on, how="left").
+
+        Args:
+        - fact_df (pandas.DataFrame): Rows to enrich, in the order of the result.
+        - on (str): Key column of the fact rows, defaults to the dimension key column.
+        - columns (list): Dimension columns to add, defaults to every non key column.
+
+        Returns:
+        - joined_df (pandas.DataFrame): Fact columns followed by the dimension columns, with a fresh index. The fact
+        columns are not copied, so the result shares their memory with fact_df.
+        """
+        on = on or self.key_column
+        columns = columns or [column for column in self.dimension_df.columns if column != self.key_column]
+        positions = self.positions(fact_df[on].to_numpy())
+        joined_df = fact_df.set_axis(pd.RangeIndex(len(fact_df)), copy=False)
+        for column in columns:
+            joined_df[column] = self.take(column, positions)
+        return joined_df
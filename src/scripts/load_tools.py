@@ -1,10 +1,23 @@
+import csv
+import io
 import os
+import shutil
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
-import yaml
 
+from src.scripts.dtypes import apply_schema_dtypes, schema_parse_dtypes
 from src.scripts.exceptions import CustomErrors
+from src.scripts.metrics import frame_rows, path_size, track_metrics
+from src.scripts.schema import load_file_schema
+
+DAT_SEPARATOR = b"::"
+# ASCII unit separator, never present in the MovieLens dumps. "::" is rewritten to it so that the C engine can split the rows
+C_ENGINE_SEPARATOR = b"\x1f"
+DAT_READ_BLOCK_SIZE = 1 << 20
+EXTRACT_CHUNK_SIZE = 1 << 20
 
 
 def prepare_file_zones(directory_paths):
@@ -13,6 +26,56 @@ def prepare_file_zones(directory_paths):
         os.makedirs(directory, exist_ok=True)
 
 
+def find_dataset_member(z, dataset_name):
+    """
+    Find the single member of an open zip archive matching the dataset name.
+
+    Raises:
+    - FileNotFoundError: If the specified dataset file is not found in the zip archive.
+    - CustomErrors.MultiFileError: If multiple matching files are found.
+    """
+    matching_files = [info for info in z.infolist() if dataset_name in info.filename]
+
+    if not matching_files:
+        raise FileNotFoundError(f"No file matching '{dataset_name}' found in the zip archive.")
+    if len(matching_files) > 1:
+        # If there are multiple matches, raise exception
+        raise CustomErrors.MultiFileError(f"Multiple files found for {dataset_name}")
+
+    return matching_files[0]
+
+
+def file_crc32(file_path, chunk_size=EXTRACT_CHUNK_SIZE):
+    """CRC-32 of a file, computed in bounded chunks"""
+    crc = 0
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def is_member_extracted(member_info, output_path):
+    """Check if the file in the output path already has the size and CRC-32 of the zip member"""
+    return os.path.isfile(output_path) and os.path.getsize(output_path) == member_info.file_size and file_crc32(output_path) == member_info.CRC
+
+
+def stream_member(z, member_info, output_path, chunk_size=EXTRACT_CHUNK_SIZE):
+    """
+    Stream a zip member to disk in bounded chunks.
+
+    The data is written to a temporary file that replaces the output path once complete, so an interrupted
+    extraction never leaves a truncated file behind, and the temporary file is removed when the copy fails. The CRC-32 is verified by zipfile at the end of the member.
+    """
+    temp_path = f"{output_path}.tmp"
+    try:
+        with z.open(member_info) as file, open(temp_path, "wb") as output_file:
+            shutil.copyfileobj(file, output_file, chunk_size)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
 def extract_and_load_dataset(zip_file_path: str, output_folder: str, dataset_name: str) -> None:
     """
     Extracts the specified dataset from a zip file and persists the file.
@@ -31,62 +94,176 @@ def extract_and_load_dataset(zip_file_path: str, output_folder: str, dataset_nam
     """
     try:
         with zipfile.ZipFile(zip_file_path, "r") as z:
-            matching_files = [file for file in z.namelist() if dataset_name in file]
+            dataset_file = find_dataset_member(z, dataset_name)
+            stream_member(z, dataset_file, f"{output_folder}/{dataset_name}")
+    except Exception as e:
+        raise e
+
+    return None
 
-            if matching_files:
-                if len(matching_files) > 1:
-                    # If there are multiple matches, raise exception
-                    raise CustomErrors.MultiFileError(f"Multiple files found for {dataset_name}")
 
-                dataset_file = matching_files[0]
+def extract_and_load_datasets(zip_file_path, output_folder, dataset_names, max_workers=None, chunk_size=EXTRACT_CHUNK_SIZE):
+    """
+    Extracts several datasets from a zip file, opening the archive once.
 
-                with z.open(dataset_file) as file:
-                    extracted_data = file.read()
-                    output_path = f"{output_folder}/{dataset_name}"
+    Members are streamed to disk concurrently in bounded chunks. A member is skipped when the file in the output
+    folder already has its size and CRC-32, so re-runs on an unchanged archive only read the extracted files.
+
+    Args:
+    - zip_file_path (str): Path to the zip file containing the datasets.
+    - output_folder (str): Folder to persist the extracted files into.
+    - dataset_names (list): Names of the dataset files to extract.
+    - max_workers (int): Number of concurrent extractions, defaults to one per dataset.
+    - chunk_size (int): Bytes held in memory per extraction.
+
+    Returns:
+    - extraction_status (dict): Dataset name mapped to "extracted" or "skipped".
+
+    Raises:
+    - FileNotFoundError: If a dataset file is not found in the zip archive.
+    - CustomErrors.MultiFileError: If multiple matching files are found.
+    """
+    with zipfile.ZipFile(zip_file_path, "r") as z:
+        members = {dataset_name: find_dataset_member(z, dataset_name) for dataset_name in dataset_names}
 
-                    with open(output_path, "wb") as output_file:
-                        output_file.write(extracted_data)
+        def extract(dataset_name):
+            output_path = f"{output_folder}/{dataset_name}"
+            if is_member_extracted(members[dataset_name], output_path):
+                return "skipped"
+            stream_member(z, members[dataset_name], output_path, chunk_size)
+            return "extracted"
 
+        with ThreadPoolExecutor(max_workers=max_workers or len(dataset_names) or 1) as executor:
+            return dict(zip(dataset_names, executor.map(extract, dataset_names)))
+
+
+class DatSeparatorReader(io.RawIOBase):
+    """
+    Binary stream that rewrites the multi-character ".dat" separator into a single byte while reading.
+
+    Blocks are translated with bytes.replace, so the rewrite runs at C speed and only one block is held in memory.
+    A trailing run of ":" is carried over to the next block, which keeps the result identical to a single
+    left-to-right replace over the whole file.
+    """
+
+    def __init__(self, raw, block_size=DAT_READ_BLOCK_SIZE):
+        super().__init__()
+        self._raw = raw
+        self._block_size = block_size
+        self._block = b""
+        self._position = 0
+        self._carry = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        while not self._eof:
+            data = self._raw.read(self._block_size)
+            if not data:
+                self._eof = True
+                data, self._carry = self._carry, b""
             else:
-                raise FileNotFoundError(f"No file matching '{dataset_name}' found in the zip archive.")
-    except Exception as e:
-        raise e
+                data = self._carry + data
+                stripped = data.rstrip(DAT_SEPARATOR[:1])
+                self._carry = data[len(stripped) :]
+                data = stripped
 
-    return None
+            if data:
+                self._block = data.replace(DAT_SEPARATOR, C_ENGINE_SEPARATOR)
+                self._position = 0
+                return True
+        return False
+
+    def readinto(self, buffer):
+        if self._position >= len(self._block) and not self._fill():
+            return 0
+
+        size = min(len(buffer), len(self._block) - self._position)
+        buffer[:size] = self._block[self._position : self._position + size]
+        self._position += size
+        return size
 
 
-def gen_dataframe(dataset_file_path, file_schema_path):
+@track_metrics(rows_out=frame_rows, bytes_read=lambda call_arguments: path_size(call_arguments["dataset_file_path"]))
+def gen_dataframe(dataset_file_path, file_schema_path, chunksize=None):
     """
     Generates a Pandas DataFrame based on a given schema and dataset file.
 
+    The ".dat" files are split on "::" with the C engine through DatSeparatorReader. Text dtypes are applied
+    during parsing and the compact schema types (narrow integers, categories, multi-hot bitmasks, datetimes) right
+    after, see apply_schema_dtypes. When a column cannot be parsed or converted to its declared type the frame is
+    returned untyped or as parsed, so the DQTs can report the offending values. A multi-hot label missing from the
+    categories of its column is not checked by any DQT and raises CustomErrors.SchemaTypeError instead.
+
     Args:
     - dataset_file_path (str): Path to the dataset file.
     - file_schema_path (str): Path to the file containing the schema information.
+    - chunksize (int): When set, the file is read in chunks of at most this many rows.
 
     Returns:
-    - dataset_df (pandas.DataFrame): The generated DataFrame.
+    - dataset_df (pandas.DataFrame): The generated DataFrame, or an iterator of DataFrame chunks with chunksize.
+
+    Raises:
+    - CustomErrors.SchemaTypeError: When a multi-hot column holds a null or a label missing from its categories.
     """
 
-    with open(file_schema_path, "r") as file:
-        file_schema = yaml.safe_load(file)
+    file_schema = load_file_schema(file_schema_path)
 
     column_names = [col["name"] for col in file_schema["columns"]]
-
-    dataframe = pd.DataFrame(columns=column_names)
-
-    # Convert columns to appropriate raw_data types as per the schema
-    for col in file_schema["columns"]:
-        col_name = col["name"]
-        col_type = col["type"]
-        dataframe[col_name] = dataframe[col_name].astype(col_type)
+    parse_dtypes = schema_parse_dtypes(file_schema)
 
     if dataset_file_path.endswith(".dat"):
-        sep = "::"
-        header = None
+        read_kwargs = {"sep": C_ENGINE_SEPARATOR.decode(), "header": None, "quoting": csv.QUOTE_NONE}
+    elif dataset_file_path.endswith(".csv"):
+        read_kwargs = {"sep": ",", "header": 0}
     else:
-        sep = ","
-        header = 0
+        return None
+
+    if chunksize:
+        return _iter_dataset_file(dataset_file_path, file_schema, column_names, parse_dtypes, chunksize, **read_kwargs)
+
+    try:
+        dataset_df = _read_dataset_file(dataset_file_path, column_names, dtype=parse_dtypes, **read_kwargs)
+    except (ValueError, TypeError):
+        return _read_dataset_file(dataset_file_path, column_names, **read_kwargs)
 
-    if dataset_file_path.endswith(".dat") or dataset_file_path.endswith(".csv"):
-        dataset_df = pd.read_csv(dataset_file_path, sep=sep, engine="python", header=header, encoding="ISO-8859-1", names=column_names)
+    try:
+        return apply_schema_dtypes(dataset_df, file_schema)
+    except (ValueError, TypeError):
         return dataset_df
+
+
+def _open_dataset_stream(raw_file, dataset_file_path):
+    if dataset_file_path.endswith(".dat"):
+        return io.BufferedReader(DatSeparatorReader(raw_file))
+    return raw_file
+
+
+def _read_dataset_file(dataset_file_path, column_names, **read_kwargs):
+    """Read a ".dat" or ".csv" dataset with the C engine"""
+    with open(dataset_file_path, "rb") as raw_file:
+        stream = _open_dataset_stream(raw_file, dataset_file_path)
+        return pd.read_csv(stream, engine="c", encoding="ISO-8859-1", names=column_names, **read_kwargs)
+
+
+def _iter_dataset_file(dataset_file_path, file_schema, column_names, parse_dtypes, chunksize, **read_kwargs):
+    """
+    Read a ".dat" or ".csv" dataset in chunks with the C engine.
+
+    Text dtypes are applied while parsing. Numeric and compact schema types are applied to each chunk afterwards,
+    and a chunk that cannot be converted is kept as parsed so the DQTs can report the offending values, except for
+    an unknown multi-hot label, see gen_dataframe.
+    """
+    text_dtypes = {column: dtype for column, dtype in parse_dtypes.items() if not pd.api.types.is_numeric_dtype(pd.api.types.pandas_dtype(dtype))}
+
+    with open(dataset_file_path, "rb") as raw_file:
+        stream = _open_dataset_stream(raw_file, dataset_file_path)
+        with pd.read_csv(stream, engine="c", encoding="ISO-8859-1", names=column_names, dtype=text_dtypes, chunksize=chunksize, **read_kwargs) as reader:
+            for chunk in reader:
+                try:
+                    chunk = apply_schema_dtypes(chunk.astype(parse_dtypes), file_schema)
+                except (ValueError, TypeError):
+                    pass
+                yield chunk
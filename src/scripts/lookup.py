@@ -0,0 +1,257 @@
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from src.scripts.storage import NpyStorage
+
+INDEX_META_FILE = "_index.json"
+INDEX_OFFSETS_FILE = "offsets.npy"
+INDEX_ROWS_NAME = "rows"
+
+
+def source_signature(path):
+    """Size and modification time of a file or of every file below a directory, a cheap check of whether a data product was rewritten"""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [[os.path.basename(path), stat.st_size, stat.st_mtime_ns]]
+
+    signature = []
+    for root, dirs, file_names in os.walk(path):
+        dirs.sort()
+        for file_name in sorted(file_names):
+            stat = os.stat(os.path.join(root, file_name))
+            signature.append([os.path.relpath(os.path.join(root, file_name), path), stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+def mapped_array(file_path):
+    """Memory mapped .npy file as a plain ndarray view, which slices several times faster than np.memmap"""
+    return np.load(file_path, mmap_mode="r").view(np.ndarray)
+
+
+class DataProductIndex:
+    """
+    Direct-address index of a data product on an integer key column, memory mapped for point and batch lookups.
+
+    Layout of an index directory:
+    - _index.json: key column, smallest key, row count and the signature of the data product it was built from.
+    - offsets.npy: int64 array where the rows of key k are rows[offsets[k - min_key] : offsets[k - min_key + 1]].
+    - rows: the data product sorted by key, in the npy storage format.
+
+    Opening an index maps the column files without reading them, and a lookup is two offset reads plus a slice of
+    each column, with no parsing or searching.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        with open(f"{index_path}/{INDEX_META_FILE}", "r") as meta_file:
+            self.meta = json.load(meta_file)
+
+        self.key_column = self.meta["key_column"]
+        self.min_key = self.meta["min_key"]
+        self.offsets = mapped_array(f"{index_path}/{INDEX_OFFSETS_FILE}")
+
+        rows_meta = NpyStorage.read_meta(index_path, INDEX_ROWS_NAME)
+        part_path = f"{NpyStorage.dataset_path(index_path, INDEX_ROWS_NAME)}/{rows_meta['parts'][0]}"
+        self.columns = {}
+        self.null_masks = {}
+        for column_meta in rows_meta["columns"]:
+            file_path = f"{part_path}/{column_meta['name']}"
+            self.columns[column_meta["name"]] = mapped_array(f"{file_path}.npy")
+            if os.path.exists(f"{file_path}.nulls.npy"):
+                self.null_masks[column_meta["name"]] = mapped_array(f"{file_path}.nulls.npy")
+
+    @staticmethod
+    def build(df, key_column, index_path, signature=None):
+        """
+        Build the index of a DataFrame in a temporary directory that replaces index_path once complete.
+
+        Rows of the same key keep their order in the DataFrame.
+
+        Raises:
+        - ValueError: When the key column is not an integer column or has null values.
+        """
+        if not pd.api.types.is_integer_dtype(df[key_column].dtype):
+            raise ValueError(f"Lookup key {key_column} must be an integer column without nulls, got {df[key_column].dtype}")
+
+        # Categorical columns are stored as their labels, so every column file maps to the values it holds
+        df = df.astype({column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+        keys = df[key_column].to_numpy(dtype=np.int64)
+        min_key = int(keys.min()) if len(keys) else 0
+        max_key = int(keys.max()) if len(keys) else -1
+        order = np.argsort(keys, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(keys - min_key, minlength=max_key - min_key + 1))]).astype(np.int64)
+
+        temp_path = f"{index_path}.tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        try:
+            NpyStorage.write(df.iloc[order].reset_index(drop=True), temp_path, INDEX_ROWS_NAME)
+            np.save(f"{temp_path}/{INDEX_OFFSETS_FILE}", offsets)
+            meta = {"key_column": key_column, "min_key": min_key, "rows": len(df), "keys": int(np.count_nonzero(np.diff(offsets))), "signature": signature}
+            with open(f"{temp_path}/{INDEX_META_FILE}", "w") as meta_file:
+                json.dump(meta, meta_file, indent=2)
+
+            shutil.rmtree(index_path, ignore_errors=True)
+            os.replace(temp_path, index_path)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def row_range(self, key):
+        """Start and end row of a key, an empty range for keys without rows"""
+        position = int(key) - self.min_key
+        if position < 0 or position >= len(self.offsets) - 1:
+            return 0, 0
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def records(self, rows):
+        """Rows as dicts of plain Python values, with missing values as None"""
+        column_values = []
+        for name, values in self.columns.items():
+            row_values = values[rows].tolist()
+            if name in self.null_masks:
+                row_values = [None if is_null else value for value, is_null in zip(row_values, self.null_masks[name][rows].tolist())]
+            elif values.dtype.kind == "f":
+                row_values = [None if math.isnan(value) else value for value in row_values]
+            column_values.append(row_values)
+        return [dict(zip(self.columns, row)) for row in zip(*column_values)]
+
+    def lookup(self, key):
+        """Rows of a key, empty for an unknown key"""
+        start, end = self.row_range(key)
+        return self.records(slice(start, end)) if end > start else []
+
+    def lookup_many(self, keys):
+        """Rows of each key, keyed by the key, gathered with one read of each column for the whole batch"""
+        keys = np.asarray(keys, dtype=np.int64)
+        positions = keys - self.min_key
+        known = (positions >= 0) & (positions < len(self.offsets) - 1)
+        starts, ends = np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=np.int64)
+        starts[known], ends[known] = self.offsets[positions[known]], self.offsets[positions[known] + 1]
+
+        counts = ends - starts
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        rows = np.repeat(starts - bounds[:-1], counts) + np.arange(bounds[-1])
+        records = self.records(rows)
+        return {key: records[bounds[position] : bounds[position + 1]] for position, key in enumerate(keys.tolist())}
+
+
+class LookupService:
+    """
+    Lookups into the memory mapped indexes of the data products.
+
+    An index is rebuilt when its data product was rewritten since it was built, checked when the service opens it
+    and by refresh, so the service keeps answering from the latest pipeline outputs.
+
+    Args:
+    - index_zone_path (str): Folder holding one index directory per data product.
+    - data_product_zone_path (str): Folder of the data products.
+    - storage (class): Storage format of the data product zone.
+    - lookup_keys (dict): Key column of each indexed data product, e.g. {"top_movies_per_user": "userid"}.
+    """
+
+    def __init__(self, index_zone_path, data_product_zone_path, storage, lookup_keys):
+        self.index_zone_path = index_zone_path
+        self.data_product_zone_path = data_product_zone_path
+        self.storage = storage
+        self.lookup_keys = lookup_keys
+        self.indexes = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def index_path(self, file_name):
+        return f"{self.index_zone_path}/{file_name}"
+
+    def is_stale(self, file_name):
+        """Check if the index of a data product is missing or was built from an older version of it"""
+        meta_path = f"{self.index_path(file_name)}/{INDEX_META_FILE}"
+        if not os.path.exists(meta_path):
+            return True
+        with open(meta_path, "r") as meta_file:
+            built_signature = json.load(meta_file)["signature"]
+        return built_signature != source_signature(self.storage.dataset_path(self.data_product_zone_path, file_name))
+
+    def build_index(self, file_name):
+        """Build the index of a data product from its current version"""
+        dataset_path = self.storage.dataset_path(self.data_product_zone_path, file_name)
+        signature = source_signature(dataset_path)
+        DataProductIndex.build(self.storage.read(self.data_product_zone_path, file_name), self.lookup_keys[file_name], self.index_path(file_name), signature)
+        print(f"Lookup index: {file_name}, built on {self.lookup_keys[file_name]}")
+
+    def refresh(self):
+        """Rebuild the stale indexes and open every index that changed on disk"""
+        with self._lock:
+            for file_name in self.lookup_keys:
+                if self.is_stale(file_name):
+                    self.build_index(file_name)
+                meta_mtime = os.stat(f"{self.index_path(file_name)}/{INDEX_META_FILE}").st_mtime_ns
+                if file_name not in self.indexes or self.indexes[file_name][0] != meta_mtime:
+                    self.indexes[file_name] = (meta_mtime, DataProductIndex(self.index_path(file_name)))
+
+    def lookup(self, file_name, key):
+        return self.indexes[file_name][1].lookup(key)
+
+    def lookup_many(self, file_name, keys):
+        return self.indexes[file_name][1].lookup_many(keys)
+
+
+def lookup_request_handler(service, refresh_seconds):
+    """
+    Request handler class answering lookups of the service as JSON:
+    - GET /<data product>/<key>: rows of one key.
+    - GET /<data product>?keys=1,2,3: rows of each key.
+    Stale indexes are rebuilt at most every refresh_seconds, before answering.
+    """
+    last_refresh = [time.monotonic()]
+
+    class LookupRequestHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            payload = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if time.monotonic() - last_refresh[0] >= refresh_seconds:
+                last_refresh[0] = time.monotonic()
+                service.refresh()
+
+            url = urlparse(self.path)
+            path_parts = [part for part in url.path.split("/") if part]
+            if not path_parts or path_parts[0] not in service.lookup_keys or len(path_parts) > 2:
+                return self.send_json(404, {"error": f"Unknown path {url.path}, available data products: {', '.join(service.lookup_keys)}"})
+
+            try:
+                if len(path_parts) == 2:
+                    return self.send_json(200, service.lookup(path_parts[0], int(path_parts[1])))
+                keys = [int(key) for key in ",".join(parse_qs(url.query).get("keys", [])).split(",") if key]
+            except ValueError:
+                return self.send_json(400, {"error": f"Keys of {path_parts[0]} must be integers"})
+            return self.send_json(200, service.lookup_many(path_parts[0], keys))
+
+        def log_message(self, format, *args):
+            return
+
+    return LookupRequestHandler
+
+
+def serve_lookups(service, host="127.0.0.1", port=8080, refresh_seconds=5):
+    """Serve the lookups of the service over HTTP until interrupted"""
+    server = ThreadingHTTPServer((host, port), lookup_request_handler(service, refresh_seconds))
+    print(f"Lookup service: serving {', '.join(service.lookup_keys)} on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
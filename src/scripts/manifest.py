@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+
+FINGERPRINT_CHUNK_SIZE = 1 << 20
+
+
+def stage_config_sections(config, section_names):
+    """Items of the config sections a stage is built from, as fingerprinted by StageManifest.stage_fingerprint. Sections missing from the config are left out"""
+    return {section: dict(config[section]) for section in section_names if config.has_section(section)}
+
+
+class StageManifest:
+    """
+    Manifest of the content fingerprints each pipeline stage was last built from.
+
+    A stage fingerprint combines the content of its input files, schema files and config sections. A stage is
+    up to date when that fingerprint matches the recorded one and its outputs still have the recorded content.
+    File digests are reused while the size and modification time of a file do not change, so checking an
+    unchanged pipeline does not read the data files again. Without a manifest path the digests are only kept in
+    memory.
+    """
+
+    def __init__(self, manifest_path=None):
+        self.manifest_path = manifest_path
+        self.stages = {}
+        self.files = {}
+
+        if manifest_path is not None and os.path.exists(manifest_path):
+            with open(manifest_path, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+            self.stages = manifest.get("stages", {})
+            self.files = manifest.get("files", {})
+
+    def save(self):
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump({"stages": self.stages, "files": self.files}, manifest_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def file_digest(self, file_path):
+        """Content digest of a file, recomputed only when its size or modification time changed"""
+        stat = os.stat(file_path)
+        cached = self.files.get(file_path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["digest"]
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(FINGERPRINT_CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+        self.files[file_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def path_digest(self, path):
+        """Content digest of a file or of every file in a directory. Returns None for a missing path"""
+        if os.path.isfile(path):
+            return self.file_digest(path)
+        if not os.path.isdir(path):
+            return None
+
+        digest = hashlib.blake2b(digest_size=16)
+        for root, dirs, file_names in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(file_names):
+                file_path = os.path.join(root, file_name)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(self.file_digest(file_path).encode())
+        return digest.hexdigest()
+
+    def stage_fingerprint(self, input_paths, config_sections):
+        """
+        Fingerprint of everything a stage is built from.
+
+        Args:
+        - input_paths (list): Input files, directories and schema files of the stage.
+        - config_sections (dict): Config section name mapped to its items.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for path in input_paths:
+            digest.update(f"{path}={self.path_digest(path)}".encode())
+        digest.update(json.dumps(config_sections, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def outdated_reason(self, stage_name, fingerprint, output_paths):
+        """Reason to rebuild a stage, None when the recorded build is still up to date"""
+        recorded = self.stages.get(stage_name)
+        if recorded is None:
+            return "no previous build recorded"
+        if recorded["fingerprint"] != fingerprint:
+            return "inputs, schemas or config changed"
+        if sorted(recorded["outputs"]) != sorted(output_paths):
+            return "outputs changed"
+        for path in output_paths:
+            if self.path_digest(path) != recorded["outputs"][path]:
+                return f"output {path} missing or modified"
+        return None
+
+    def record(self, stage_name, fingerprint, output_paths):
+        """Record a completed stage build along with the digests of its outputs"""
+        self.stages[stage_name] = {"fingerprint": fingerprint, "outputs": {path: self.path_digest(path) for path in output_paths}}
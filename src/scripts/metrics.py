@@ -0,0 +1,216 @@
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    # resource is not available on Windows, peak RSS is then not reported
+    resource = None
+
+PROFILERS = ["cprofile", "tracemalloc"]
+PROFILE_REPORT_LINES = 40
+
+_active_recorder = None
+_stage_context = threading.local()
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process so far, None where the platform does not report it"""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak_rss / (1024**2 if sys.platform == "darwin" else 1024), 2)
+
+
+def path_size(path):
+    """Size in bytes of a file or of all files below a directory, None when the path does not exist"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, file_name)) for root, _, file_names in os.walk(path) for file_name in file_names)
+    return None
+
+
+def frame_rows(df):
+    """Number of rows of a DataFrame, None for anything else such as an iterator of chunks"""
+    return int(df.shape[0]) if hasattr(df, "shape") else None
+
+
+class MetricsRecorder:
+    """
+    Writer of the pipeline metrics, one JSON record per line.
+
+    Each record holds the wall time, the CPU time of the calling thread, rows in/out, bytes read/written, the write
+    throughput in bytes per second and the peak RSS of the process at the end of the measured stage or call, along
+    with the run id and the stage it ran in.
+    Records are appended with a single write, so worker processes of the same run can share the metrics file.
+    """
+
+    def __init__(self, metrics_path, run_id=None):
+        self.metrics_path = metrics_path
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(metrics_path) or ".", exist_ok=True)
+
+    def write(self, record):
+        line = json.dumps(record) + "\n"
+        with self._lock, open(self.metrics_path, "a") as metrics_file:
+            metrics_file.write(line)
+
+    @contextmanager
+    def measure(self, name, kind="call"):
+        """
+        Measure the enclosed block and write its record, also when the block raises.
+
+        Yields:
+        - record (dict): The record to complete with rows_in, rows_out, bytes_read and bytes_written.
+        """
+        record = {
+            "run_id": self.run_id,
+            "kind": kind,
+            "name": name,
+            "stage": name if kind == "stage" else getattr(_stage_context, "stage_name", None),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "status": "ok",
+            "rows_in": None,
+            "rows_out": None,
+            "bytes_read": None,
+            "bytes_written": None,
+        }
+        parent_stage_name = getattr(_stage_context, "stage_name", None)
+        if kind == "stage":
+            _stage_context.stage_name = name
+
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall_start, 6)
+            record["cpu_seconds"] = round(time.thread_time() - cpu_start, 6)
+            record["bytes_written_per_sec"] = round(record["bytes_written"] / record["wall_seconds"]) if record["bytes_written"] and record["wall_seconds"] else None
+            record["peak_rss_mb"] = peak_rss_mb()
+            _stage_context.stage_name = parent_stage_name
+            self.write(record)
+
+    @contextmanager
+    def profile(self, stage_name, profiler):
+        """
+        Run cProfile or tracemalloc over the enclosed block and save the report next to the metrics file.
+
+        cProfile profiles the calling thread only, tracemalloc traces the allocations of every thread of the process.
+
+        Raises:
+        - ValueError: When the profiler is not supported.
+        """
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler}, supported profilers: {', '.join(PROFILERS)}")
+
+        report_prefix = os.path.join(os.path.dirname(self.metrics_path), f"{self.run_id}_{stage_name}")
+        if profiler == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                profile.dump_stats(f"{report_prefix}.prof")
+                with open(f"{report_prefix}.cprofile.txt", "w") as report_file:
+                    pstats.Stats(profile, stream=report_file).sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+                print(f"Stage: {stage_name}, cProfile report saved to {report_prefix}.prof")
+            return
+
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(f"{report_prefix}.tracemalloc.txt", "w") as report_file:
+                report_file.write(f"current: {current_bytes / 1024**2:.2f} MB, peak: {peak_bytes / 1024**2:.2f} MB\n")
+                for statistic in snapshot.statistics("lineno")[:PROFILE_REPORT_LINES]:
+                    report_file.write(f"{statistic}\n")
+            print(f"Stage: {stage_name}, tracemalloc report saved to {report_prefix}.tracemalloc.txt")
+
+
+def current_stage_name():
+    """Name of the stage the calling thread runs, None outside of a measured stage"""
+    return getattr(_stage_context, "stage_name", None)
+
+
+@contextmanager
+def stage_context(stage_name):
+    """Attribute the records of the enclosed block to a stage, for the helper threads of a stage"""
+    parent_stage_name = current_stage_name()
+    _stage_context.stage_name = stage_name
+    try:
+        yield
+    finally:
+        _stage_context.stage_name = parent_stage_name
+
+
+def activate_metrics_recorder(recorder):
+    """Set the recorder the track_metrics instrumented functions write to, None disables the instrumentation"""
+    global _active_recorder
+    _active_recorder = recorder
+
+
+def get_metrics_recorder():
+    return _active_recorder
+
+
+def track_metrics(name=None, rows_in=None, rows_out=None, bytes_read=None, bytes_written=None):
+    """
+    Decorator recording the metrics of every call of the function while a MetricsRecorder is active.
+
+    Args:
+    - name (str): Name of the records, defaults to the function name.
+    - rows_in (callable): Called with the bound call arguments, returns the rows consumed.
+    - rows_out (callable): Called with the return value, returns the rows produced.
+    - bytes_read (callable): Called with the bound call arguments before the call, returns the bytes read.
+    - bytes_written (callable): Called with the bound call arguments after the call, returns the bytes written.
+    """
+
+    def decorator(function):
+        signature = inspect.signature(function)
+        record_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            recorder = _active_recorder
+            if recorder is None:
+                return function(*args, **kwargs)
+
+            bound_arguments = signature.bind(*args, **kwargs)
+            bound_arguments.apply_defaults()
+            call_arguments = bound_arguments.arguments
+            with recorder.measure(record_name) as record:
+                if rows_in is not None:
+                    record["rows_in"] = rows_in(call_arguments)
+                if bytes_read is not None:
+                    record["bytes_read"] = bytes_read(call_arguments)
+                result = function(*args, **kwargs)
+                if rows_out is not None:
+                    record["rows_out"] = rows_out(result)
+                if bytes_written is not None:
+                    record["bytes_written"] = bytes_written(call_arguments)
+            return result
+
+        return wrapper
+
+    return decorator
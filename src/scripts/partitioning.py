@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+PARTITIONING_SPEC_FILE = "_partitioning.json"
+PARTITION_PART_PREFIX = "part-"
+
+
+def bucket_ids(values, buckets):
+    """
+    Hash bucket of each partition key, stable across runs and processes.
+
+    Integer keys are hashed as int64, so the bucket of a key does not depend on how narrow its column dtype is.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        values = values.astype(np.int64)
+    return (pd.util.hash_array(values, categorize=False) % np.uint64(buckets)).astype(np.int64)
+
+
+class HashPartitionedStorage:
+    """
+    Dataset hash partitioned on a column into hive-style bucket directories, on top of a storage format.
+
+    Layout of a dataset directory:
+    - _partitioning.json: partition column, number of buckets, storage format and list of parts.
+    - <column>_bucket=<N>/part-00000: the rows whose key hashes to bucket N, in the storage format. Every bucket
+      holds the same list of parts, one per written chunk, some of them possibly empty.
+
+    All the rows of a key land in the same bucket in their original order, so per-key computations can run on each
+    bucket independently, and readers of a subset of keys only load the buckets those keys hash to.
+    """
+
+    def __init__(self, storage, column, buckets):
+        self.storage = storage
+        self.format_name = storage.format_name
+        self.column = column
+        self.buckets = buckets
+
+    @staticmethod
+    def dataset_path(zone_path, file_name):
+        return f"{zone_path}/{file_name}"
+
+    def bucket_path(self, dataset_path, bucket):
+        return f"{dataset_path}/{self.column}_bucket={bucket}"
+
+    def buckets_for(self, keys):
+        """Sorted buckets holding the given partition keys, the buckets left out can be pruned"""
+        return sorted(set(bucket_ids(keys, self.buckets).tolist()))
+
+    def split(self, df):
+        """Yield (bucket, rows of the bucket) for every bucket, rows kept in their original order"""
+        row_buckets = bucket_ids(df[self.column].to_numpy(), self.buckets)
+        order = np.argsort(row_buckets, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(row_buckets, minlength=self.buckets))])
+        for bucket in range(self.buckets):
+            yield bucket, df.iloc[order[bounds[bucket] : bounds[bucket + 1]]].reset_index(drop=True)
+
+    def read_spec(self, zone_path, file_name):
+        with open(f"{self.dataset_path(zone_path, file_name)}/{PARTITIONING_SPEC_FILE}", "r") as spec_file:
+            return json.load(spec_file)
+
+    def write(self, df, zone_path, file_name, float_format="%.2f"):
+        self.write_chunks([df], zone_path, file_name, float_format=float_format)
+
+    def write_chunks(self, chunks, zone_path, file_name, float_format="%.2f"):
+        """Split each chunk into the buckets of a temporary dataset directory that replaces the dataset once complete"""
+        dataset_path = self.dataset_path(zone_path, file_name)
+        temp_path = f"{dataset_path}.tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+        try:
+            parts = []
+            for chunk in chunks:
+                part_name = f"{PARTITION_PART_PREFIX}{len(parts):05d}"
+                for bucket, bucket_df in self.split(chunk):
+                    bucket_path = self.bucket_path(temp_path, bucket)
+                    os.makedirs(bucket_path, exist_ok=True)
+                    self.storage.write(bucket_df, bucket_path, part_name, float_format=float_format)
+                parts.append(part_name)
+
+            if not parts:
+                raise ValueError(f"No chunks to write for dataset: {file_name}")
+
+            spec = {"column": self.column, "buckets": self.buckets, "format": self.storage.format_name, "parts": parts}
+            with open(f"{temp_path}/{PARTITIONING_SPEC_FILE}", "w") as spec_file:
+                json.dump(spec, spec_file, indent=2)
+
+            shutil.rmtree(dataset_path, ignore_errors=True)
+            os.replace(temp_path, dataset_path)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def read(self, zone_path, file_name, columns=None, buckets=None):
+        """Read the dataset, or only the given buckets of it. An empty selection of buckets gives an empty frame with the columns of the dataset"""
+        spec = self.read_spec(zone_path, file_name)
+        dataset_path = self.dataset_path(zone_path, file_name)
+        selected_buckets = range(spec["buckets"]) if buckets is None else buckets
+
+        part_dfs = [self.storage.read(self.bucket_path(dataset_path, bucket), part_name, columns=columns) for bucket in selected_buckets for part_name in spec["parts"]]
+        if not part_dfs:
+            # No bucket selected: the columns and dtypes come from the first part, without its rows
+            part_dfs = [self.storage.read(self.bucket_path(dataset_path, 0), spec["parts"][0], columns=columns).iloc[:0]]
+        # Empty parts read from text formats lose their dtypes, they are only kept when every part is empty
+        non_empty_dfs = [part_df for part_df in part_dfs if len(part_df)] or part_dfs[:1]
+        return pd.concat(non_empty_dfs, ignore_index=True) if len(non_empty_dfs) > 1 else non_empty_dfs[0].reset_index(drop=True)
+
+    def read_chunks(self, zone_path, file_name, columns=None, chunk_rows=None, buckets=None):
+        """Read the dataset, or only the given buckets of it, as DataFrames of at most chunk_rows rows"""
+        spec = self.read_spec(zone_path, file_name)
+        dataset_path = self.dataset_path(zone_path, file_name)
+        selected_buckets = range(spec["buckets"]) if buckets is None else buckets
+
+        for bucket in selected_buckets:
+            for part_name in spec["parts"]:
+                for chunk in self.storage.read_chunks(self.bucket_path(dataset_path, bucket), part_name, columns=columns, chunk_rows=chunk_rows):
+                    if len(chunk):
+                        yield chunk
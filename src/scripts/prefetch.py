@@ -0,0 +1,69 @@
+import queue
+import threading
+
+from src.scripts.metrics import current_stage_name, stage_context
+
+# Seconds a blocked producer waits before checking whether the consumer stopped
+PREFETCH_POLL_SECONDS = 0.1
+_END = object()
+
+
+def prefetch(items, depth=2, name="prefetch"):
+    """
+    Iterate over items produced ahead by a background thread, so producing the next items overlaps with the work
+    done by the caller on the current one.
+
+    The items wait in a queue bounded to depth, which bounds the memory held by the items produced ahead. An
+    exception raised by the producer is re-raised to the caller once the items produced before it are consumed.
+    When the caller stops early, the producer is stopped and the items iterator is closed. Metrics recorded by the
+    producer are attributed to the stage of the caller.
+
+    Args:
+    - items (iterable): Items to produce, e.g. a generator of DataFrame chunks.
+    - depth (int): Maximum number of items produced ahead of the caller.
+    - name (str): Name of the producer thread.
+
+    Yields:
+    - item: The items in their original order.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+    stage_name = current_stage_name()
+
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                buffer.put(entry, timeout=PREFETCH_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(items)
+        error = None
+        with stage_context(stage_name):
+            try:
+                for item in iterator:
+                    if not put((item, None)):
+                        break
+            except BaseException as producer_error:
+                error = producer_error
+            finally:
+                if hasattr(iterator, "close"):
+                    iterator.close()
+        put((_END, error))
+
+    producer = threading.Thread(target=produce, name=name, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
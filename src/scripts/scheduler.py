@@ -0,0 +1,100 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from src.scripts.exceptions import CustomErrors
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+
+class StageScheduler:
+    """
+    Run the stages of a dependency graph on a thread or process pool, each stage as soon as all its dependencies completed.
+
+    The scheduling thread decides which stages are ready and calls the should_run and on_success hooks, so
+    bookkeeping such as the stage manifest is never shared between workers. When a stage fails no further stage
+    is started, the stages already running are awaited and the first failure is re-raised unchanged.
+    """
+
+    def __init__(self, stage_dependencies, executor="thread", max_workers=None):
+        """
+        Args:
+        - stage_dependencies (dict): Stage name mapped to the list of the stage names it depends on.
+        - executor (str): thread or process.
+        - max_workers (int): Size of the pool, defaults to the executor default.
+
+        Raises:
+        - StageGraphError: When the executor is unknown, a dependency is not a declared stage or the graph has a cycle.
+        """
+        if executor not in EXECUTORS:
+            raise CustomErrors.StageGraphError(f"Unknown stage executor {executor}, supported executors: {', '.join(EXECUTORS)}")
+
+        self.stage_dependencies = {stage_name: set(dependencies) for stage_name, dependencies in stage_dependencies.items()}
+        self.executor = executor
+        self.max_workers = max_workers
+        self.execution_order = self.topological_order()
+
+    def topological_order(self):
+        """Stage names ordered so every stage comes after its dependencies, in declaration order otherwise"""
+        for stage_name, dependencies in self.stage_dependencies.items():
+            unknown_dependencies = dependencies - self.stage_dependencies.keys()
+            if unknown_dependencies:
+                raise CustomErrors.StageGraphError(f"Stage {stage_name} depends on undeclared stages {sorted(unknown_dependencies)}")
+
+        ordered, done = [], set()
+        while len(ordered) < len(self.stage_dependencies):
+            ready = [stage_name for stage_name, dependencies in self.stage_dependencies.items() if stage_name not in done and dependencies <= done]
+            if not ready:
+                raise CustomErrors.StageGraphError(f"Stage graph has a cycle between {sorted(self.stage_dependencies.keys() - done)}")
+            ordered.extend(ready)
+            done.update(ready)
+        return ordered
+
+    def run(self, stage_task, should_run=None, on_success=None):
+        """
+        Execute every stage of the graph.
+
+        Args:
+        - stage_task (callable): Called with a stage name, returns the (function, args) to submit to the pool. Both must be picklable with the process executor.
+        - should_run (callable): Called with a ready stage name, a False result marks the stage completed without running it.
+        - on_success (callable): Called with the stage name once the stage completed.
+
+        Returns:
+        - executed (list): Names of the stages that were run, in completion order.
+
+        Raises:
+        - Exception: The first exception raised by a stage.
+        """
+        pending = list(self.execution_order)
+        done, executed, running = set(), [], {}
+        failure = None
+
+        with EXECUTORS[self.executor](max_workers=self.max_workers) as pool:
+            while pending or running:
+                ready = [stage_name for stage_name in pending if self.stage_dependencies[stage_name] <= done] if failure is None else []
+                for stage_name in ready:
+                    pending.remove(stage_name)
+                    if should_run is not None and not should_run(stage_name):
+                        done.add(stage_name)
+                        continue
+                    function, args = stage_task(stage_name)
+                    running[pool.submit(function, *args)] = stage_name
+
+                if any(self.stage_dependencies[stage_name] <= done for stage_name in pending) and failure is None:
+                    # Skipped stages may have unlocked further stages
+                    continue
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage_name = running.pop(future)
+                    if future.exception() is not None:
+                        failure = failure or future.exception()
+                        continue
+                    if on_success is not None:
+                        on_success(stage_name)
+                    done.add(stage_name)
+                    executed.append(stage_name)
+
+        if failure is not None:
+            raise failure
+        return executed
@@ -0,0 +1,56 @@
+import os
+from functools import lru_cache
+
+import yaml
+
+
+def load_file_schema(file_schema_path, schema_variables=None):
+    """
+    Load a dataset schema YAML.
+
+    The parsed schema is cached on the file path and modification time, so every stage that needs the same schema
+    shares one parse and an edited schema file is picked up on the next call.
+
+    A column with a for_each key is a template, repeated for every value of the schema variable it names with the
+    value formatted into the column name, e.g. avg_rating_{window}d for each window of a data product config.
+
+    Args:
+    - file_schema_path (str): Path to the schema YAML file.
+    - schema_variables (dict): Values of the variables of the column templates, e.g. {"window": [30, 90, 365]}.
+
+    Returns:
+    - file_schema (dict): Parsed schema with the column templates expanded. Callers must not modify it.
+
+    Raises:
+    - ValueError: When a column template names a variable without values.
+    """
+    return _load_file_schema(*schema_cache_key(file_schema_path, schema_variables))
+
+
+@lru_cache(maxsize=None)
+def _load_file_schema(file_schema_path, modified_time_ns, schema_variables):
+    with open(file_schema_path, "r") as file:
+        file_schema = yaml.safe_load(file)
+    return expand_column_templates(file_schema, dict(schema_variables), file_schema_path)
+
+
+def expand_column_templates(file_schema, schema_variables, file_schema_path):
+    """Schema with every for_each column template replaced by one column per value of its variable"""
+    columns = []
+    for col in file_schema["columns"]:
+        if "for_each" not in col:
+            columns.append(col)
+            continue
+
+        variable = col["for_each"]
+        if variable not in schema_variables:
+            raise ValueError(f"Schema: {file_schema_path}, column {col['name']} is repeated for each {variable}, but no {variable} values were given")
+        column_template = {key: value for key, value in col.items() if key != "for_each"}
+        columns.extend({**column_template, "name": col["name"].format(**{variable: value})} for value in schema_variables[variable])
+    return {**file_schema, "columns": columns}
+
+
+def schema_cache_key(file_schema_path, schema_variables=None):
+    """Key identifying a schema file version and the values of its template variables, used to cache objects compiled from the schema"""
+    frozen_variables = tuple(sorted((variable, tuple(values)) for variable, values in (schema_variables or {}).items()))
+    return os.path.abspath(file_schema_path), os.stat(file_schema_path).st_mtime_ns, frozen_variables
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# Bytes of the dense similarity row and of the sparse product entries held per movie of a block
+BLOCK_BYTES_PER_CELL = 16
+# Blocks of similarities with a larger share of non zero entries are made dense before the top N selection
+SPARSE_BLOCK_DENSITY = 0.05
+
+
+class RatingsMatrix:
+    """
+    Sparse user x movie matrix of the ratings in CSR layout, held as NumPy arrays.
+
+    Row i holds the ratings of user_ids[i], the column j of a rating is the position of its movie in movie_ids. Both
+    id arrays are sorted, so the matrix of a set of ratings does not depend on the order of the rows. A user rating a
+    movie more than once keeps the sum of the ratings, like scipy.sparse does for duplicate entries.
+
+    Args:
+    - indptr (numpy.ndarray): Offsets of the ratings of each user in indices and data, one more than the users.
+    - indices (numpy.ndarray): Movie column of each rating, sorted within each user.
+    - data (numpy.ndarray): float32 rating values.
+    - user_ids (numpy.ndarray): userid of each row.
+    - movie_ids (numpy.ndarray): movieid of each column.
+    """
+
+    def __init__(self, indptr, indices, data, user_ids, movie_ids):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+
+    @property
+    def shape(self):
+        return len(self.user_ids), len(self.movie_ids)
+
+    @classmethod
+    def from_ratings(cls, userids, movieids, ratings):
+        """Build the matrix from the userid, movieid and ratings arrays of the ratings"""
+        from scipy import sparse
+
+        user_ids, user_codes = np.unique(userids, return_inverse=True)
+        movie_ids, movie_codes = np.unique(movieids, return_inverse=True)
+        matrix = sparse.csr_matrix((np.asarray(ratings, dtype=np.float32), (user_codes, movie_codes)), shape=(len(user_ids), len(movie_ids)))
+        matrix.sum_duplicates()
+        return cls(matrix.indptr, matrix.indices, matrix.data, user_ids, movie_ids)
+
+    def merge(self, other):
+        """Matrix of the ratings of both matrices, summing the ratings of a user and movie found in both"""
+        user_ids = np.union1d(self.user_ids, other.user_ids)
+        movie_ids = np.union1d(self.movie_ids, other.movie_ids)
+        matrix = self.reindexed(user_ids, movie_ids) + other.reindexed(user_ids, movie_ids)
+        return RatingsMatrix(matrix.indptr, matrix.indices, matrix.data, user_ids, movie_ids)
+
+    def reindexed(self, user_ids, movie_ids):
+        """scipy.sparse CSR matrix of the ratings with the rows and columns of sorted supersets of the user and movie ids"""
+        from scipy import sparse
+
+        # Both id arrays are sorted, so the rows keep their order and the movie columns stay sorted within each row
+        row_counts = np.zeros(len(user_ids), dtype=self.indptr.dtype)
+        row_counts[np.searchsorted(user_ids, self.user_ids)] = np.diff(self.indptr)
+        indptr = np.concatenate([[0], np.cumsum(row_counts)]).astype(self.indptr.dtype)
+        indices = np.searchsorted(movie_ids, self.movie_ids).astype(self.indices.dtype)[self.indices]
+        return sparse.csr_matrix((self.data, indices, indptr), shape=(len(user_ids), len(movie_ids)), copy=False)
+
+    def to_scipy(self):
+        """scipy.sparse CSR matrix sharing the arrays of the matrix"""
+        from scipy import sparse
+
+        return sparse.csr_matrix((self.data, self.indices, self.indptr), shape=self.shape, copy=False)
+
+    def movie_ratings_count(self):
+        return np.bincount(self.indices, minlength=len(self.movie_ids))
+
+
+def dense_top_n(similarities, block_positions, top_n):
+    """
+    Top N neighbours of the rows of a dense block of similarities, by a partial sort of every row.
+
+    Returns:
+    - neighbours (tuple): Block row, neighbour column, rank and similarity of each neighbour with a positive similarity.
+    """
+    # A movie is not its own neighbour
+    similarities[np.arange(len(block_positions)), block_positions] = 0
+    candidates = np.argpartition(-similarities, top_n - 1, axis=1)[:, :top_n]
+    candidate_similarities = np.take_along_axis(similarities, candidates, axis=1)
+    order = np.lexsort((candidates, -candidate_similarities), axis=1)
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_similarities = np.take_along_axis(candidate_similarities, order, axis=1)
+
+    similar = candidate_similarities > 0
+    rows = np.repeat(np.arange(len(block_positions)), similar.sum(axis=1))
+    ranks = np.tile(np.arange(1, top_n + 1), (len(block_positions), 1))[similar]
+    return rows, candidates[similar], ranks, candidate_similarities[similar]
+
+
+def sparse_top_n(similarities, block_positions, top_n):
+    """Top N neighbours of the rows of a sparse COO block of similarities, by one sort of its entries, see dense_top_n"""
+    keep = (similarities.data > 0) & (similarities.col != block_positions[similarities.row])
+    rows, columns, values = similarities.row[keep], similarities.col[keep], similarities.data[keep]
+    order = np.lexsort((columns, -values, rows))
+    rows, columns, values = rows[order], columns[order], values[order]
+
+    row_starts = np.searchsorted(rows, np.arange(len(block_positions)))
+    ranks = np.arange(len(rows)) - row_starts[rows] + 1
+    top = ranks <= top_n
+    return rows[top], columns[top], ranks[top], values[top]
+
+
+def top_similar_movies(matrix, top_n, min_ratings=1, block_memory_mb=256):
+    """
+    Top N cosine neighbours of every movie, from the columns of the user x movie ratings matrix.
+
+    The ratings of each movie are scaled to unit length and the movies are compared in blocks of rows of the movie x
+    movie similarity matrix, sized so a block takes about block_memory_mb. Every block is one sparse matrix product
+    followed by a vectorized top N selection per row, over the dense block or over the non zero entries of a block
+    with few of them, so the full similarity matrix is never held in memory.
+    Neighbours are ranked by similarity, then by the lowest movieid, and only movies sharing at least one user are
+    neighbours.
+
+    Args:
+    - matrix (RatingsMatrix): Ratings matrix.
+    - top_n (int): Neighbours per movie.
+    - min_ratings (int): Movies with fewer ratings are neither given neighbours nor neighbours of another movie.
+    - block_memory_mb (int): Memory budget of a block.
+
+    Returns:
+    - similar_movies (pandas.DataFrame): movieid, rank, similar_movieid and similarity, ordered by movieid and rank.
+    """
+    from scipy import sparse
+
+    ratings_matrix = matrix.to_scipy()
+    eligible = matrix.movie_ratings_count() >= min_ratings
+    norms = np.sqrt(np.asarray(ratings_matrix.multiply(ratings_matrix).sum(axis=0), dtype=np.float64).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=eligible & (norms > 0)).astype(np.float32)
+
+    # Unit length movie columns, also as a movie x user matrix whose row slices are the blocks
+    unit_matrix = (ratings_matrix @ sparse.diags(scale)).tocsr()
+    unit_matrix_t = unit_matrix.T.tocsr()
+
+    movies_count = len(matrix.movie_ids)
+    top_n = min(top_n, max(movies_count - 1, 0))
+    eligible_positions = np.flatnonzero(eligible)
+    block_rows = max(1, block_memory_mb * 1024**2 // (BLOCK_BYTES_PER_CELL * max(movies_count, 1)))
+
+    similar_blocks = []
+    for start in range(0, len(eligible_positions) if top_n else 0, block_rows):
+        block_positions = eligible_positions[start : start + block_rows]
+        similarities = unit_matrix_t[block_positions] @ unit_matrix
+        if similarities.nnz > SPARSE_BLOCK_DENSITY * similarities.shape[0] * similarities.shape[1]:
+            block_top = dense_top_n(similarities.toarray(), block_positions, top_n)
+        else:
+            block_top = sparse_top_n(similarities.tocoo(), block_positions, top_n)
+        rows, neighbour_positions, ranks, neighbour_similarities = block_top
+        similar_blocks.append(
+            pd.DataFrame(
+                {
+                    "movieid": matrix.movie_ids[block_positions[rows]],
+                    "rank": ranks,
+                    "similar_movieid": matrix.movie_ids[neighbour_positions],
+                    "similarity": np.minimum(neighbour_similarities, 1.0).astype(np.float64),
+                }
+            )
+        )
+
+    if not similar_blocks:
+        return pd.DataFrame({"movieid": matrix.movie_ids[:0], "rank": np.zeros(0, dtype=np.int64), "similar_movieid": matrix.movie_ids[:0], "similarity": np.zeros(0)})
+    return pd.concat(similar_blocks, ignore_index=True)
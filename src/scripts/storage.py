@@ -0,0 +1,319 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.scripts.exceptions import CustomErrors
+
+NPY_META_FILE = "_meta.json"
+NPY_PART_PREFIX = "part-"
+
+
+class CsvStorage:
+    """Text storage, one .csv file per dataset"""
+
+    format_name = "csv"
+
+    @staticmethod
+    def dataset_path(zone_path, file_name):
+        return f"{zone_path}/{file_name}.csv"
+
+    @staticmethod
+    def write(df, zone_path, file_name, float_format="%.2f"):
+        df.to_csv(CsvStorage.dataset_path(zone_path, file_name), index=False, float_format=float_format)
+
+    @staticmethod
+    def read(zone_path, file_name, columns=None):
+        return pd.read_csv(CsvStorage.dataset_path(zone_path, file_name), usecols=columns)
+
+    @staticmethod
+    def write_chunks(chunks, zone_path, file_name, float_format="%.2f"):
+        """Write DataFrame chunks to a temporary file that replaces the dataset once every chunk is written"""
+        dataset_path = CsvStorage.dataset_path(zone_path, file_name)
+        temp_path = f"{dataset_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8", newline="") as output_file:
+                for chunk_number, chunk in enumerate(chunks):
+                    chunk.to_csv(output_file, header=chunk_number == 0, index=False, float_format=float_format)
+            os.replace(temp_path, dataset_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def read_chunks(zone_path, file_name, columns=None, chunk_rows=None):
+        with pd.read_csv(CsvStorage.dataset_path(zone_path, file_name), usecols=columns, chunksize=chunk_rows) as reader:
+            yield from reader
+
+
+class ParquetStorage:
+    """Columnar storage, one .parquet file per dataset. Requires pyarrow"""
+
+    format_name = "parquet"
+
+    @staticmethod
+    def dataset_path(zone_path, file_name):
+        return f"{zone_path}/{file_name}.parquet"
+
+    @staticmethod
+    def write(df, zone_path, file_name, float_format=None):
+        df.to_parquet(ParquetStorage.dataset_path(zone_path, file_name), index=False)
+
+    @staticmethod
+    def read(zone_path, file_name, columns=None):
+        return pd.read_parquet(ParquetStorage.dataset_path(zone_path, file_name), columns=columns)
+
+    @staticmethod
+    def write_chunks(chunks, zone_path, file_name, float_format=None):
+        """Write DataFrame chunks as row groups of a temporary file that replaces the dataset once complete"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        dataset_path = ParquetStorage.dataset_path(zone_path, file_name)
+        temp_path = f"{dataset_path}.tmp"
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(temp_path, table.schema)
+                writer.write_table(table)
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(temp_path, dataset_path)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def read_chunks(zone_path, file_name, columns=None, chunk_rows=None):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(ParquetStorage.dataset_path(zone_path, file_name))
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows or 65536, columns=columns):
+            yield batch.to_pandas()
+
+
+class FeatherStorage:
+    """Columnar storage, one .feather file per dataset. Requires pyarrow"""
+
+    format_name = "feather"
+
+    @staticmethod
+    def dataset_path(zone_path, file_name):
+        return f"{zone_path}/{file_name}.feather"
+
+    @staticmethod
+    def write(df, zone_path, file_name, float_format=None):
+        df.reset_index(drop=True).to_feather(FeatherStorage.dataset_path(zone_path, file_name))
+
+    @staticmethod
+    def read(zone_path, file_name, columns=None):
+        return pd.read_feather(FeatherStorage.dataset_path(zone_path, file_name), columns=columns)
+
+    @staticmethod
+    def write_chunks(chunks, zone_path, file_name, float_format=None):
+        raise CustomErrors.StorageFormatError("The feather format does not support chunked writes, use npy, parquet or csv")
+
+    @staticmethod
+    def read_chunks(zone_path, file_name, columns=None, chunk_rows=None):
+        raise CustomErrors.StorageFormatError("The feather format does not support chunked reads, use npy, parquet or csv")
+
+
+class NpyStorage:
+    """
+    Columnar storage with one NumPy .npy file per column, readable through memory mapping.
+
+    Layout of a dataset directory:
+    - _meta.json: column order, the pandas dtype and storage kind of each column, and the list of parts.
+    - part-00000/<column>.npy: column values of a part. Numeric and datetime columns are stored as is, string
+      columns as fixed width unicode with an optional <column>.nulls.npy mask, and categorical columns as
+      <column>.npy codes plus <column>.categories.npy.
+    """
+
+    format_name = "npy"
+
+    @staticmethod
+    def dataset_path(zone_path, file_name):
+        return f"{zone_path}/{file_name}"
+
+    @staticmethod
+    def _column_kind(series):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return "category"
+        if pd.api.types.is_string_dtype(series.dtype) or series.dtype == object:
+            return "string"
+        return "numeric"
+
+    @staticmethod
+    def _save_strings(file_path, series):
+        nulls = series.isna().to_numpy(dtype=bool)
+        values = np.asarray(series.astype(object).where(~nulls, "").to_numpy(), dtype=str)
+        np.save(f"{file_path}.npy", values)
+        if nulls.any():
+            np.save(f"{file_path}.nulls.npy", nulls)
+
+    @staticmethod
+    def _load_strings(file_path, mmap_mode):
+        values = np.load(f"{file_path}.npy", mmap_mode=mmap_mode).astype(object)
+        if os.path.exists(f"{file_path}.nulls.npy"):
+            values[np.load(f"{file_path}.nulls.npy")] = None
+        return values
+
+    @staticmethod
+    def write_part(df, dataset_path, part_name):
+        """Write the columns of a DataFrame as one part of a dataset directory"""
+        part_path = f"{dataset_path}/{part_name}"
+        os.makedirs(part_path, exist_ok=True)
+
+        for column in df.columns:
+            series = df[column]
+            kind = NpyStorage._column_kind(series)
+            file_path = f"{part_path}/{column}"
+
+            if kind == "category":
+                np.save(f"{file_path}.npy", series.cat.codes.to_numpy())
+                NpyStorage._save_strings(f"{file_path}.categories", series.cat.categories.to_series())
+            elif kind == "string":
+                NpyStorage._save_strings(file_path, series)
+            else:
+                np.save(f"{file_path}.npy", series.to_numpy())
+
+    @staticmethod
+    def _column_meta(series):
+        column_meta = {"name": series.name, "kind": NpyStorage._column_kind(series), "dtype": str(series.dtype)}
+        if column_meta["kind"] == "category":
+            column_meta["ordered"] = bool(series.cat.ordered)
+        return column_meta
+
+    @staticmethod
+    def write_meta(df, dataset_path, parts):
+        meta = {"columns": [NpyStorage._column_meta(df[column]) for column in df.columns], "parts": parts}
+        with open(f"{dataset_path}/{NPY_META_FILE}", "w") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+    @staticmethod
+    def write(df, zone_path, file_name, float_format=None):
+        dataset_path = NpyStorage.dataset_path(zone_path, file_name)
+        shutil.rmtree(dataset_path, ignore_errors=True)
+        os.makedirs(dataset_path)
+
+        part_name = f"{NPY_PART_PREFIX}00000"
+        NpyStorage.write_part(df, dataset_path, part_name)
+        NpyStorage.write_meta(df, dataset_path, [part_name])
+
+    @staticmethod
+    def read_meta(zone_path, file_name):
+        with open(f"{NpyStorage.dataset_path(zone_path, file_name)}/{NPY_META_FILE}", "r") as meta_file:
+            return json.load(meta_file)
+
+    @staticmethod
+    def _load_column(file_path, column_meta, mmap_mode, rows=slice(None)):
+        """Values of one column file, restricted to a slice of rows"""
+        if column_meta["kind"] == "category":
+            categories = NpyStorage._load_strings(f"{file_path}.categories", mmap_mode)
+            codes = np.asarray(np.load(f"{file_path}.npy", mmap_mode=mmap_mode)[rows])
+            return pd.Categorical.from_codes(codes, categories=categories, ordered=column_meta["ordered"])
+
+        if column_meta["kind"] == "string":
+            values = np.load(f"{file_path}.npy", mmap_mode=mmap_mode)[rows].astype(object)
+            if os.path.exists(f"{file_path}.nulls.npy"):
+                values[np.load(f"{file_path}.nulls.npy", mmap_mode=mmap_mode)[rows]] = None
+            return pd.array(values, dtype=column_meta["dtype"])
+
+        return np.load(f"{file_path}.npy", mmap_mode=mmap_mode)[rows]
+
+    @staticmethod
+    def _concat_column(values, column_meta):
+        if len(values) == 1:
+            return values[0]
+        if column_meta["kind"] == "category":
+            return pd.api.types.union_categoricals(values)
+        if column_meta["kind"] == "string":
+            return pd.array(np.concatenate([np.asarray(part_values, dtype=object) for part_values in values]), dtype=column_meta["dtype"])
+        return np.concatenate(values)
+
+    @staticmethod
+    def part_rows(dataset_path, part_name, meta):
+        """Number of rows of a part, read from the header of its first column file"""
+        first_column = meta["columns"][0]["name"]
+        return np.load(f"{dataset_path}/{part_name}/{first_column}.npy", mmap_mode="r").shape[0]
+
+    @staticmethod
+    def read_part(dataset_path, part_name, meta_columns, mmap_mode="r", rows=slice(None)):
+        """Read the requested columns of a slice of rows of one part, without any text parsing"""
+        data = {column_meta["name"]: NpyStorage._load_column(f"{dataset_path}/{part_name}/{column_meta['name']}", column_meta, mmap_mode, rows) for column_meta in meta_columns}
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def read(zone_path, file_name, columns=None, mmap_mode="r"):
+        meta = NpyStorage.read_meta(zone_path, file_name)
+        meta_columns = [col for col in meta["columns"] if columns is None or col["name"] in columns]
+        dataset_path = NpyStorage.dataset_path(zone_path, file_name)
+
+        data = {}
+        for column_meta in meta_columns:
+            values = [NpyStorage._load_column(f"{dataset_path}/{part_name}/{column_meta['name']}", column_meta, mmap_mode) for part_name in meta["parts"]]
+            data[column_meta["name"]] = NpyStorage._concat_column(values, column_meta)
+        return pd.DataFrame(data)
+
+    @staticmethod
+    def write_chunks(chunks, zone_path, file_name, float_format=None):
+        """Write each DataFrame chunk as a part of a temporary dataset directory that replaces the dataset once complete"""
+        dataset_path = NpyStorage.dataset_path(zone_path, file_name)
+        temp_path = f"{dataset_path}.tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+
+        try:
+            parts = []
+            first_chunk = None
+            for chunk in chunks:
+                part_name = f"{NPY_PART_PREFIX}{len(parts):05d}"
+                NpyStorage.write_part(chunk, temp_path, part_name)
+                parts.append(part_name)
+                if first_chunk is None:
+                    first_chunk = chunk.iloc[:0]
+
+            if first_chunk is None:
+                raise ValueError(f"No chunks to write for dataset: {file_name}")
+
+            NpyStorage.write_meta(first_chunk, temp_path, parts)
+            shutil.rmtree(dataset_path, ignore_errors=True)
+            os.replace(temp_path, dataset_path)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    @staticmethod
+    def read_chunks(zone_path, file_name, columns=None, chunk_rows=None, mmap_mode="r"):
+        """Read the dataset as DataFrames of at most chunk_rows rows, slicing the memory mapped parts"""
+        meta = NpyStorage.read_meta(zone_path, file_name)
+        meta_columns = [col for col in meta["columns"] if columns is None or col["name"] in columns]
+        dataset_path = NpyStorage.dataset_path(zone_path, file_name)
+
+        for part_name in meta["parts"]:
+            part_rows = NpyStorage.part_rows(dataset_path, part_name, meta)
+            step = chunk_rows or max(part_rows, 1)
+            for start in range(0, part_rows, step):
+                yield NpyStorage.read_part(dataset_path, part_name, meta_columns, mmap_mode, slice(start, start + step))
+
+
+STORAGE_FORMATS = {storage.format_name: storage for storage in [CsvStorage, ParquetStorage, FeatherStorage, NpyStorage]}
+
+
+def get_storage(format_name):
+    """
+    Get the storage class for a configured format.
+
+    Raises:
+    - CustomErrors.StorageFormatError: If the format is not one of STORAGE_FORMATS.
+    """
+    try:
+        return STORAGE_FORMATS[format_name]
+    except KeyError:
+        raise CustomErrors.StorageFormatError(f"Unknown storage format: {format_name}, expected one of {sorted(STORAGE_FORMATS)}")
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+RANK_KEY_BITS = 62
+MAX_BUCKET_BITS = 8
+
+
+def _rank_components(values, ascending, dense):
+    """Non negative integers of a column that are larger for the rows ranked first, and their bit width"""
+    if dense:
+        _, values = np.unique(values, return_inverse=True)
+    low, high = values.min(), values.max()
+    component = (high - values) if ascending else (values - low)
+    return component.astype(np.int64), int(high - low).bit_length()
+
+
+def rank_key(df, order_by):
+    """
+    Pack the ranking columns of each row into one int64 key, larger for the rows ranked first.
+
+    Each column is shifted to start at zero and packed into as many bits as its value range needs. When the
+    ranges do not fit in RANK_KEY_BITS, the columns are replaced by their dense ranks before packing.
+
+    Args:
+    - df (pandas.DataFrame): Rows to rank.
+    - order_by (list): (column, ascending) pairs, most significant first.
+
+    Returns:
+    - key (numpy.ndarray): int64 key of each row.
+    - key_bits (int): Number of bits used by the keys.
+    """
+    columns = [(df[column].to_numpy().view(np.int64) if pd.api.types.is_datetime64_dtype(df[column].dtype) else df[column].to_numpy(dtype=np.int64), ascending) for column, ascending in order_by]
+
+    for dense in (False, True):
+        key = np.zeros(len(df), dtype=np.int64)
+        key_bits = 0
+        for values, ascending in reversed(columns):
+            component, bits = _rank_components(values, ascending, dense)
+            key |= component << key_bits
+            key_bits += bits
+        if key_bits <= RANK_KEY_BITS:
+            return key, key_bits
+
+    raise ValueError(f"Ranking columns {[column for column, _ in order_by]} do not fit in a {RANK_KEY_BITS} bit key")
+
+
+def group_codes(group_values):
+    """Integer code of each row's group, ordered like the group values, and the number of codes"""
+    if pd.api.types.is_integer_dtype(group_values.dtype):
+        values = group_values.to_numpy(dtype=np.int64)
+        low, high = values.min(), values.max()
+        # Small integer keys such as userid and movieid are used as codes directly, without hashing
+        if high - low < 2 * len(values):
+            return values - low, int(high - low) + 1
+
+    codes, groups = pd.factorize(group_values, sort=True)
+    return codes, len(groups)
+
+
+def stable_group_order(codes, n_groups):
+    """Stable argsort of non negative group codes, as LSD radix passes over 16 bit digits which NumPy radix sorts"""
+    order = np.arange(len(codes))
+    shift = 0
+    while True:
+        digits = ((codes[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digits, kind="stable")]
+        shift += 16
+        if (n_groups - 1) >> shift == 0:
+            return order
+
+
+def top_k_per_group(df, group_column, k, order_by):
+    """
+    Select the k highest ranked rows of every group, with a radix select instead of a sort of all rows.
+
+    The leading bits of the rank key are histogrammed per group in a single pass. For each group only the
+    buckets holding its top k rows are kept, and just those candidate rows are sorted to pick the final k.
+    Rows with equal rank keys have no defined order among them.
+
+    Args:
+    - df (pandas.DataFrame): Rows to select from.
+    - group_column (str): Column identifying the groups.
+    - k (int): Number of rows to keep per group.
+    - order_by (list): (column, ascending) pairs ranking the rows of a group, most significant first. Include
+      enough columns to break every tie for a deterministic result.
+
+    Returns:
+    - top_k_df (pandas.DataFrame): Selected rows, ordered by group and then by rank.
+    """
+    if df.empty or k <= 0:
+        return df.iloc[:0]
+
+    codes, n_groups = group_codes(df[group_column])
+    key, key_bits = rank_key(df, order_by)
+
+    # Keep as many leading key bits as the histogram can hold within the size of the data
+    bucket_bits = int(min(key_bits, MAX_BUCKET_BITS, max(np.log2(max(len(df) // n_groups, 1)), 1)))
+    buckets = key >> (key_bits - bucket_bits)
+    histogram = np.bincount((codes << bucket_bits) + buckets, minlength=n_groups << bucket_bits).reshape(n_groups, 1 << bucket_bits)
+
+    # Highest bucket of each group with at least k rows at or above it, every row below it is outside the top k
+    rows_at_or_above = np.cumsum(histogram[:, ::-1], axis=1)[:, ::-1]
+    cutoff_bucket = np.maximum((rows_at_or_above >= k).sum(axis=1) - 1, 0)
+    candidates = np.flatnonzero(buckets >= cutoff_bucket[codes])
+
+    # Order the candidates by rank, then group them with a stable sort that keeps the rank order within each group
+    candidates = candidates[np.argsort(-key[candidates])]
+    candidates = candidates[stable_group_order(codes[candidates], n_groups)]
+    candidate_codes = codes[candidates]
+    group_starts = np.flatnonzero(np.r_[True, candidate_codes[1:] != candidate_codes[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(candidates)])
+    rank_in_group = np.arange(len(candidates)) - np.repeat(group_starts, group_sizes)
+
+    return df.iloc[candidates[rank_in_group < k]]
@@ -5,11 +5,13 @@ import sys
 try:
     from src.scripts.load_tools import gen_dataframe
     from src.app import movie_lens_analysis_pipeline
+    from src.scripts.csv_writer import verify_checksum
     from noxfile import delete_folders
 except ModuleNotFoundError:
     sys.path.append(".")
     from src.scripts.load_tools import gen_dataframe
     from src.app import movie_lens_analysis_pipeline
+    from src.scripts.csv_writer import verify_checksum
     from noxfile import delete_folders
 
 
@@ -30,11 +32,18 @@ def run_movie_lens_analysis_pipeline():
     os.chdir('src')
     folder = 'data/03_data_product'
 
+    # Data products read by the tests, the pipeline also writes others to the folder
+    required_files = ["movies_with_ratings_stats.csv", "top_movies_per_user.csv"]
+
     try:
         files_in_folder = os.listdir(folder)
-        if len(files_in_folder) != 2:
+        if not set(required_files).issubset(files_in_folder):
             print("DP Files missing, commencing movie_lens_analysis_pipeline")
             movie_lens_analysis_pipeline('config.ini')
+        elif not all(verify_checksum(f"{folder}/{file_name}") for file_name in required_files):
+            # A file without a matching checksum file was not completely written
+            print("DP Files incomplete, commencing movie_lens_analysis_pipeline")
+            movie_lens_analysis_pipeline('config.ini')
     except FileNotFoundError:
         print("DP Folder missing, commencing movie_lens_analysis_pipeline")
         movie_lens_analysis_pipeline('config.ini')
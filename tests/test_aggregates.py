@@ -0,0 +1,84 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.scripts.aggregates import STATE_BATCHES_FILE, RatingsAggregateState, RatingsRollupCube, bucket_labels, time_buckets
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.aggregates import STATE_BATCHES_FILE, RatingsAggregateState, RatingsRollupCube, bucket_labels, time_buckets
+
+
+def test_folded_batches_match_full_recompute(tmp_path):
+    """Test if folding ratings batches into a saved state gives the stats of a full groupby"""
+    rng = np.random.default_rng(7)
+    ratings_df = pd.DataFrame({"movieid": rng.integers(1, 50, 3000), "ratings": rng.integers(1, 6, 3000)})
+    base_df, batch_df = ratings_df.iloc[:2000], ratings_df.iloc[2000:]
+
+    RatingsAggregateState.from_ratings(base_df).save(str(tmp_path), "movie_ratings_state")
+    ratings_state = RatingsAggregateState.load(str(tmp_path), "movie_ratings_state")
+    ratings_state = ratings_state.merge(RatingsAggregateState.from_ratings(batch_df, batches=["ratings_batch.dat"]))
+
+    expected_stats = ratings_df.groupby("movieid")["ratings"].agg(["max", "min", "mean"]).reset_index()
+    expected_stats.columns = ["movieid", "max_rating", "min_rating", "avg_rating"]
+
+    assert ratings_state.batches == ["ratings_batch.dat"]
+    assert ratings_state.matches(RatingsAggregateState.from_ratings(ratings_df))
+    pd.testing.assert_frame_equal(ratings_state.to_stats(), expected_stats)
+
+
+def test_state_keeps_its_source_fingerprint(tmp_path):
+    """Test if a saved state keeps the fingerprint of the curated ratings it was bootstrapped from through folds"""
+    ratings_df = pd.DataFrame({"movieid": [1, 2, 1], "ratings": [5, 3, 4]})
+    ratings_state = RatingsAggregateState.from_ratings(ratings_df.iloc[:2])
+    ratings_state.source_fingerprint = "curated-ratings-digest"
+    ratings_state.merge(RatingsAggregateState.from_ratings(ratings_df.iloc[2:], batches=["ratings_batch.dat"])).save(str(tmp_path), "movie_ratings_state")
+
+    ratings_state = RatingsAggregateState.load(str(tmp_path), "movie_ratings_state")
+    assert (ratings_state.batches, ratings_state.source_fingerprint) == (["ratings_batch.dat"], "curated-ratings-digest")
+
+    # A state saved with the batches only has no fingerprint, so it never matches the curated ratings
+    with open(tmp_path / "movie_ratings_state" / STATE_BATCHES_FILE, "w") as batches_file:
+        json.dump(["ratings_batch.dat"], batches_file)
+    ratings_state = RatingsAggregateState.load(str(tmp_path), "movie_ratings_state")
+    assert (ratings_state.batches, ratings_state.source_fingerprint) == (["ratings_batch.dat"], None)
+
+
+def rollup_ratings(rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"movieid": rng.integers(1, 30, rows), "ratings": rng.integers(1, 6, rows), "timestamp": rng.integers(956_000_000, 1_046_000_000, rows).astype(np.uint32)})
+
+
+def test_rollup_window_stats_match_a_rescan():
+    """Test if the windowed statistics of the rollup cube, merged from chunks, match a filter and groupby of the ratings"""
+    ratings_df = rollup_ratings(5000, 11)
+    rollup_cube = RatingsRollupCube.from_ratings(ratings_df.iloc[:2000]).merge(RatingsRollupCube.from_ratings(ratings_df.iloc[2000:]))
+    assert rollup_cube.matches(RatingsRollupCube.from_ratings(ratings_df))
+
+    days = time_buckets(ratings_df["timestamp"].to_numpy())
+    last_day = int(days.max())
+    movieids = np.array([7, 3, 99, 1])
+    for window_days in [1, 30, 365, 2000]:
+        window_stats = rollup_cube.window_stats(last_day - window_days + 1, last_day, movieids).set_index("movieid")
+        expected = ratings_df[days > last_day - window_days].groupby("movieid")["ratings"].agg(["count", "mean", "min", "max"]).reindex(movieids)
+        assert window_stats["ratings_count"].tolist() == expected["count"].fillna(0).astype(int).tolist()
+        for column, expected_column in [("avg_rating", "mean"), ("min_rating", "min"), ("max_rating", "max")]:
+            assert np.allclose(window_stats[column], expected[expected_column], equal_nan=True)
+
+
+def test_rollup_cube_months_and_persistence(tmp_path):
+    """Test if a saved and folded cube keeps its batches, and its months match a groupby of the ratings per month"""
+    ratings_df = rollup_ratings(3000, 13)
+    RatingsRollupCube.from_ratings(ratings_df.iloc[:2500]).save(str(tmp_path), "movie_ratings_rollup")
+    rollup_cube = RatingsRollupCube.load(str(tmp_path), "movie_ratings_rollup").merge(RatingsRollupCube.from_ratings(ratings_df.iloc[2500:], batches=["ratings_batch.dat"]))
+    rollup_cube.save(str(tmp_path), "movie_ratings_rollup")
+    rollup_cube = RatingsRollupCube.load(str(tmp_path), "movie_ratings_rollup")
+    assert rollup_cube.batches == ["ratings_batch.dat"] and rollup_cube.matches(RatingsRollupCube.from_ratings(ratings_df))
+
+    monthly_cells = rollup_cube.to_buckets("month").cells
+    months = pd.to_datetime(ratings_df["timestamp"], unit="s").dt.strftime("%Y-%m")
+    expected = ratings_df.groupby(["movieid", months])["ratings"].agg(["count", "sum", "min", "max"]).reset_index()
+    assert bucket_labels(monthly_cells["month"], "month").tolist() == expected["timestamp"].tolist()
+    assert monthly_cells[["count", "sum", "min", "max"]].values.tolist() == expected[["count", "sum", "min", "max"]].values.tolist()
@@ -0,0 +1,63 @@
+import configparser
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.scripts.aggregation import RATINGS_DATA_PRODUCTS, RatingsAggregationPlan, UserMovieRatings
+    from src.scripts.dtypes import apply_schema_dtypes
+    from src.scripts.schema import load_file_schema
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.aggregation import RATINGS_DATA_PRODUCTS, RatingsAggregationPlan, UserMovieRatings
+    from src.scripts.dtypes import apply_schema_dtypes
+    from src.scripts.schema import load_file_schema
+
+
+def ratings_plan():
+    config = configparser.ConfigParser()
+    config.read_dict({product_class: {"top_k": "2"} for product_class in RATINGS_DATA_PRODUCTS})
+    return RatingsAggregationPlan({product_class: product(config[product_class]) for product_class, product in RATINGS_DATA_PRODUCTS.items()})
+
+
+def test_plan_shares_aggregates_across_chunks():
+    """Test if the products sharing an aggregate scan it once, and a scan in chunks or partitions gives the same results as a single scan"""
+    rng = np.random.default_rng(5)
+    ratings_df = pd.DataFrame({"userid": rng.integers(1, 50, 3000), "movieid": rng.integers(1, 200, 3000), "ratings": rng.integers(1, 6, 3000), "timestamp": rng.permutation(3000)})
+    plan = ratings_plan()
+    assert sorted(plan.aggregates) == [("rollup", "day"), ("stats", "movieid"), ("stats", "userid"), ("top_k", "userid", 2, (("ratings", False), ("timestamp", False), ("movieid", True))), ("user_movie_ratings",)]
+    assert plan.scan_columns(["userid", "movieid", "ratings", "timestamp", "extra"]) == ["userid", "movieid", "ratings", "timestamp"]
+
+    single_scan = plan.scan([ratings_df])
+    chunked_scan = plan.merge([plan.scan([ratings_df.iloc[:1000], ratings_df.iloc[1000:2000]]), plan.scan([ratings_df.iloc[2000:]])])
+    for key, result in single_scan.items():
+        if key[0] in ["stats", "rollup"]:
+            assert result.matches(chunked_scan[key])
+        elif key[0] == "user_movie_ratings":
+            assert np.array_equal(result.user_ids, chunked_scan[key].user_ids) and np.array_equal(result.movie_ids, chunked_scan[key].movie_ids)
+            assert (result.to_scipy() != chunked_scan[key].to_scipy()).nnz == 0
+        else:
+            pd.testing.assert_frame_equal(result.reset_index(drop=True), chunked_scan[key].reset_index(drop=True))
+
+
+def test_genre_and_demographic_rollups():
+    """Test if a rating counts for every genre of its movie and the demographic rollups match a direct groupby of the ratings"""
+    movies_df = apply_schema_dtypes(pd.DataFrame({"movieid": [1, 2, 3], "titles": ["A", "B", "C"], "genres": ["Comedy|Drama", "Drama", "Horror"]}), load_file_schema("schema/movies.yml"))
+    users_df = pd.DataFrame({"userid": [1, 2, 3], "gender": ["F", "M", "M"], "age": [18, 25, 25], "occupation": [1, 2, 1], "zipcode": ["1", "2", "3"]})
+    ratings_df = pd.DataFrame({"userid": [1, 1, 2, 3, 3], "movieid": [1, 2, 1, 2, 3], "ratings": [5, 3, 4, 1, 2], "timestamp": [1, 2, 3, 4, 5]})
+    plan = ratings_plan()
+    data_products = plan.build(plan.scan([ratings_df]), {"movies": movies_df, "users": users_df}, {"movies": load_file_schema("schema/movies.yml"), "users": load_file_schema("schema/users.yml")})
+
+    genre_stats = data_products["GenreRatingStats"].set_index("genre")
+    assert genre_stats.loc["Drama"].tolist() == [2, 4, 13 / 4, 1, 5]
+    assert genre_stats.loc["Comedy", "ratings_count"] == 2 and genre_stats.loc["Western", "ratings_count"] == 0
+
+    demographic_stats = data_products["DemographicRatingStats"]
+    rated_users = ratings_df.merge(users_df, on="userid")
+    for column in ["gender", "age", "occupation"]:
+        expected = rated_users.groupby(rated_users[column].astype(str))["ratings"].agg(["count", "mean"])
+        column_stats = demographic_stats[demographic_stats["demographic"] == column].set_index("value")
+        assert column_stats["ratings_count"].tolist() == expected["count"].tolist() and np.allclose(column_stats["avg_rating"], expected["mean"])
+    assert data_products["TopMoviesPerUser"].groupby("userid").size().max() == 2
+    assert data_products["SimilarMovies"].query("movieid == 2")[["similar_movieid", "similar_titles"]].values.tolist() == [[1, "A"], [3, "C"]]
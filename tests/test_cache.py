@@ -0,0 +1,27 @@
+import sys
+
+import pandas as pd
+
+try:
+    from src.scripts.cache import DatasetCache
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.cache import DatasetCache
+
+
+def test_dataset_cache_lru_eviction():
+    """Test if the least recently used dataset is evicted once the memory budget is exceeded"""
+    df = pd.DataFrame({"userid": range(1000), "ratings": range(1000)})
+    df_size = int(df.memory_usage(index=True, deep=True).sum())
+    cache = DatasetCache(memory_budget_bytes=2 * df_size)
+
+    cache.put("curated", "movies", df)
+    cache.put("curated", "ratings", df)
+    assert cache.get("curated", "movies") is df
+    cache.put("curated", "users", df)
+
+    assert cache.get("curated", "ratings") is None
+    assert cache.get("curated", "movies", columns=["ratings"]).columns.tolist() == ["ratings"]
+    assert cache.stats()["evictions"] == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.used_bytes == 2 * df_size
@@ -0,0 +1,42 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+try:
+    from src.cli import select_stages
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.cli import select_stages
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXECUTION_ORDER = ["staging_to_raw", "verify_dq_load_curated_movies", "verify_dq_load_curated_ratings", "verify_dq_load_dp_ratings", "build_lookup_indexes"]
+
+
+def test_select_stages():
+    """Test if stages are selected by name or by range in execution order, and if unknown stages and empty ranges are refused"""
+    assert select_stages(EXECUTION_ORDER) == EXECUTION_ORDER
+    assert select_stages(EXECUTION_ORDER, stages=["build_lookup_indexes", "staging_to_raw"]) == ["staging_to_raw", "build_lookup_indexes"]
+    assert select_stages(EXECUTION_ORDER, from_stage="verify_dq_load_curated_ratings", to_stage="verify_dq_load_dp_ratings") == EXECUTION_ORDER[2:4]
+    assert select_stages(EXECUTION_ORDER, to_stage="verify_dq_load_curated_movies") == EXECUTION_ORDER[:2]
+
+    with pytest.raises(ValueError):
+        select_stages(EXECUTION_ORDER, stages=["verify_dq_load_dp_top_user_ratings"])
+    with pytest.raises(ValueError):
+        select_stages(EXECUTION_ORDER, from_stage="build_lookup_indexes", to_stage="staging_to_raw")
+
+
+def test_cached_stage_graph_skips_pipeline_import(tmp_path):
+    """Test if listing and dry runs reuse the cached stage graph without importing pandas and the pipeline"""
+    config_path = str(tmp_path / "config.ini")
+    shutil.copy(os.path.join(REPO_PATH, "src", "config.ini"), config_path)
+    subprocess.run([sys.executable, "-m", "src.cli", "--config", config_path, "--list"], cwd=REPO_PATH, check=True, capture_output=True)
+    assert (tmp_path / "data" / "stage_graph.json").exists()
+
+    check_imports = f"import sys; from src.cli import main; main(['--config', {config_path!r}, '--list']); main(['--config', {config_path!r}, '--stage', 'build_lookup_indexes', '--dry-run']); print('pandas' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", check_imports], cwd=REPO_PATH, check=True, capture_output=True, text=True).stdout.splitlines()
+    assert output[0] == "staging_to_raw: depends on nothing"
+    assert output[-2].startswith("Stage: build_lookup_indexes, would fail, missing inputs")
+    assert output[-1] == "False"
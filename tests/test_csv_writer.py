@@ -0,0 +1,45 @@
+import sys
+
+import pandas as pd
+import pytest
+
+try:
+    from src.scripts.csv_writer import AtomicCsvStorage, verify_checksum
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.csv_writer import AtomicCsvStorage, verify_checksum
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_parallel_write_matches_to_csv(tmp_path, compression):
+    """Test if chunks formatted by the workers give the bytes of to_csv, compressed or not, with a matching checksum file"""
+    df = pd.DataFrame({"userid": range(25), "titles": [f"Movie {number}, (1999)" for number in range(25)], "avg_rating": [number / 3 for number in range(25)]})
+    storage = AtomicCsvStorage(workers=2, chunk_rows=4, compression=compression)
+    storage.write_chunks([df.iloc[:10], df.iloc[10:]], str(tmp_path), "movies")
+
+    dataset_path = storage.dataset_path(str(tmp_path), "movies")
+    assert dataset_path.endswith(".csv.gz" if compression == "gzip" else ".csv")
+    df.to_csv(tmp_path / "expected.csv", index=False, float_format="%.2f")
+    assert pd.read_csv(dataset_path, compression="infer").equals(pd.read_csv(tmp_path / "expected.csv"))
+    if compression == "none":
+        assert (tmp_path / "movies.csv").read_bytes() == (tmp_path / "expected.csv").read_bytes()
+    assert verify_checksum(dataset_path)
+
+
+def test_failed_write_keeps_previous_dataset(tmp_path):
+    """Test if a write failing midway leaves the previous dataset and its checksum in place, and if a modified file fails verification"""
+    storage = AtomicCsvStorage(workers=1, chunk_rows=2)
+    storage.write(pd.DataFrame({"movieid": [1, 2, 3]}), str(tmp_path), "movies")
+
+    def failing_chunks():
+        yield pd.DataFrame({"movieid": [4, 5, 6]})
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        storage.write_chunks(failing_chunks(), str(tmp_path), "movies")
+    assert storage.read(str(tmp_path), "movies")["movieid"].tolist() == [1, 2, 3]
+    assert verify_checksum(f"{tmp_path}/movies.csv") and sorted(path.name for path in tmp_path.iterdir()) == ["movies.csv", "movies.csv.sha256"]
+
+    with open(f"{tmp_path}/movies.csv", "a") as dataset_file:
+        dataset_file.write("4\n")
+    assert not verify_checksum(f"{tmp_path}/movies.csv")
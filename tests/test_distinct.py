@@ -0,0 +1,31 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.scripts.distinct import HyperLogLog, IntegerHashSet, column_keys
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.distinct import HyperLogLog, IntegerHashSet, column_keys
+
+
+def test_integer_hash_set_flags_repeated_keys():
+    """Test if keys repeated within or across batches are flagged like pandas duplicated, for bitmap, hash table and hashed string keys"""
+    rng = np.random.default_rng(1)
+    for keys in [rng.integers(0, 5000, 20000), rng.integers(-(2**62), 2**62, 20000) // 1000 * 1000, column_keys(pd.Series(rng.integers(0, 3000, 20000).astype(str)))]:
+        keys = np.asarray(keys).view(np.uint64) if keys.dtype == np.int64 else keys
+        distinct_keys = IntegerHashSet()
+        seen = np.concatenate([distinct_keys.add(keys[start : start + 3000]) for start in range(0, len(keys), 3000)])
+        assert np.array_equal(seen, pd.Series(keys).duplicated().to_numpy())
+        assert len(distinct_keys) == len(np.unique(keys))
+
+
+def test_hyperloglog_estimate_within_its_error():
+    """Test if the HyperLogLog estimate stays within four standard errors of the distinct keys for small and large cardinalities"""
+    for distinct_count in [10, 1000, 200000]:
+        sketch = HyperLogLog()
+        keys = np.arange(distinct_count, dtype=np.uint64)
+        sketch.add(keys)
+        sketch.add(keys[: distinct_count // 2])
+        assert abs(sketch.estimate() - distinct_count) <= max(4 * sketch.relative_error * distinct_count, 1)
@@ -0,0 +1,94 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    from src.scripts.dqt import ChunkValidator, UserDataValidator, compile_dqt_rules, evaluate_rules, validate_dataset
+    from src.scripts.load_tools import gen_dataframe
+    from src.scripts.schema import load_file_schema
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.dqt import ChunkValidator, UserDataValidator, compile_dqt_rules, evaluate_rules, validate_dataset
+    from src.scripts.load_tools import gen_dataframe
+    from src.scripts.schema import load_file_schema
+
+
+def test_users_rules_pass_on_raw_file():
+    """Test if the raw users dataset passes the schema declared DQTs"""
+    file_schema_path = "schema/users.yml"
+    df = gen_dataframe("data/01_raw/users.dat", file_schema_path)
+    dqt_result = validate_dataset(validator_name="UserDataValidator", df=df, file_schema_path=file_schema_path)
+
+    assert dqt_result and all(dqt_result.values())
+
+
+def test_rules_match_validator_classes():
+    """Test if the vectorized rules flag the same rows as the validator class methods"""
+    df = pd.DataFrame(
+        {
+            "userid": [1, 6040, 0, 6041, 20, 3],
+            "gender": ["M", "F", "X", None, "m", "F"],
+            "age": ["1", "56", "17", "abc", 18.0, 25],
+            "occupation": [0, 20, 21, -1, 5, 7],
+            "zipcode": ["1"] * 6,
+        }
+    )
+    violations = evaluate_rules(df, compile_dqt_rules("schema/users.yml"))
+
+    for column in ["userid", "gender", "age", "occupation"]:
+        legacy_invalid_rows = df.index[~df[column].apply(getattr(UserDataValidator, f"validate_{column}"))].tolist()
+        assert violations[column]["violations"] == len(legacy_invalid_rows)
+        assert violations[column]["sample_rows"] == legacy_invalid_rows
+
+
+def test_chunk_validator_detects_duplicates_across_chunks():
+    """Test if a userid repeated in two chunks fails the unique check of the chunked DQTs"""
+    df = gen_dataframe("data/01_raw/users.dat", "schema/users.yml")
+    chunk_validator = ChunkValidator("UserDataValidator", "schema/users.yml")
+    chunk_validator.validate(df.iloc[:100])
+    chunk_validator.validate(df.iloc[100:200])
+    assert all(chunk_validator.results.values())
+
+    chunk_validator.validate(df.iloc[150:250])
+    assert chunk_validator.results["userid"] is False
+    assert chunk_validator.results["gender"] is True
+
+
+def test_chunk_validator_reports_rows_and_fails_fast():
+    """Test if the rows breaking each rule are reported by row number in the dataset, and fail_fast skips the checks left in a failing chunk"""
+    ratings_df = pd.DataFrame({"userid": [1, 2, 3, 4, 5, 6], "movieid": [1, 2, 3, 5000, 4, 6000], "ratings": [5, 4, 9, 3, 2, 1], "timestamp": [1] * 6})
+    chunk_validator = ChunkValidator("RatingDataValidator", "schema/ratings.yml")
+    assert chunk_validator.validate(ratings_df.iloc[:2]) and not chunk_validator.validate(ratings_df.iloc[2:])
+    assert chunk_validator.report_frame().values.tolist() == [[3, "movieid", "range", 5000], [5, "movieid", "range", 6000], [2, "ratings", "range", 9]]
+    assert chunk_validator.results == {"userid": True, "movieid": False, "ratings": False}
+
+    fail_fast_validator = ChunkValidator("RatingDataValidator", "schema/ratings.yml", fail_fast=True, max_report_rows=1)
+    assert not fail_fast_validator.validate(ratings_df)
+    assert fail_fast_validator.failed and len(fail_fast_validator.report) == 1 and len(fail_fast_validator.results) < 3
+
+
+def test_approximate_unique_check():
+    """Test if the approximate unique check reports repeats within a chunk by row and catches repeats across chunks from its sketch"""
+    users_df = pd.DataFrame({"userid": np.arange(1, 6001), "gender": "F", "age": 25, "occupation": 1, "zipcode": "1"})
+    chunk_validator = ChunkValidator("UserDataValidator", "schema/users.yml", unique_check="approximate")
+    assert chunk_validator.validate(users_df.iloc[:3000]) and chunk_validator.validate(users_df.iloc[3000:])
+
+    assert not chunk_validator.validate(users_df.iloc[:2000]) and chunk_validator.results["userid"] is False and chunk_validator.report == []
+    repeated_validator = ChunkValidator("UserDataValidator", "schema/users.yml", unique_check="approximate")
+    assert not repeated_validator.validate(users_df.iloc[[0, 1, 0]]) and repeated_validator.report == [{"row": 2, "column": "userid", "rule": "unique", "value": 1}]
+
+
+def test_schema_column_templates_follow_the_windows():
+    """Test if the window columns of the movie_rating_windows schema are declared and validated for every configured window"""
+    file_schema_path = "schema/movie_rating_windows.yml"
+    file_schema = load_file_schema(file_schema_path, {"window": [7, 90]})
+    assert [col["name"] for col in file_schema["columns"]] == ["movieid", "titles", "ratings_count_7d", "ratings_count_90d", "avg_rating_7d", "avg_rating_90d", "as_of"]
+
+    windows_df = pd.DataFrame({"movieid": [1, 2], "titles": ["A", "B"], "ratings_count_7d": [0, 2], "ratings_count_90d": [3, -1], "avg_rating_7d": [np.nan, 4.5], "avg_rating_90d": [3.0, 4.0], "as_of": ["2003-02-28"] * 2})
+    dqt_result = validate_dataset(validator_name="MovieRatingWindowsDataValidator", df=windows_df, file_schema_path=file_schema_path, schema_variables={"window": [7, 90]})
+    assert dqt_result == {"movieid": True, "ratings_count_7d": True, "ratings_count_90d": False, "as_of": True}
+
+    with pytest.raises(ValueError, match="window"):
+        load_file_schema(file_schema_path)
@@ -0,0 +1,47 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    from src.scripts.dtypes import apply_schema_dtypes, decode_schema_columns, memory_report
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.load_tools import gen_dataframe
+    from src.scripts.schema import load_file_schema
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.dtypes import apply_schema_dtypes, decode_schema_columns, memory_report
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.load_tools import gen_dataframe
+    from src.scripts.schema import load_file_schema
+
+
+def test_compact_schema_dtypes(tmp_path):
+    """Test if the compact schema types halve the ratings footprint, round trip the genres and leave out of range values for the DQTs"""
+    rng = np.random.default_rng(7)
+    ratings_df = pd.DataFrame({"userid": rng.integers(1, 6041, 10000), "movieid": rng.integers(1, 3953, 10000), "ratings": rng.integers(1, 6, 10000), "timestamp": rng.integers(956703932, 1046454590, 10000)})
+    compact_df = apply_schema_dtypes(ratings_df, load_file_schema("schema/ratings.yml"))
+    assert memory_report(compact_df)["total_mb"] < memory_report(ratings_df)["total_mb"] / 2
+    assert (compact_df.to_numpy() == ratings_df.to_numpy()).all()
+
+    movies_schema = load_file_schema("schema/movies.yml")
+    movies_df = pd.DataFrame({"movieid": [1, 2], "titles": ["Toy Story (1995)", "Heat (1995)"], "genres": ["Animation|Children's|Comedy", "Action|Crime|Thriller"]})
+    encoded_df = apply_schema_dtypes(movies_df, movies_schema)
+    assert encoded_df["genres"].tolist() == [0b11100, 0b1000000000100001]
+    pd.testing.assert_frame_equal(decode_schema_columns(encoded_df, movies_schema), movies_df, check_dtype=False)
+
+    dat_file_path = tmp_path / "ratings.dat"
+    dat_file_path.write_text("1::1::5::978300760\n2::3::300::978300761\n")
+    parsed_df = gen_dataframe(str(dat_file_path), "schema/ratings.yml")
+    assert parsed_df["ratings"].tolist() == [5, 300]
+
+
+def test_unknown_multi_hot_label_raises(tmp_path):
+    """Test if a genre missing from the multi-hot categories raises a schema error naming the column, row and label instead of leaving genres untyped"""
+    dat_file_path = tmp_path / "movies.dat"
+    dat_file_path.write_text("1::Toy Story (1995)::Animation|Comedy\n2::Heat (1995)::Action|Heist\n")
+    with pytest.raises(CustomErrors.SchemaTypeError, match="genres, row 1: label 'Heist'"):
+        gen_dataframe(str(dat_file_path), "schema/movies.yml")
+    with pytest.raises(CustomErrors.SchemaTypeError, match="genres, row 1: label 'Heist'"):
+        list(gen_dataframe(str(dat_file_path), "schema/movies.yml", chunksize=10))
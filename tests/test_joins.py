@@ -0,0 +1,41 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    from src.scripts.joins import DimensionIndex
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.joins import DimensionIndex
+
+
+@pytest.mark.parametrize("movie_ids", [[3, 1, 2, 5], [3, 1, 2, 10**9]], ids=["direct", "hash"])
+def test_join_matches_left_merge(movie_ids):
+    """Test if the direct-address and hash joins give the rows, values and dtypes of a left pd.merge, missing keys included"""
+    movies_df = pd.DataFrame(
+        {
+            "movieid": pd.Series(movie_ids, dtype="int32"),
+            "titles": pd.Series(["C", "A", "B", None], dtype="string"),
+            "genres": pd.Series([4, 1, 2, 8], dtype="uint32"),
+            "gender": pd.Categorical(["M", "F", "M", "F"]),
+            "released": pd.to_datetime([3, 1, 2, 5], unit="s"),
+        }
+    )
+    movies = DimensionIndex(movies_df, "movieid")
+    assert movies.is_direct == (movie_ids[-1] == 5)
+
+    ratings_df = pd.DataFrame({"userid": np.arange(8), "movieid": [1, 2, 3, 1, 5, 3, 2, 1], "ratings": np.arange(8, dtype="int8")}, index=np.arange(8) * 3)
+    pd.testing.assert_frame_equal(movies.join(ratings_df), pd.merge(ratings_df, movies_df, on="movieid", how="left"))
+
+    ratings_df.loc[6, "movieid"] = 42
+    pd.testing.assert_frame_equal(movies.join(ratings_df), pd.merge(ratings_df, movies_df, on="movieid", how="left"))
+    assert movies.positions(np.array([0, 42, -7])).tolist() == [-1, -1, -1]
+    assert list(ratings_df.columns) == ["userid", "movieid", "ratings"]
+
+
+def test_duplicated_dimension_keys():
+    """Test if a dimension with duplicated keys is refused"""
+    with pytest.raises(ValueError):
+        DimensionIndex(pd.DataFrame({"userid": [1, 1], "gender": ["F", "M"]}), "userid")
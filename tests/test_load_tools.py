@@ -0,0 +1,74 @@
+import io
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+import yaml
+
+try:
+    from src.scripts.dtypes import decode_schema_columns
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.load_tools import DatSeparatorReader, extract_and_load_datasets, gen_dataframe
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.dtypes import decode_schema_columns
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.load_tools import DatSeparatorReader, extract_and_load_datasets, gen_dataframe
+
+
+def test_dat_parser_matches_python_engine():
+    """Test if the C engine .dat parser returns the same data as the regex separator python engine"""
+    file_schema_path = "schema/movies.yml"
+    file_path = "data/01_raw/movies.dat"
+    with open(file_schema_path, "r") as file:
+        file_schema = yaml.safe_load(file)
+    column_names = [col["name"] for col in file_schema["columns"]]
+
+    expected_df = pd.read_csv(file_path, sep="::", engine="python", header=None, encoding="ISO-8859-1", names=column_names)
+    df = gen_dataframe(file_path, file_schema_path)
+
+    assert (df["movieid"].dtype, df["genres"].dtype) == ("int32", "uint32")
+    pd.testing.assert_frame_equal(expected_df, decode_schema_columns(df, file_schema), check_dtype=False)
+
+
+def test_dat_separator_split_across_blocks():
+    """Test if a separator split across read blocks is translated like a single replace"""
+    data = b"1:::Title: A::Drama\n2::B::::Comedy\n"
+    for block_size in range(1, len(data) + 1):
+        translated = io.BufferedReader(DatSeparatorReader(io.BytesIO(data), block_size=block_size)).read()
+        assert translated == data.replace(b"::", b"\x1f")
+
+
+def test_extract_datasets_skips_unchanged_files(tmp_path):
+    """Test if zip members are extracted once and re-extracted only when the raw file differs"""
+    zip_file_path = str(tmp_path / "ml-1m.zip")
+    with zipfile.ZipFile(zip_file_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("ml-1m/movies.dat", "1::Toy Story (1995)::Comedy\n" * 1000)
+        z.writestr("ml-1m/users.dat", "1::F::1::10::48067\n" * 1000)
+
+    status = extract_and_load_datasets(zip_file_path, str(tmp_path), ["movies.dat", "users.dat"], chunk_size=64)
+    assert status == {"movies.dat": "extracted", "users.dat": "extracted"}
+    assert (tmp_path / "movies.dat").read_text() == "1::Toy Story (1995)::Comedy\n" * 1000
+
+    (tmp_path / "users.dat").write_text("2::M::56::16::70072\n" * 1000)
+    status = extract_and_load_datasets(zip_file_path, str(tmp_path), ["movies.dat", "users.dat"])
+    assert status == {"movies.dat": "skipped", "users.dat": "extracted"}
+    assert (tmp_path / "users.dat").read_text() == "1::F::1::10::48067\n" * 1000
+
+    with pytest.raises(CustomErrors.MultiFileError):
+        extract_and_load_datasets(zip_file_path, str(tmp_path), [".dat"])
+
+
+def test_extract_dataset_failure_keeps_no_temp_file(tmp_path):
+    """Test if a member failing its CRC-32 check leaves the raw file untouched and no temporary file behind"""
+    zip_file_path = tmp_path / "ml-1m.zip"
+    with zipfile.ZipFile(zip_file_path, "w", compression=zipfile.ZIP_STORED) as z:
+        z.writestr("ml-1m/movies.dat", "1::Toy Story (1995)::Comedy\n" * 1000)
+    zip_file_path.write_bytes(zip_file_path.read_bytes().replace(b"Toy Story", b"Toy Stori", 1))
+    (tmp_path / "movies.dat").write_text("2::Jumanji (1995)::Adventure\n")
+
+    with pytest.raises(zipfile.BadZipFile):
+        extract_and_load_datasets(str(zip_file_path), str(tmp_path), ["movies.dat"], chunk_size=64)
+    assert (tmp_path / "movies.dat").read_text() == "2::Jumanji (1995)::Adventure\n"
+    assert not (tmp_path / "movies.dat.tmp").exists()
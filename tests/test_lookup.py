@@ -0,0 +1,50 @@
+import json
+import sys
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pandas as pd
+
+try:
+    from src.scripts.lookup import DataProductIndex, LookupService, lookup_request_handler
+    from src.scripts.storage import CsvStorage
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.lookup import DataProductIndex, LookupService, lookup_request_handler
+    from src.scripts.storage import CsvStorage
+
+
+def test_index_lookups(tmp_path):
+    """Test if the index returns the rows of a key in their data product order, None for missing values and nothing for unknown keys"""
+    top_movies_df = pd.DataFrame({"userid": [7, 3, 7, 3], "movieid": [10, 20, 30, 40], "titles": ["A", None, "C", "D"], "avg_rating": [4.5, 3.0, float("nan"), 2.0]})
+    DataProductIndex.build(top_movies_df, "userid", str(tmp_path / "top_movies_per_user"))
+    index = DataProductIndex(str(tmp_path / "top_movies_per_user"))
+
+    assert [row["movieid"] for row in index.lookup(7)] == [10, 30]
+    assert index.lookup(3)[0] == {"userid": 3, "movieid": 20, "titles": None, "avg_rating": 3.0}
+    assert index.lookup(7)[1]["avg_rating"] is None
+    assert index.lookup(5) == [] and index.lookup(-1) == [] and index.lookup(8) == []
+    assert list(index.lookup_many([3, 9])) == [3, 9]
+
+
+def test_service_rebuilds_stale_index_and_serves_http(tmp_path):
+    """Test if the service rebuilds an index once its data product is rewritten, and answers point and batch lookups over HTTP"""
+    data_product_path, index_zone_path = str(tmp_path / "data_product"), str(tmp_path / "index")
+    (tmp_path / "data_product").mkdir()
+    CsvStorage.write(pd.DataFrame({"movieid": [1, 2], "avg_rating": [3.5, 4.0]}), data_product_path, "movies_with_ratings_stats")
+    service = LookupService(index_zone_path, data_product_path, CsvStorage, {"movies_with_ratings_stats": "movieid"})
+    assert service.lookup("movies_with_ratings_stats", 2)[0]["avg_rating"] == 4.0
+
+    CsvStorage.write(pd.DataFrame({"movieid": [1, 2, 3], "avg_rating": [3.5, 4.5, 1.0]}), data_product_path, "movies_with_ratings_stats")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), lookup_request_handler(service, refresh_seconds=0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}/movies_with_ratings_stats"
+        with urllib.request.urlopen(f"{base_url}/2") as response:
+            assert json.load(response)[0]["avg_rating"] == 4.5
+        with urllib.request.urlopen(f"{base_url}?keys=3,4") as response:
+            assert json.load(response) == {"3": [{"movieid": 3, "avg_rating": 1.0}], "4": []}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,33 @@
+import sys
+
+try:
+    from src.scripts.manifest import StageManifest
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.manifest import StageManifest
+
+
+def test_stage_rebuilt_only_when_inputs_or_outputs_change(tmp_path):
+    """Test if a recorded stage stays up to date until an input, the config or an output changes"""
+    input_path = tmp_path / "ratings.dat"
+    output_path = tmp_path / "ratings"
+    input_path.write_text("1::1193::5::978300760\n")
+    output_path.mkdir()
+    (output_path / "ratings.npy").write_bytes(b"1193")
+
+    manifest = StageManifest(str(tmp_path / "manifest.json"))
+    fingerprint = manifest.stage_fingerprint([str(input_path)], {"Data": {"source_datasets": "ratings.dat"}})
+    assert manifest.outdated_reason("curated", fingerprint, [str(output_path)]) is not None
+    manifest.record("curated", fingerprint, [str(output_path)])
+    manifest.save()
+
+    manifest = StageManifest(str(tmp_path / "manifest.json"))
+    assert manifest.stage_fingerprint([str(input_path)], {"Data": {"source_datasets": "ratings.dat"}}) == fingerprint
+    assert manifest.outdated_reason("curated", fingerprint, [str(output_path)]) is None
+    assert manifest.stage_fingerprint([str(input_path)], {"Data": {"source_datasets": "movies.dat"}}) != fingerprint
+
+    (output_path / "ratings.npy").write_bytes(b"25710")
+    assert manifest.outdated_reason("curated", fingerprint, [str(output_path)]) is not None
+
+    input_path.write_text("1::2571::4::978300760\n1::1::5::978300761\n")
+    assert manifest.stage_fingerprint([str(input_path)], {"Data": {"source_datasets": "ratings.dat"}}) != fingerprint
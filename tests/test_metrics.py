@@ -0,0 +1,29 @@
+import json
+import sys
+
+try:
+    from src.scripts.load_tools import gen_dataframe
+    from src.scripts.metrics import MetricsRecorder, activate_metrics_recorder
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.load_tools import gen_dataframe
+    from src.scripts.metrics import MetricsRecorder, activate_metrics_recorder
+
+
+def test_metrics_records_stage_and_calls(tmp_path):
+    """Test if the instrumented calls of a stage are recorded with their rows and bytes, and the cProfile report is saved next to the metrics"""
+    dat_file_path = tmp_path / "movies.dat"
+    dat_file_path.write_bytes(b"1::Toy Story (1995)::Animation\n2::Jumanji (1995)::Adventure\n")
+    recorder = MetricsRecorder(str(tmp_path / "metrics" / "metrics.jsonl"))
+
+    activate_metrics_recorder(recorder)
+    try:
+        with recorder.measure("verify_dq_load_curated_movies", kind="stage"), recorder.profile("verify_dq_load_curated_movies", "cprofile"):
+            gen_dataframe(str(dat_file_path), "schema/movies.yml")
+    finally:
+        activate_metrics_recorder(None)
+
+    call_record, stage_record = [json.loads(line) for line in (tmp_path / "metrics" / "metrics.jsonl").read_text().splitlines()]
+    assert (call_record["name"], call_record["stage"], call_record["rows_out"], call_record["bytes_read"]) == ("gen_dataframe", "verify_dq_load_curated_movies", 2, dat_file_path.stat().st_size)
+    assert stage_record["kind"] == "stage" and stage_record["wall_seconds"] >= call_record["wall_seconds"]
+    assert (tmp_path / "metrics" / f"{recorder.run_id}_verify_dq_load_curated_movies.prof").exists()
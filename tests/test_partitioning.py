@@ -0,0 +1,50 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.scripts.partitioning import HashPartitionedStorage, bucket_ids
+    from src.scripts.storage import NpyStorage
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.partitioning import HashPartitionedStorage, bucket_ids
+    from src.scripts.storage import NpyStorage
+
+
+def test_partitioned_round_trip_and_pruning(tmp_path):
+    """Test if every rating of a user lands in one bucket in its original order, and a read of some users only loads their buckets"""
+    rng = np.random.default_rng(3)
+    ratings_df = pd.DataFrame({"userid": rng.integers(1, 200, 5000).astype("int32"), "movieid": rng.integers(1, 3953, 5000).astype("int32"), "ratings": rng.integers(1, 6, 5000).astype("int8")})
+    storage = HashPartitionedStorage(NpyStorage, column="userid", buckets=4)
+    storage.write_chunks([ratings_df.iloc[:3000], ratings_df.iloc[3000:]], str(tmp_path), "ratings")
+
+    bucket_dfs = [storage.read(str(tmp_path), "ratings", buckets=[bucket]) for bucket in range(4)]
+    assert sum(len(bucket_df) for bucket_df in bucket_dfs) == len(ratings_df)
+    assert all(bucket_df["userid"].dtype == np.int32 for bucket_df in bucket_dfs)
+    for bucket, bucket_df in enumerate(bucket_dfs):
+        expected_df = ratings_df[bucket_ids(ratings_df["userid"], 4) == bucket].reset_index(drop=True)
+        pd.testing.assert_frame_equal(bucket_df, expected_df)
+
+    user_buckets = storage.buckets_for([7, 42])
+    pruned_df = storage.read(str(tmp_path), "ratings", buckets=user_buckets)
+    assert len(user_buckets) <= 2 and len(pruned_df) < len(ratings_df)
+    assert (pruned_df["userid"].isin([7, 42]).sum()) == ratings_df["userid"].isin([7, 42]).sum()
+    assert sum(len(chunk) for chunk in storage.read_chunks(str(tmp_path), "ratings", chunk_rows=500)) == len(ratings_df)
+
+
+def test_bucket_ids_independent_of_key_dtype():
+    """Test if a key hashes to the same bucket whatever the width of its integer column"""
+    keys = np.arange(1, 1000)
+    assert np.array_equal(bucket_ids(keys.astype(np.int32), 8), bucket_ids(keys.astype(np.int64), 8))
+    assert set(bucket_ids(keys, 8).tolist()) == set(range(8))
+
+
+def test_partitioned_read_of_no_bucket(tmp_path):
+    """Test if a read selecting no bucket gives an empty frame with the columns and dtypes of the dataset"""
+    ratings_df = pd.DataFrame({"userid": np.arange(1, 101, dtype="int32"), "ratings": np.full(100, 4, dtype="int8")})
+    storage = HashPartitionedStorage(NpyStorage, column="userid", buckets=4)
+    storage.write(ratings_df, str(tmp_path), "ratings")
+
+    pd.testing.assert_frame_equal(storage.read(str(tmp_path), "ratings", buckets=[]), ratings_df.iloc[:0])
+    assert storage.read(str(tmp_path), "ratings", columns=["ratings"], buckets=[]).columns.tolist() == ["ratings"]
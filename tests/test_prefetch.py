@@ -0,0 +1,47 @@
+import sys
+import threading
+
+import pytest
+
+try:
+    from src.scripts.prefetch import prefetch
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.prefetch import prefetch
+
+
+def test_prefetch_keeps_order_and_reraises():
+    """Test if prefetched items keep their order, are produced on another thread and the producer error is raised after them"""
+    producer_threads = set()
+
+    def items():
+        for item in range(5):
+            producer_threads.add(threading.current_thread().name)
+            yield item
+        raise ValueError("corrupt chunk")
+
+    consumed = []
+    with pytest.raises(ValueError):
+        for item in prefetch(items(), depth=2, name="parse_ratings"):
+            consumed.append(item)
+    assert consumed == [0, 1, 2, 3, 4]
+    assert producer_threads == {"parse_ratings"}
+
+
+def test_prefetch_stops_producer_when_consumer_stops():
+    """Test if a consumer stopping early stops the producer and closes its items, with at most depth items produced ahead"""
+    produced, closed = [], threading.Event()
+
+    def items():
+        try:
+            for item in range(100):
+                produced.append(item)
+                yield item
+        finally:
+            closed.set()
+
+    prefetched = prefetch(items(), depth=3)
+    assert next(prefetched) == 0
+    prefetched.close()
+    assert closed.is_set()
+    assert len(produced) <= 1 + 3 + 1
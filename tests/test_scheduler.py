@@ -0,0 +1,34 @@
+import sys
+
+import pytest
+
+try:
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.scheduler import StageScheduler
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.scheduler import StageScheduler
+
+
+def run_stage(stage_name):
+    if stage_name == "curated_ratings":
+        raise CustomErrors.DpDqtError("DQT failed for the dataset: ratings")
+
+
+def test_stage_scheduler_failure_propagation():
+    """Test if stages run after their dependencies, skipped stages unlock their dependents and a DQT failure stops the dependent stages"""
+    scheduler = StageScheduler(
+        {"raw": [], "curated_movies": ["raw"], "curated_ratings": ["raw"], "dp_movies": ["curated_movies"], "dp_ratings": ["curated_movies", "curated_ratings"]},
+        max_workers=2,
+    )
+    completed = []
+
+    with pytest.raises(CustomErrors.DpDqtError, match="ratings"):
+        scheduler.run(lambda stage_name: (run_stage, (stage_name,)), should_run=lambda stage_name: stage_name != "raw", on_success=completed.append)
+
+    assert "dp_ratings" not in completed
+    assert "raw" not in completed and "curated_movies" in completed
+
+    with pytest.raises(CustomErrors.StageGraphError):
+        StageScheduler({"curated": ["dp"], "dp": ["curated"]})
@@ -0,0 +1,50 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    from src.scripts import similarity
+    from src.scripts.aggregation import UserMovieRatings
+    from src.scripts.similarity import RatingsMatrix, top_similar_movies
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts import similarity
+    from src.scripts.aggregation import UserMovieRatings
+    from src.scripts.similarity import RatingsMatrix, top_similar_movies
+
+
+def test_ratings_matrix_from_chunks():
+    """Test if the matrix summed from the chunks of a scan holds every rating at its user row and movie column"""
+    ratings_df = pd.DataFrame({"userid": [7, 3, 7, 5, 3], "movieid": [20, 10, 10, 30, 10], "ratings": [4, 2, 5, 1, 3]})
+    aggregate = UserMovieRatings()
+    matrix = aggregate.merge(aggregate.merge(aggregate.scan(ratings_df.iloc[:2]), aggregate.scan(ratings_df.iloc[2:4])), aggregate.scan(ratings_df.iloc[4:]))
+
+    assert matrix.shape == (3, 3) and matrix.user_ids.tolist() == [3, 5, 7] and matrix.movie_ids.tolist() == [10, 20, 30]
+    assert matrix.to_scipy().toarray().tolist() == [[5, 0, 0], [0, 0, 1], [5, 4, 0]]
+    assert matrix.movie_ratings_count().tolist() == [2, 1, 1]
+
+
+@pytest.mark.parametrize("sparse_block_density", [0, 1])
+def test_top_similar_movies_match_dense_cosine(monkeypatch, sparse_block_density):
+    """Test if the blocked top N neighbours of dense and sparse blocks match a dense cosine similarity of the movie columns, skipping the movies with too few ratings"""
+    monkeypatch.setattr(similarity, "SPARSE_BLOCK_DENSITY", sparse_block_density)
+    rng = np.random.default_rng(3)
+    ratings_df = pd.DataFrame({"userid": rng.integers(1, 60, 2000), "movieid": rng.integers(1, 80, 2000), "ratings": rng.integers(1, 6, 2000)}).drop_duplicates(["userid", "movieid"])
+    matrix = RatingsMatrix.from_ratings(ratings_df["userid"], ratings_df["movieid"], ratings_df["ratings"])
+    similar_movies_df = top_similar_movies(matrix, top_n=5, min_ratings=25, block_memory_mb=0)
+
+    dense = matrix.to_scipy().toarray().astype(np.float64)
+    eligible = (dense > 0).sum(axis=0) >= 25
+    unit = dense / np.linalg.norm(dense, axis=0)
+    similarities = np.where(np.outer(eligible, eligible), unit.T @ unit, 0)
+    np.fill_diagonal(similarities, 0)
+
+    assert set(similar_movies_df["movieid"]) == set(matrix.movie_ids[eligible])
+    for movieid, neighbours in similar_movies_df.groupby("movieid"):
+        position = np.searchsorted(matrix.movie_ids, movieid)
+        expected = np.sort(similarities[position])[::-1][:5]
+        assert neighbours["rank"].tolist() == list(range(1, 6))
+        assert np.allclose(neighbours["similarity"], expected, atol=1e-6)
+        assert np.allclose(similarities[position, np.searchsorted(matrix.movie_ids, neighbours["similar_movieid"])], neighbours["similarity"], atol=1e-6)
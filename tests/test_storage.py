@@ -0,0 +1,46 @@
+import sys
+
+import pandas as pd
+import pytest
+
+try:
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.storage import NpyStorage, get_storage
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.exceptions import CustomErrors
+    from src.scripts.storage import NpyStorage, get_storage
+
+
+def test_npy_storage_round_trip(tmp_path):
+    """Test if the npy storage keeps values and dtypes and reads back only the requested columns"""
+    df = pd.DataFrame(
+        {
+            "movieid": pd.Series([1, 2, 3], dtype="int16"),
+            "titles": pd.Series(["Toy Story (1995)", None, "Heat (1995)"], dtype="string"),
+            "genres": pd.Categorical(["Comedy", "Drama", "Comedy"]),
+            "timestamp": pd.to_datetime([978300760, 978302109, 978301968], unit="s"),
+            "avg_rating": [4.15, float("nan"), 3.2],
+        }
+    )
+    NpyStorage.write(df, str(tmp_path), "movies")
+
+    pd.testing.assert_frame_equal(NpyStorage.read(str(tmp_path), "movies"), df)
+    assert NpyStorage.read(str(tmp_path), "movies", columns=["genres", "movieid"]).columns.tolist() == ["movieid", "genres"]
+
+
+def test_unknown_storage_format():
+    """Test if an unknown storage format raises StorageFormatError"""
+    with pytest.raises(CustomErrors.StorageFormatError):
+        get_storage("xlsx")
+
+
+def test_npy_chunked_write_and_read(tmp_path):
+    """Test if a dataset written in chunks reads back whole and in bounded chunks"""
+    df = pd.DataFrame({"userid": range(10), "ratings": [5, 4, 3, 2, 1] * 2, "genres": pd.Categorical(["Drama", "Comedy"] * 5)})
+    NpyStorage.write_chunks((df.iloc[start : start + 4] for start in range(0, 10, 4)), str(tmp_path), "ratings")
+
+    pd.testing.assert_frame_equal(NpyStorage.read(str(tmp_path), "ratings"), df)
+    chunks = list(NpyStorage.read_chunks(str(tmp_path), "ratings", columns=["userid"], chunk_rows=3))
+    assert [len(chunk) for chunk in chunks] == [3, 1, 3, 1, 2]
+    assert pd.concat(chunks, ignore_index=True)["userid"].tolist() == list(range(10))
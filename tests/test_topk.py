@@ -0,0 +1,30 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.scripts.topk import top_k_per_group
+except ModuleNotFoundError:
+    sys.path.append(".")
+    from src.scripts.topk import top_k_per_group
+
+ORDER_BY = [("ratings", False), ("timestamp", False), ("movieid", True)]
+
+
+def test_top_k_matches_full_sort():
+    """Test if the top k rows per user match a full sort on rating, recency and movieid"""
+    rng = np.random.default_rng(3)
+    ratings_df = pd.DataFrame(
+        {
+            "userid": rng.integers(1, 300, 20000),
+            "movieid": rng.permutation(20000) + 1,
+            "ratings": rng.integers(1, 6, 20000),
+            "timestamp": rng.integers(978300000, 978300050, 20000),
+        }
+    )
+    expected_df = ratings_df.sort_values(by=["userid", "ratings", "timestamp", "movieid"], ascending=[True, False, False, True])
+
+    for k in [1, 3, 100]:
+        top_k_df = top_k_per_group(ratings_df, group_column="userid", k=k, order_by=ORDER_BY)
+        pd.testing.assert_frame_equal(top_k_df, expected_df.groupby("userid").head(k))